@@ -42,6 +42,12 @@ from vizitka.tests import test_interval_indexer
 from vizitka.tests import test_offset
 from vizitka.tests import test_indexed_piece
 from vizitka.tests import test_aggregated_pieces
+from vizitka.tests import test_vocabulary
+from vizitka.tests import test_fingerprint
+from vizitka.tests import test_contour_search
+from vizitka.tests import test_batch
+from vizitka.tests import test_metadata_index
+from vizitka.tests import test_corpus_cache
 from vizitka.tests import bwv2_integration_tests as bwv2
 from vizitka.tests import bwv603_integration_tests as bwv603
 from vizitka.tests import test_fermata_indexer
@@ -79,6 +85,16 @@ THE_TESTS = (  # Indexer and Subclasses
              test_indexed_piece.INDEXED_PIECE_PARTS_TITLES,
              test_indexed_piece.INDEXED_PIECE_SUITE_C,
              test_aggregated_pieces.AGGREGATED_PIECES_SUITE,
+             test_vocabulary.VOCABULARY_SUITE,
+             test_fingerprint.MINHASHER_SUITE,
+             test_fingerprint.LSH_INDEX_SUITE,
+             test_fingerprint.PIECE_SHINGLES_SUITE,
+             test_contour_search.CONTOUR_INDEX_SUITE,
+             test_batch.BATCH_RUNNER_SUITE,
+             test_batch.COORDINATOR_SUITE,
+             test_metadata_index.READ_HEADER_SUITE,
+             test_metadata_index.METADATA_INDEX_SUITE,
+             test_corpus_cache.CORPUS_CACHE_SUITE,
              # Integration Tests
              bwv2.ALL_VOICE_INTERVAL_NGRAMS,
              bwv603.ALL_VOICE_INTERVAL_NGRAMS,
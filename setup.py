@@ -57,6 +57,9 @@ setup(
         'music21 == 2.1.2',
         'pandas == 0.18.1'
         ],
+    extras_require = {
+        'dataset': ['pyarrow'],  # for AggregatedPieces.export_dataset()
+        },
     packages = [
         'vizitka',
         'vis.models',
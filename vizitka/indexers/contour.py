@@ -27,72 +27,135 @@
 .. codeauthor:: Marina Borsodi-Benson <marinaborsodibenson@gmail.com>
 .. codeauthor:: Reiner Kramer <reiner@music.org>
 
-.. todo:: Properly document the ``COM_matrix`` and ``compare`` 
-    functions.
-
+Contours are computed on arrays of pitch space numbers with NumPy, one
+window of notes per row, so long melodic lines can be indexed quickly.
 """
 
 from vizitka.indexers import indexer
 import music21
+import numpy
 import pandas
 
-def COM_matrix(contour):
+_memos = {}
+# The most comparisons contours() holds in memory at once.
+_CHUNK = 1 << 20
+
+def _pitch(name):
     """
-    Creates a matrix representing the contour given.
+    Used internally to find the pitch space number and the canonical name of a note name, as
+    music21 would for ``music21.note.Note(name)``. Results are memoized.
     """
-    com = []
+    if name not in _memos:
+        pitch = music21.pitch.Pitch(name)
+        _memos[name] = (pitch.ps, pitch.nameWithOctave)
+    return _memos[name]
 
-    contour = contour.replace(' ', '')
-    contour = contour.replace('[', '')
-    contour = contour.replace(']', '')
-    contour = contour.split(',')
+def _pitch_arrays(notes):
+    """
+    Used internally to turn note names into the arrays that :func:`contours` needs: their pitch
+    space numbers and an integer code for each distinct ``nameWithOctave``, so that enharmonic
+    spellings stay distinct.
+    """
+    codes, uniques = pandas.factorize(numpy.asarray(notes, dtype=object))
+    pitches = [_pitch(name) for name in uniques]
+    ps = numpy.array([p[0] for p in pitches], dtype=numpy.float64)
+    names = pandas.factorize(numpy.array([p[1] for p in pitches], dtype=object))[0]
+    return ps[codes], names[codes]
 
-    for x in contour:
-        com.append([])
-    for i in range(len(contour)):
-        for x in range(len(contour)):
-            if contour[i] == contour[x]:
-                com[i].append("0")
-            elif contour[i] > contour[x]:
-                com[i].append("-")
-            else:
-                com[i].append("+")
+def contours(ps, names, length):
+    """
+    Find the contour of every window of ``length`` consecutive notes. The contour number of a note
+    is how many distinct pitches in its window are at or below it, not counting itself, so the
+    lowest note is 0. Pitches are distinct if their names with octave differ, so an enharmonic
+    equivalent counts as lower.
+
+    :param ps: The pitch space number of each note.
+    :type ps: 1-dimensional :class:`numpy.ndarray`
+    :param names: An integer code for each note's name with octave.
+    :type names: 1-dimensional :class:`numpy.ndarray` of int
+    :param int length: The number of notes in each window.
+
+    :returns: One row per window, starting at each note that has ``length - 1`` notes after it.
+    :rtype: 2-dimensional :class:`numpy.ndarray` of int
+    """
+    count = max(len(ps) - length + 1, 0)
+    post = numpy.zeros((count, length), dtype=numpy.int64)
+    # the comparisons below take length**2 booleans per window, so do a bounded number at a time
+    chunk = max(1, _CHUNK // (length * length))
+    for start in range(0, count, chunk):
+        # windows[w, j] is the position in ps of the j-th note of window w
+        windows = numpy.arange(start, min(start + chunk, count))[:, None] + numpy.arange(length)
+        win_ps = ps[windows]
+        win_names = names[windows]
+        # only the first note with each name in a window counts, so repeated notes count once
+        same = win_names[:, :, None] == win_names[:, None, :]
+        first = ~numpy.tril(same, -1).any(axis=2)
+        at_or_below = win_ps[:, None, :] <= win_ps[:, :, None]
+        post[start:start + chunk] = (at_or_below & first[:, None, :]).sum(axis=2) - 1
+    return post
+
+def voice_contours(part, length):
+    """
+    Find the contours of one voice as the :class:`ContourIndexer` does: each contour starts on a
+    note and takes in the next ``length`` notes, skipping over rests and empty rows.
 
-    return com
+    :param part: The voice's :class:`NoteRestIndexer` observations.
+    :type part: 1-dimensional :class:`numpy.ndarray`
+    :param int length: The number of notes in each contour.
 
-def getContour(notes):
+    :returns: The contours, one per row, and the position in ``part`` where each one starts.
+    :rtype: 2-tuple of :class:`numpy.ndarray`
     """
-    Method used internally by the ``ContourIndexer`` class to convert 
-    pitches into contour numbers.
+    is_note = numpy.array([not (x == 'Rest' or isinstance(x, float)) for x in part], dtype=bool)
+    positions = numpy.flatnonzero(is_note)
+    ps, names = _pitch_arrays(part[positions])
+    cons = contours(ps, names, length)
+    # a contour can only start in the first len(part) - length + 1 rows
+    starts = positions[:len(cons)]
+    keep = starts < len(part) - length + 1
+    return cons[keep], starts[keep]
+
+def _to_array(contour):
     """
+    Used internally by :func:`COM_matrix` to accept a contour as a string like ``'[0, 2, 1]'`` or
+    as a sequence of integers.
+    """
+    if isinstance(contour, str):
+        contour = contour.replace(' ', '').replace('[', '').replace(']', '').split(',')
+    return numpy.asarray(contour, dtype=numpy.int64)
 
-    contour = list(map(music21.note.Note, notes))
-
-    cseg = [0] * len(contour)
+def COM_matrix(contour):
+    """
+    Creates the comparison matrix of the contour given: the element in row ``i`` and column ``j``
+    is ``'+'`` if note ``j`` is higher than note ``i``, ``'-'`` if it is lower, and ``'0'`` if they
+    are the same height.
 
-    for i in range(len(contour)):
-        notes = []
+    :param contour: A contour as output by the :class:`ContourIndexer`, or its numbers.
+    :type contour: str or sequence of int
 
-        for x in range(len(contour)):
-            if ((music21.interval.getAbsoluteHigherNote(contour[i], contour[x]) == contour[i]) and 
-                (contour[i].nameWithOctave != contour[x].nameWithOctave) and 
-                (contour[x].nameWithOctave not in notes)):
-                notes.append(contour[x].nameWithOctave)
-                cseg[i] += 1
+    :returns: The comparison matrix.
+    :rtype: list of lists of str
+    """
+    contour = _to_array(contour)
+    rows = contour[:, None]
+    cols = contour[None, :]
+    return numpy.where(rows == cols, '0', numpy.where(rows > cols, '-', '+')).tolist()
 
-    return str(cseg)
+def getContour(notes):
+    """
+    Method used internally by the ``ContourIndexer`` class to convert 
+    pitches into contour numbers.
+    """
+    ps, names = _pitch_arrays(notes)
+    return str(contours(ps, names, len(notes))[0].tolist())
 
 def compare(contour1, contour2):
     """
-    Additional method to compare ``COM_matrices``.
+    Additional method to compare ``COM_matrices``. Returns the fraction of the pairs of notes
+    that move in the same direction in both contours.
     """
-
-    count = 0
     l = len(contour1)
-    for row in range(l):
-        for c1, c2 in zip(contour1[row], contour2[row]):
-            if c1 == c2:
-                count += 1
+    count = int((numpy.asarray(contour1) == numpy.asarray(contour2)).sum())
 
     count = float((count - l) / 2)
     total = float((l * (l - 1)) / 2)
@@ -184,35 +247,15 @@ class ContourIndexer(indexer.Indexer):
         
         """
 
-        contours = []
+        length = self.settings['length']
+        index = self.score.index.values
+        post = []
 
         for v, voice in enumerate(self.score.columns.values):
+            cons, starts = voice_contours(self.score[voice].values, length)
+            voice_con = [str(row) for row in cons.tolist()]
+            post.append(pandas.Series(voice_con, index=index[starts], name=str(v)))
 
-            part = self.score[voice].tolist()
-            index = self.score.index.tolist()
-            new_index = []
-            voice_con = []
-            for x in range(len(part)-self.settings['length']+1):
-                cont = []
-
-                if part[x] == 'Rest' or type(part[x]) == float:
-                    pass
-                else:
-                    cont.append(part[x])
-                    y = 1
-                    while (len(cont) < self.settings['length']) and (x+y < len(part)):
-                        if part[x+y] == 'Rest' or type(part[x+y]) == float:
-                            pass
-                        else:
-                            cont.append(part[x+y])
-                        y+=1
-                if len(cont) == self.settings['length']:
-                    voice_con.append(getContour(cont))
-                    new_index.append(index[x])
-
-            voice = pandas.Series(voice_con, index=new_index, name=str(v))
-            contours.append(voice)
-
-        result = pandas.concat(contours, axis=1)
+        result = pandas.concat(post, axis=1)
 
         return self.make_return(result.columns, [result[name] for name in result.columns])
@@ -27,6 +27,7 @@
 .. codeauthor:: Alexander Morgan
 .. codeauthor:: Christopher Antila <christopher@antila.ca>
 """
+from concurrent.futures import ProcessPoolExecutor
 import pandas
 import numpy
 from numpy import nan  # pylint: disable=no-name-in-module
@@ -94,6 +95,37 @@ h_ind = u'interval.HorizontalIntervalIndexer'
 bs_ind = u'meter.NoteBeatStrengthIndexer'
 dur_ind = u'meter.DurationIndexer'
 diss_types = u'dissonance.DissonanceIndexer'
+# The inputs of the DissonanceIndexer, in order.
+_inputs = (bs_ind, dur_ind, h_ind, int_ind)
+# Integer codes of the labels, and the weight of each code.
+_labels = numpy.array(list(_weights), dtype=object)
+_label_codes = {label: code for code, label in enumerate(_labels)}
+_label_weights = numpy.array([_weights[label] for label in _labels])
+
+
+def _valid_neighbours(valid):
+    """
+    Used internally by :class:`DissonanceIndexer` to find, for every
+    cell of a 2-dimensional boolean array of which cells hold events,
+    the row of the previous and of the next event in the same column.
+    Both are -1 where there is no such event. Looking these up replaces
+    scanning the column with ``last_valid_index()`` and
+    ``first_valid_index()`` for every dissonance, which made the
+    indexer quadratic in the length of the piece.
+
+    :returns: The previous and the next rows.
+    :rtype: 2-tuple of :class:`numpy.ndarray` of int
+    """
+    rows = numpy.arange(len(valid))[:, None]
+    # last event at or before each row, then shifted down one row
+    prev = numpy.maximum.accumulate(numpy.where(valid, rows, -1), axis=0)
+    prev = numpy.concatenate((numpy.full((1, valid.shape[1]), -1), prev[:-1]))
+    # first event at or after each row, then shifted up one row
+    nxt = numpy.where(valid, rows, len(valid))[::-1]
+    nxt = numpy.minimum.accumulate(nxt, axis=0)[::-1]
+    nxt = numpy.concatenate((nxt[1:], numpy.full((1, valid.shape[1]), len(valid))))
+    nxt[nxt == len(valid)] = -1
+    return prev, nxt
 
 
 class DissonanceIndexer(indexer.Indexer):
@@ -141,6 +173,36 @@ class DissonanceIndexer(indexer.Indexer):
     """
     required_score_type = 'pandas.DataFrame'
 
+    possible_settings = ['mp', 'pairs', 'offsets']
+    """
+    :keyword 'mp': Classifies the dissonances of each voice pair in a
+        separate process when True, or serially when False (default).
+        Only worth it for long pieces with many voices.
+
+    :type 'mp': boolean
+
+    :keyword 'pairs': The voice pairs to classify the dissonances of,
+        named as in the vertical intervals, e.g. '0,2'. Only the voices
+        in these pairs are returned, labelled from these pairs alone.
+        The default of ``None`` classifies all the pairs.
+
+    :type 'pairs': list of string or NoneType
+
+    :keyword 'offsets': The first and last offsets to return labels
+        for. Either may be ``None`` to run from the start or to the end
+        of the piece. The events before and after them are still looked
+        at where the dissonance types require it, so the labels are the
+        same as those of the whole piece at these offsets. The default
+        of ``None`` returns the whole piece.
+
+    :type 'offsets': 2-tuple of float or NoneType
+    """
+
+    default_settings = {'mp': False, 'pairs': None, 'offsets': None}
+
+    # When the 'pairs' setting names pairs that are not in the piece.
+    _UNKNOWN_PAIRS = 'DissonanceIndexer cannot find these voice pairs in the piece: {}'
+
     def __init__(self, score, settings=None):
         """
         :param score: The output from
@@ -149,18 +211,73 @@ class DissonanceIndexer(indexer.Indexer):
 
         :type score:  :class:`pandas.DataFrame`.
 
-        :param settings: This indexer uses no settings, so this is
-            ignored.
+        :param settings: See :const:`possible_settings`.
 
-        :type settings: NoneType
+        :type settings: dict or NoneType
         :raises: :exc:`RuntimeError` if ``score`` is the wrong type.
 
         :raises: :exc:`RuntimeError` if ``score`` is not a list of the
             same types.
 
+        :raises: :exc:`RuntimeError` if the 'pairs' setting names voice
+            pairs that are not in ``score``.
+
         """
         super(DissonanceIndexer, self).__init__(score)
-        self._score = pandas.concat(score, axis=1)
+        self._settings = DissonanceIndexer.default_settings.copy()
+        if settings is not None:
+            self._settings.update(settings)
+        # The inputs are named by their order, since the meter indexers
+        # do not name their results the way they are looked up here.
+        frames = []
+        for name, frame in zip(_inputs, score):
+            frame = frame.copy(deep=False)
+            frame.columns = pandas.MultiIndex.from_product(
+                ((name,), frame.columns.get_level_values(-1)), names=frame.columns.names)
+            frames.append(frame)
+        self._score = pandas.concat(frames, axis=1)
+        # The events before and after each one are found by position,
+        # so the rows have to be in order. Parts with more than one
+        # voice can leave them out of order.
+        if not self._score.index.is_monotonic_increasing:
+            self._score = self._score.sort_index(kind='mergesort')
+        self._prev_valid, self._next_valid = _valid_neighbours(self._score.notnull().values)
+        # The classifiers read from typed arrays rather than from
+        # self._score: self._cols gives the position of each column,
+        # self._floats holds the durations and beat strengths, and
+        # self._steps the horizontal intervals as integers, except where
+        # self._no_step marks a rest or no event.
+        self._cols = {col: i for i, col in enumerate(self._score.columns)}
+        self._floats = self._score.apply(pandas.to_numeric, errors='coerce').values.astype(float)
+        self._rests = (self._score == 'Rest').values
+        self._no_step = numpy.isnan(self._floats)
+        self._steps = numpy.where(self._no_step, 0, self._floats).astype(int)
+        if self._settings['pairs'] is not None:
+            unknown = [pair for pair in self._settings['pairs'] if (int_ind, pair) not in self._cols]
+            if unknown:
+                raise RuntimeError(DissonanceIndexer._UNKNOWN_PAIRS.format(unknown))
+
+    def _prev_attack(self, indx, col_indx):
+        """
+        Returns the position-based index of the last event before
+        ``indx`` in the passed column of ``self._score``, or ``None`` if
+        there is none. This is what ``last_valid_index()`` would find on
+        ``self._score.iloc[:indx, col_indx]``, but in constant time.
+        Events two steps back are found by passing the result back in.
+
+        """
+        prev = self._prev_valid[indx, col_indx]
+        return None if prev < 0 else prev
+
+    def _next_attack(self, indx, col_indx):
+        """
+        Returns the position-based index of the first event after
+        ``indx`` in the passed column of ``self._score``, or ``None`` if
+        there is none. The counterpart of ``_prev_attack``.
+
+        """
+        nxt = self._next_valid[indx, col_indx]
+        return None if nxt < 0 else nxt
 
     def _set_horiz_invl(self, indx, col_indx):
         """
@@ -168,12 +285,9 @@ class DissonanceIndexer(indexer.Indexer):
         passed.
 
         """
-        if self._score.iat[indx, col_indx] in _nan_rest:
-            horiz_int = self._score.iat[indx, col_indx]
-        else:
-            horiz_int = int(self._score.iat[indx, col_indx], 10)
-
-        return horiz_int
+        if self._no_step[indx, col_indx]:
+            return 'Rest' if self._rests[indx, col_indx] else nan
+        return self._steps[indx, col_indx]
 
     def _is_passing_or_neigh(self, indx, pair, event, prev_event):
         """
@@ -219,8 +333,6 @@ class DissonanceIndexer(indexer.Indexer):
         These columns are also calculated for the lower voice, replacing
         'upper' with 'lower'.
 
-        'letter'_temp == label-based index letter's row position
-
         'letter'_ind == int-based index of letter's row position
 
         dur_'letter' == duration of note or rest at the passed position
@@ -265,44 +377,40 @@ class DissonanceIndexer(indexer.Indexer):
             return (False,)
         # Upper voice variables
         upper = pair.split(',')[0]
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
-        bs_upper_col = self._score.columns.get_loc((bs_ind, upper))
-        a_temp = self._score.iloc[:indx, h_upper_col].last_valid_index()
-        a_ind = numpy.where(self._score.index == a_temp)[0][0]
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
+        bs_upper_col = self._cols[(bs_ind, upper)]
+        a_ind = self._prev_attack(indx, h_upper_col)
         a = self._set_horiz_invl(a_ind, h_upper_col)
         b = self._set_horiz_invl(indx, h_upper_col)
-        dur_a = self._score.iat[a_ind, d_upper_col]
-        dur_b = self._score.iat[indx, d_upper_col]
-        bs_b = self._score.iat[indx, bs_upper_col]
+        dur_a = self._floats[a_ind, d_upper_col]
+        dur_b = self._floats[indx, d_upper_col]
+        bs_b = self._floats[indx, bs_upper_col]
         if dur_a < dur_b:
-            a2_temp = self._score.iloc[:a_ind, h_upper_col].last_valid_index()
-            a2_ind = numpy.where(self._score.index == a2_temp)[0][0]
-            if a2_ind != None:
+            a2_ind = self._prev_attack(a_ind, h_upper_col)
+            if a2_ind is not None:
                 a2 = self._set_horiz_invl(a2_ind, h_upper_col)
                 if a2 == 1:
-                    dur_a2 = self._score.iat[a2_ind, d_upper_col]
+                    dur_a2 = self._floats[a2_ind, d_upper_col]
                     dur_a += dur_a2
 
         # Lower voice variables
         lower = pair.split(',')[1]
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
-        bs_lower_col = self._score.columns.get_loc((bs_ind, lower))
-        x_temp = self._score.iloc[:indx, h_lower_col].last_valid_index()
-        x_ind = numpy.where(self._score.index == x_temp)[0][0]
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
+        bs_lower_col = self._cols[(bs_ind, lower)]
+        x_ind = self._prev_attack(indx, h_lower_col)
         x = self._set_horiz_invl(x_ind, h_lower_col)
         y = self._set_horiz_invl(indx, h_lower_col)
-        dur_x = self._score.iat[x_ind, d_lower_col]
-        dur_y = self._score.iat[indx, d_lower_col]
-        bs_y = self._score.iat[indx, bs_lower_col]
+        dur_x = self._floats[x_ind, d_lower_col]
+        dur_y = self._floats[indx, d_lower_col]
+        bs_y = self._floats[indx, bs_lower_col]
         if dur_x < dur_y:
-            x2_temp = self._score.iloc[:x_ind, h_lower_col].last_valid_index()
-            x2_ind = numpy.where(self._score.index == x2_temp)[0][0]
-            if x2_ind != None:
+            x2_ind = self._prev_attack(x_ind, h_lower_col)
+            if x2_ind is not None:
                 x2 = self._set_horiz_invl(x2_ind, h_lower_col)
                 if x2 == 1:
-                    dur_x2 = self._score.iat[x2_ind, d_lower_col]
+                    dur_x2 = self._floats[x2_ind, d_lower_col]
                     dur_x += dur_x2
 
         # The dissonance can't be a passing tone.
@@ -389,46 +497,40 @@ class DissonanceIndexer(indexer.Indexer):
         if prev_event is None:
             return (False,)
         upper = pair.split(',')[0] # Upper voice variables
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
-        bs_upper_col = self._score.columns.get_loc((bs_ind, upper))
-        a_temp = self._score.iloc[:indx, h_upper_col].last_valid_index()
-        a_ind = numpy.where(self._score.index == a_temp)[0][0]
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
+        bs_upper_col = self._cols[(bs_ind, upper)]
+        a_ind = self._prev_attack(indx, h_upper_col)
         a = self._set_horiz_invl(a_ind, h_upper_col)
         b = self._set_horiz_invl(indx, h_upper_col)
         # NB b doesn't correspond to a note onset in upper-voice
         # suspensions
-        dur_a = self._score.iat[a_ind, d_upper_col]
-        dur_b = self._score.iat[indx, d_upper_col]
-        bs_b = self._score.iat[indx, bs_upper_col]
-        c_ind = 0
+        dur_a = self._floats[a_ind, d_upper_col]
+        dur_b = self._floats[indx, d_upper_col]
+        bs_b = self._floats[indx, bs_upper_col]
         c = 0
-        c_temp = self._score.iloc[indx + 1:, h_upper_col].first_valid_index()
-        if c_temp != None:
-            c_ind = numpy.where(self._score.index == c_temp)[0][0]
+        c_ind = self._next_attack(indx, h_upper_col)
+        if c_ind is not None:
             c = self._set_horiz_invl(c_ind, h_upper_col)
-            bs_c = self._score.iat[c_ind, bs_upper_col]
+            bs_c = self._floats[c_ind, bs_upper_col]
 
         lower = pair.split(',')[1] # Lower voice variables
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
-        bs_lower_col = self._score.columns.get_loc((bs_ind, lower))
-        x_temp = self._score.iloc[:indx, h_lower_col].last_valid_index()
-        x_ind = numpy.where(self._score.index == x_temp)[0][0]
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
+        bs_lower_col = self._cols[(bs_ind, lower)]
+        x_ind = self._prev_attack(indx, h_lower_col)
         x = self._set_horiz_invl(x_ind, h_lower_col)
         y = self._set_horiz_invl(indx, h_lower_col)
         # NB y doesn't correspond to a note onset in lower-voice
         # suspensions
-        dur_x = self._score.iat[x_ind, d_lower_col]
-        dur_y = self._score.iat[indx, d_lower_col]
-        bs_y = self._score.iat[indx, bs_lower_col]
-        z_ind = 0
+        dur_x = self._floats[x_ind, d_lower_col]
+        dur_y = self._floats[indx, d_lower_col]
+        bs_y = self._floats[indx, bs_lower_col]
         z = 0
-        z_temp = self._score.iloc[indx + 1:, h_lower_col].first_valid_index()
-        if z_temp != None:
-            z_ind = numpy.where(self._score.index == z_temp)[0][0]
+        z_ind = self._next_attack(indx, h_lower_col)
+        if z_ind is not None:
             z = self._set_horiz_invl(z_ind, h_lower_col)
-            bs_z = self._score.iat[z_ind, bs_lower_col]
+            bs_z = self._floats[z_ind, bs_lower_col]
 
         # NB this may need to be tweaked for the edge case where a
         # consonant 4th becomes a dissonant fourth suspension without
@@ -499,41 +601,35 @@ class DissonanceIndexer(indexer.Indexer):
         if prev_event is None:
             return (False,)
         upper = pair.split(',')[0] # Upper voice variables
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
-        bs_upper_col = self._score.columns.get_loc((bs_ind, upper))
-        a_temp = self._score.iloc[:indx, h_upper_col].last_valid_index()
-        a_ind = numpy.where(self._score.index == a_temp)[0][0]
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
+        bs_upper_col = self._cols[(bs_ind, upper)]
+        a_ind = self._prev_attack(indx, h_upper_col)
         a = self._set_horiz_invl(a_ind, h_upper_col)
         b = self._set_horiz_invl(indx, h_upper_col)
         # NB b doesn't correspond to a note onset in upper-voice
         # suspensions
-        dur_b = self._score.iat[indx, d_upper_col]
-        bs_b = self._score.iat[indx, bs_upper_col]
-        c_ind = 0
+        dur_b = self._floats[indx, d_upper_col]
+        bs_b = self._floats[indx, bs_upper_col]
         c = 0
-        c_temp = self._score.iloc[indx + 1:, h_upper_col].first_valid_index()
-        if c_temp != None:
-            c_ind = numpy.where(self._score.index == c_temp)[0][0]
+        c_ind = self._next_attack(indx, h_upper_col)
+        if c_ind is not None:
             c = self._set_horiz_invl(c_ind, h_upper_col)
 
         lower = pair.split(',')[1] # Lower voice variables
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
-        bs_lower_col = self._score.columns.get_loc((bs_ind, lower))
-        x_temp = self._score.iloc[:indx, h_lower_col].last_valid_index()
-        x_ind = numpy.where(self._score.index == x_temp)[0][0]
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
+        bs_lower_col = self._cols[(bs_ind, lower)]
+        x_ind = self._prev_attack(indx, h_lower_col)
         x = self._set_horiz_invl(x_ind, h_lower_col)
         y = self._set_horiz_invl(indx, h_lower_col)
         # NB y doesn't correspond to a note onset in lower-voice
         # suspensions
-        dur_y = self._score.iat[indx, d_lower_col]
-        bs_y = self._score.iat[indx, bs_lower_col]
-        z_ind = 0
+        dur_y = self._floats[indx, d_lower_col]
+        bs_y = self._floats[indx, bs_lower_col]
         z = 0
-        z_temp = self._score.iloc[indx + 1:, h_lower_col].first_valid_index()
-        if z_temp != None:
-            z_ind = numpy.where(self._score.index == z_temp)[0][0]
+        z_ind = self._next_attack(indx, h_lower_col)
+        if z_ind is not None:
             z = self._set_horiz_invl(z_ind, h_lower_col)
 
         if a == 2 or a == -2:
@@ -609,28 +705,26 @@ class DissonanceIndexer(indexer.Indexer):
         if prev_event is None:
             return (False,)
         upper = pair.split(',')[0] # Upper voice variables
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
-        bs_upper_col = self._score.columns.get_loc((bs_ind, upper))
-        a_temp = self._score.iloc[:indx, h_upper_col].last_valid_index()
-        a_ind = numpy.where(self._score.index == a_temp)[0][0]
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
+        bs_upper_col = self._cols[(bs_ind, upper)]
+        a_ind = self._prev_attack(indx, h_upper_col)
         a = self._set_horiz_invl(a_ind, h_upper_col)
         b = self._set_horiz_invl(indx, h_upper_col)
-        dur_a = self._score.iat[a_ind, d_upper_col]
-        dur_b = self._score.iat[indx, d_upper_col]
-        bs_b = self._score.iat[indx, bs_upper_col]
+        dur_a = self._floats[a_ind, d_upper_col]
+        dur_b = self._floats[indx, d_upper_col]
+        bs_b = self._floats[indx, bs_upper_col]
 
         lower = pair.split(',')[1] # Lower voice variables
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
-        bs_lower_col = self._score.columns.get_loc((bs_ind, lower))
-        x_temp = self._score.iloc[:indx, h_lower_col].last_valid_index()
-        x_ind = numpy.where(self._score.index == x_temp)[0][0]
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
+        bs_lower_col = self._cols[(bs_ind, lower)]
+        x_ind = self._prev_attack(indx, h_lower_col)
         x = self._set_horiz_invl(x_ind, h_lower_col)
         y = self._set_horiz_invl(indx, h_lower_col)
-        dur_x = self._score.iat[x_ind, d_lower_col]
-        dur_y = self._score.iat[indx, d_lower_col]
-        bs_y = self._score.iat[indx, bs_lower_col]
+        dur_x = self._floats[x_ind, d_lower_col]
+        dur_y = self._floats[indx, d_lower_col]
+        bs_y = self._floats[indx, bs_lower_col]
 
         '''
         .. todo:: make the beatstrength requirements dependent on the
@@ -701,26 +795,24 @@ class DissonanceIndexer(indexer.Indexer):
         if prev_event is None:
             return (False,)
         upper = pair.split(',')[0] # Upper voice variables
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
-        bs_upper_col = self._score.columns.get_loc((bs_ind, upper))
-        a_temp = self._score.iloc[:indx, h_upper_col].last_valid_index()
-        a_ind = numpy.where(self._score.index == a_temp)[0][0]
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
+        bs_upper_col = self._cols[(bs_ind, upper)]
+        a_ind = self._prev_attack(indx, h_upper_col)
         a = self._set_horiz_invl(a_ind, h_upper_col)
         b = self._set_horiz_invl(indx, h_upper_col)
-        dur_b = self._score.iat[indx, d_upper_col]
-        bs_b = self._score.iat[indx, bs_upper_col]
+        dur_b = self._floats[indx, d_upper_col]
+        bs_b = self._floats[indx, bs_upper_col]
 
         lower = pair.split(',')[1] # Lower voice variables
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
-        bs_lower_col = self._score.columns.get_loc((bs_ind, lower))
-        x_temp = self._score.iloc[:indx, h_lower_col].last_valid_index()
-        x_ind = numpy.where(self._score.index == x_temp)[0][0]
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
+        bs_lower_col = self._cols[(bs_ind, lower)]
+        x_ind = self._prev_attack(indx, h_lower_col)
         x = self._set_horiz_invl(x_ind, h_lower_col)
         y = self._set_horiz_invl(indx, h_lower_col)
-        dur_y = self._score.iat[indx, d_lower_col]
-        bs_y = self._score.iat[indx, bs_lower_col]
+        dur_y = self._floats[indx, d_lower_col]
+        bs_y = self._floats[indx, bs_lower_col]
 
         if (bs_b == .125 and a == -2 and b == 1 and dur_b == 1):
             return (True, upper, _ant_label, lower, _no_diss_label)
@@ -782,41 +874,35 @@ class DissonanceIndexer(indexer.Indexer):
         if prev_event is None:
             return (False,)
         upper = pair.split(',')[0] # Upper voice variables
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
-        bs_upper_col = self._score.columns.get_loc((bs_ind, upper))
-        a_temp = self._score.iloc[:indx, h_upper_col].last_valid_index()
-        a_ind = numpy.where(self._score.index == a_temp)[0][0]
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
+        bs_upper_col = self._cols[(bs_ind, upper)]
+        a_ind = self._prev_attack(indx, h_upper_col)
         a = self._set_horiz_invl(a_ind, h_upper_col)
         b = self._set_horiz_invl(indx, h_upper_col)
         # NB b doesn't correspond to a note onset in upper-voice
         # suspensions
-        dur_b = self._score.iat[indx, d_upper_col]
-        bs_b = self._score.iat[indx, bs_upper_col]
-        c_ind = 0
+        dur_b = self._floats[indx, d_upper_col]
+        bs_b = self._floats[indx, bs_upper_col]
         c = 0
-        c_temp = self._score.iloc[indx + 1:, h_upper_col].first_valid_index()
-        if c_temp != None:
-            c_ind = numpy.where(self._score.index == c_temp)[0][0]
+        c_ind = self._next_attack(indx, h_upper_col)
+        if c_ind is not None:
             c = self._set_horiz_invl(c_ind, h_upper_col)
 
         lower = pair.split(',')[1] # Lower voice variables
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
-        bs_lower_col = self._score.columns.get_loc((bs_ind, lower))
-        x_temp = self._score.iloc[:indx, h_lower_col].last_valid_index()
-        x_ind = numpy.where(self._score.index == x_temp)[0][0]
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
+        bs_lower_col = self._cols[(bs_ind, lower)]
+        x_ind = self._prev_attack(indx, h_lower_col)
         x = self._set_horiz_invl(x_ind, h_lower_col)
         y = self._set_horiz_invl(indx, h_lower_col)
         # NB y doesn't correspond to a note onset in lower-voice
         #suspensions
-        dur_y = self._score.iat[indx, d_lower_col]
-        bs_y = self._score.iat[indx, bs_lower_col]
-        z_ind = 0
+        dur_y = self._floats[indx, d_lower_col]
+        bs_y = self._floats[indx, bs_lower_col]
         z = 0
-        z_temp = self._score.iloc[indx + 1:, h_lower_col].first_valid_index()
-        if z_temp != None:
-            z_ind = numpy.where(self._score.index == z_temp)[0][0]
+        z_ind = self._next_attack(indx, h_lower_col)
+        if z_ind is not None:
             z = self._set_horiz_invl(z_ind, h_lower_col)
 
 
@@ -897,56 +983,48 @@ class DissonanceIndexer(indexer.Indexer):
         # to int.
 
         upper = pair.split(',')[0] # Upper voice variables
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
-        bs_upper_col = self._score.columns.get_loc((bs_ind, upper))
-        a_temp = self._score.iloc[:indx, h_upper_col].last_valid_index()
-        a_ind = numpy.where(self._score.index == a_temp)[0][0]
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
+        bs_upper_col = self._cols[(bs_ind, upper)]
+        a_ind = self._prev_attack(indx, h_upper_col)
         a = self._set_horiz_invl(a_ind, h_upper_col)
         b = self._set_horiz_invl(indx, h_upper_col)
         # NB b doesn't correspond to a note onset in upper-voice
         # suspensions
-        dur_a = self._score.iat[a_ind, d_upper_col]
-        dur_b = self._score.iat[indx, d_upper_col]
-        bs_b = self._score.iat[indx, bs_upper_col]
-        c_ind = 0
+        dur_a = self._floats[a_ind, d_upper_col]
+        dur_b = self._floats[indx, d_upper_col]
+        bs_b = self._floats[indx, bs_upper_col]
         c = 0
-        c_temp = self._score.iloc[indx + 1:, h_upper_col].first_valid_index()
-        if c_temp != None:
-            c_ind = numpy.where(self._score.index == c_temp)[0][0]
+        c_ind = self._next_attack(indx, h_upper_col)
+        if c_ind is not None:
             c = self._set_horiz_invl(c_ind, h_upper_col)
-            dur_c = self._score.iat[c_ind, d_upper_col]
+            dur_c = self._floats[c_ind, d_upper_col]
             dur_d = 0
-            d_temp = self._score.iloc[c_ind + 1:, h_upper_col].first_valid_index()
-            if d_temp != None:
-                d_ind = numpy.where(self._score.index == d_temp)[0][0]
-                dur_d = self._score.iat[d_ind, d_upper_col]
+            d_ind = self._next_attack(c_ind, h_upper_col)
+            if d_ind is not None:
+                dur_d = self._floats[d_ind, d_upper_col]
 
         lower = pair.split(',')[1] # Lower voice variables
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
-        bs_lower_col = self._score.columns.get_loc((bs_ind, lower))
-        x_temp = self._score.iloc[:indx, h_lower_col].last_valid_index()
-        x_ind = numpy.where(self._score.index == x_temp)[0][0]
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
+        bs_lower_col = self._cols[(bs_ind, lower)]
+        x_ind = self._prev_attack(indx, h_lower_col)
         x = self._set_horiz_invl(x_ind, h_lower_col)
         y = self._set_horiz_invl(indx, h_lower_col)
         # NB y doesn't correspond to a note onset in lower-voice
         # suspensions
-        dur_x = self._score.iat[x_ind, d_lower_col]
-        dur_y = self._score.iat[indx, d_lower_col]
-        bs_y = self._score.iat[indx, bs_lower_col]
-        z_ind = 0
+        dur_x = self._floats[x_ind, d_lower_col]
+        dur_y = self._floats[indx, d_lower_col]
+        bs_y = self._floats[indx, bs_lower_col]
         z = 0
-        z_temp = self._score.iloc[indx + 1:, h_lower_col].first_valid_index()
-        if z_temp != None:
-            z_ind = numpy.where(self._score.index == z_temp)[0][0]
+        z_ind = self._next_attack(indx, h_lower_col)
+        if z_ind is not None:
             z = self._set_horiz_invl(z_ind, h_lower_col)
-            dur_z = self._score.iat[z_ind, d_lower_col]
+            dur_z = self._floats[z_ind, d_lower_col]
             dur_z2 = 0
-            z2_temp = self._score.iloc[z_ind + 1:, h_lower_col].first_valid_index()
-            if z2_temp != None:
-                z2_ind = numpy.where(self._score.index == z2_temp)[0][0]
-                dur_z2 = self._score.iat[z2_ind, d_lower_col]
+            z2_ind = self._next_attack(z_ind, h_lower_col)
+            if z2_ind is not None:
+                dur_z2 = self._floats[z2_ind, d_lower_col]
 
         if ((diss == 2 or diss == -7) and dur_b == 1
             and ((y == -2 and dur_y > 2) or (y == 1 and dur_y == 2))
@@ -1012,31 +1090,32 @@ class DissonanceIndexer(indexer.Indexer):
         if prev_event is None:
             return (False,)
         upper = pair.split(',')[0] # Upper voice variables
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
-        bs_upper_col = self._score.columns.get_loc((bs_ind, upper))
-        a_temp = self._score.iloc[:indx, h_upper_col].last_valid_index()
-        a_ind = numpy.where(self._score.index == a_temp)[0][0]
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
+        bs_upper_col = self._cols[(bs_ind, upper)]
+        a_ind = self._prev_attack(indx, h_upper_col)
         a = self._set_horiz_invl(a_ind, h_upper_col)
         b = self._set_horiz_invl(indx, h_upper_col)
-        dur_b = self._score.iat[indx, d_upper_col]
-        bs_b = self._score.iat[indx, bs_upper_col]
+        dur_b = self._floats[indx, d_upper_col]
+        bs_b = self._floats[indx, bs_upper_col]
 
         lower = pair.split(',')[1] # Lower voice variables
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
-        bs_lower_col = self._score.columns.get_loc((bs_ind, lower))
-        x_temp = self._score.iloc[:indx, h_lower_col].last_valid_index()
-        x_ind = numpy.where(self._score.index == x_temp)[0][0]
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
+        bs_lower_col = self._cols[(bs_ind, lower)]
+        x_ind = self._prev_attack(indx, h_lower_col)
         x = self._set_horiz_invl(x_ind, h_lower_col)
         y = self._set_horiz_invl(indx, h_lower_col)
-        dur_y = self._score.iat[indx, d_lower_col]
-        bs_y = self._score.iat[indx, bs_lower_col]
+        dur_y = self._floats[indx, d_lower_col]
+        bs_y = self._floats[indx, bs_lower_col]
 
-        if bs_b == .125 and ((a == 2 and b < -2) or (a == -2 and b > 2)):
+        # A rest is not a leap away from the dissonance.
+        if (bs_b == .125 and b not in _nan_rest and
+                ((a == 2 and b < -2) or (a == -2 and b > 2))):
             # Upper note *échappée*
             return (True, upper, _echappee, lower, _no_diss_label)
-        if bs_y == .125 and ((x == 2 and y < -2) or (x == -2 and y > 2)):
+        if (bs_y == .125 and y not in _nan_rest and
+                ((x == 2 and y < -2) or (x == -2 and y > 2))):
             # Lower note *échappée*
             return (True, upper, _no_diss_label, lower, _echappee)
         return (False,)
@@ -1098,16 +1177,16 @@ class DissonanceIndexer(indexer.Indexer):
 
         """
         upper = pair.split(',')[0] # Upper voice variables
-        h_upper_col = self._score.columns.get_loc((h_ind, upper))
-        d_upper_col = self._score.columns.get_loc((dur_ind, upper))
+        h_upper_col = self._cols[(h_ind, upper)]
+        d_upper_col = self._cols[(dur_ind, upper)]
         b = self._set_horiz_invl(indx, h_upper_col)
-        dur_b = self._score.iat[indx, d_upper_col]
+        dur_b = self._floats[indx, d_upper_col]
 
         lower = pair.split(',')[1] # Lower voice variables
-        h_lower_col = self._score.columns.get_loc((h_ind, lower))
-        d_lower_col = self._score.columns.get_loc((dur_ind, lower))
+        h_lower_col = self._cols[(h_ind, lower)]
+        d_lower_col = self._cols[(dur_ind, lower)]
         y = self._set_horiz_invl(indx, h_lower_col)
-        dur_y = self._score.iat[indx, d_lower_col]
+        dur_y = self._floats[indx, d_lower_col]
 
         if b is not nan and y is nan: # Upper voice is diss
             return (True, upper, _unexplainable, lower, _no_diss_label)
@@ -1160,8 +1239,8 @@ class DissonanceIndexer(indexer.Indexer):
         considered consonant based whether or not the lower voice of the
         suspect_diss forms an interval that causes us to deem the fourth
         or fifth consonant, as determined by the cons_makers list below.
-        The function should be called once for each potentially
-        consonant fourth or fifth.
+        The function checks one potentially consonant fourth or fifth;
+        ``run`` checks all of them at once with ``_check_all_4s_5s``.
         :param pair_name: Name of pair that has the potentially
             consonant fourth or fifth.
 
@@ -1187,51 +1266,171 @@ class DissonanceIndexer(indexer.Indexer):
         :rtype: string
 
         """
-        cons_made = False
-        # Find the offset of the next event in the voice pair to know
-        # when the interval ends.
-        end_temp = self._score.loc[:, (int_ind, pair_name)].iloc[iloc_indx +1:].first_valid_index()
-        if end_temp != None:
-            # for the case where a 4th or 5th is in the last attack of
-            # the piece.
-            end_iloc = numpy.where(self._score.index == end_temp)[0][0]
-        else:
-            end_iloc = len(self._score) + 1
+        pair_col = simuls.columns.get_loc(pair_name)
+        return self._check_all_4s_5s(simuls, [iloc_indx], [pair_col], [suspect_diss])[0]
 
-        if '-' in suspect_diss:
-            # set the voice that is spelled lower
-            # as the lower voice.
-            lower_voice = pair_name.split(',')[0]
-        else:
-            lower_voice = pair_name.split(',')[1]
-
-        for voice_combo in simuls:
-            if (lower_voice == voice_combo.split(',')[0]
-                and voice_combo != pair_name):
-                # look at other pairs that have lower_voice as their
-                # upper voice. Could be optimized.
-                if (simuls[voice_combo].iloc[iloc_indx:end_iloc].any()
-                    in _cons_makers[suspect_diss]):
-                    # this chained-indexing is actually faster than the
-                    # alternative.
-                    cons_made = True
-                    break
-            elif (lower_voice == voice_combo.split(',')[1]
-                and voice_combo != pair_name):
-                # look at other pairs that have lower_voice as their
-                # lower voice. Could be optimized.
-                if (simuls[voice_combo].iloc[iloc_indx:end_iloc].any()
-                    in _Xed_makers[suspect_diss]):
-                    cons_made = True
-                    break
-
-        if cons_made:
-            # 'C' is for consonant and it's good enough for me.
-            return ('C' + suspect_diss)
-        else:
-            # 'D' shows that the fourth or fifth analyzed turned out to
-            # be dissonant.
-            return ('D' + suspect_diss)
+    def _check_all_4s_5s(self, simuls, ilocs, pair_cols, suspects):
+        """
+        Does what ``check_4s_5s`` does for every potentially consonant
+        fourth or fifth in the piece at once. Instead of scanning the
+        other voice pairs of each fourth or fifth by name, the voices of
+        each pair are looked up in arrays and the intervals of
+        ``simuls`` are coded as integers, so that the intervals sounding
+        against the lower voice of each suspect can be checked against
+        ``_cons_makers`` and ``_Xed_makers`` all together.
+        As with ``check_4s_5s``, the interval that counts in each other
+        pair is the first one sounding between the suspect's onset and
+        the next event in its own pair.
+        :param simuls: The vertical intervals with the last interval of
+            each pair carried forward until the next one.
+
+        :type simuls: :class:`pandas.DataFrame`
+
+        :param ilocs: Pandas iloc numbers of the suspects' rows.
+
+        :type ilocs: list of int
+
+        :param pair_cols: Column numbers in ``simuls`` of the suspects'
+            voice pairs.
+
+        :type pair_cols: list of int
+
+        :param suspects: The suspects' interval names with quality and
+            direction, all of which must be in
+            ``_potential_consonances``.
+
+        :type suspects: list of string
+
+        :returns: The suspects with 'C' or 'D' prepended, as returned
+            by ``check_4s_5s``.
+
+        :rtype: list of string
+
+        """
+        ilocs = numpy.asarray(ilocs, dtype=int)
+        pair_cols = numpy.asarray(pair_cols, dtype=int)
+        # Which voices make up each pair, as integers.
+        pairs = [pair.split(',') for pair in simuls.columns]
+        voices = {voice: i for i, voice in enumerate(sorted(set(v for pair in pairs for v in pair)))}
+        upper_of = numpy.array([voices[pair[0]] for pair in pairs], dtype=int)
+        lower_of = numpy.array([voices[pair[1]] for pair in pairs], dtype=int)
+        # The voice that is spelled lower in each suspect.
+        descending = numpy.array(['-' in diss for diss in suspects], dtype=bool)
+        lower_voice = numpy.where(descending, upper_of[pair_cols], lower_of[pair_cols])
+
+        # Code the intervals as integers. Code -1 (no interval yet) maps
+        # to the last column of the tables, which never makes a
+        # consonance.
+        codes, names = pandas.factorize(simuls.values.ravel())
+        codes = codes.reshape(simuls.shape)
+        kinds = sorted(_potential_consonances)
+        kind_of = numpy.array([kinds.index(diss) for diss in suspects], dtype=int)
+        cons_table = numpy.array([[name in _cons_makers[kind] for name in names] + [False]
+                                  for kind in kinds], dtype=bool)
+        xed_table = numpy.array([[name in _Xed_makers[kind] for name in names] + [False]
+                                 for kind in kinds], dtype=bool)
+
+        # Each suspect lasts until the next event in its own pair.
+        score_cols = numpy.array([self._cols[(int_ind, pair)]
+                                  for pair in simuls.columns], dtype=int)
+        ends = self._next_valid[ilocs, score_cols[pair_cols]]
+        ends[ends < 0] = len(self._score) + 1
+        # The first interval sounding in each pair during each suspect.
+        # simuls is carried forward, so this is the interval at the
+        # suspect's onset unless the pair has not started yet.
+        sounding = codes[ilocs]
+        has_code = codes >= 0
+        first_row = numpy.where(has_code.any(axis=0), has_code.argmax(axis=0), len(codes))
+        first_code = numpy.full(len(pairs), -1, dtype=int)
+        started = first_row < len(codes)
+        first_code[started] = codes[first_row[started], started]
+        late = (sounding < 0) & (first_row[None, :] < ends[:, None])
+        sounding = numpy.where(late, first_code[None, :], sounding)
+
+        # Look at the other pairs that have the suspect's lower voice as
+        # their upper voice, then as their lower voice.
+        others = numpy.arange(len(pairs))[None, :] != pair_cols[:, None]
+        as_upper = (upper_of[None, :] == lower_voice[:, None]) & others
+        as_lower = (lower_of[None, :] == lower_voice[:, None]) & others
+        cons_made = ((as_upper & cons_table[kind_of[:, None], sounding]) |
+                     (as_lower & xed_table[kind_of[:, None], sounding])).any(axis=1)
+
+        # 'C' is for consonant and 'D' shows that the fourth or fifth
+        # analyzed turned out to be dissonant.
+        return [('C' if made else 'D') + diss for made, diss in zip(cons_made, suspects)]
+
+    def _in_window(self):
+        """
+        Returns which rows of ``self._score`` are within the 'offsets'
+        setting, as a boolean array.
+
+        """
+        in_window = numpy.ones(len(self._score), dtype=bool)
+        if self._settings['offsets'] is not None:
+            start, end = self._settings['offsets']
+            if start is not None:
+                in_window &= self._score.index >= start
+            if end is not None:
+                in_window &= self._score.index <= end
+        return in_window
+
+    def _classify_pair(self, pair_title, events, in_window=None):
+        """
+        Classifies every dissonance of one voice pair. Only the typed
+        arrays made in ``__init__`` are read, so the voice pairs of a
+        piece can be classified in parallel.
+        :param pair_title: name of the voice pair.
+
+        :type pair_title: string with the lower numbered voice first and
+            a comma separating the two voices.
+
+        :param events: The pair's vertical intervals, with the fourths
+            and fifths to classify already decided by
+            ``_check_all_4s_5s``.
+
+        :type events: :class:`numpy.ndarray`
+
+        :param in_window: Which rows to classify. The default of
+            ``None`` classifies all of them.
+
+        :type in_window: :class:`numpy.ndarray` of bool or NoneType
+
+        :returns: The codes of the labels of the upper voice and of the
+            lower voice at each row, '-' where the pair is consonant or
+            the row was not classified.
+
+        :rtype: 2-tuple of :class:`numpy.ndarray`
+
+        """
+        pair_col = self._cols[(int_ind, pair_title)]
+        # Code the intervals to find the dissonant ones all at once. The
+        # last entry is for code -1, i.e. no interval, which is not
+        # ignored.
+        codes, names = pandas.factorize(events)
+        ignored = numpy.array([name in _ignored for name in names] + [False], dtype=bool)
+        upper = numpy.full(len(events), _label_codes[_no_diss_label], dtype=numpy.int8)
+        lower = upper.copy()
+        dissonant = ~ignored[codes]
+        if in_window is not None:
+            dissonant &= in_window
+        for i in numpy.flatnonzero(dissonant):
+            prev_event = self._prev_attack(i, pair_col)
+            if prev_event is not None:
+                prev_event = events[prev_event]
+            # if prev_event not in _consonances and i > 0
+            #   and (ret.iat[i-1, top_voice] in
+            #   (_pass_rp_label, _pass_dp_label)
+            #   or ret.iat[i-1, bott_voice] in
+            #   (_pass_rp_label, _pass_dp_label)):
+            #   prev_event = 'm3'
+            # If there's a passing tone at the preceding note,
+            # call the prev_event a consonance (any consonance
+            # will do) so that there can be two passing tones in
+            # a row.
+            diss_analysis = self.classify(int(i), pair_title, events[i], prev_event)
+            upper[i] = _label_codes[diss_analysis[2]]
+            lower[i] = _label_codes[diss_analysis[4]]
+        return upper, lower
 
     def run(self):
         """
@@ -1255,47 +1454,59 @@ class DissonanceIndexer(indexer.Indexer):
         """
         diss_ints = self._score[int_ind].copy(deep=True)
         simuls = diss_ints.ffill()
+        pairs = list(diss_ints.columns)
+        if self._settings['pairs'] is not None:
+            pairs = list(self._settings['pairs'])
+        pair_cols = numpy.array([diss_ints.columns.get_loc(pair) for pair in pairs], dtype=int)
+        in_window = self._in_window()
+        window = numpy.flatnonzero(in_window)
+
+        # NB: all events other than fourths and fifths are definite
+        # consonances or dissonances or don't qualify as interval
+        # onsets. Decide at once the fourths and fifths of the pairs in
+        # the window, and those just before it that events in the window
+        # are compared with.
+        ints = diss_ints.values.copy()
+        needed = numpy.zeros(ints.shape, dtype=bool)
+        needed[numpy.ix_(window, pair_cols)] = True
+        score_cols = numpy.array([self._cols[(int_ind, pair)] for pair in pairs], dtype=int)
+        before = self._prev_valid[numpy.ix_(window, score_cols)]
+        has_before = before >= 0
+        needed[before[has_before], numpy.broadcast_to(pair_cols, before.shape)[has_before]] = True
+        rows, cols = numpy.nonzero(diss_ints.isin(_potential_consonances).values & needed)
+        if len(rows):
+            ints[rows, cols] = self._check_all_4s_5s(simuls, rows, cols, ints[rows, cols])
+
+        # The voice pairs are independent of each other.
+        events = [ints[:, col] for col in pair_cols]
+        if self._settings['offsets'] is None:
+            in_window = None
+        if self._settings['mp'] and len(pairs) > 1:
+            with ProcessPoolExecutor() as pool:
+                labels = list(pool.map(self._classify_pair, pairs, events, [in_window] * len(pairs)))
+        else:
+            labels = [self._classify_pair(pair, evnts, in_window) for pair, evnts in zip(pairs, events)]
+
+        # Each voice keeps the first of the heaviest labels that the
+        # pairs it is in gave it, in the order of the pairs, just as if
+        # the labels were assigned one pair at a time and only replaced
+        # by heavier ones.
+        parts = self._score[dur_ind].columns
+        if self._settings['pairs'] is not None:
+            parts = parts[parts.isin([voice for pair in pairs for voice in pair.split(',')])]
+        codes = numpy.full((len(pairs) + 1, len(window), len(parts)),
+                           _label_codes[_no_diss_label], dtype=numpy.int8)
+        for k, (pair_title, (upper, lower)) in enumerate(zip(pairs, labels)):
+            voices = pair_title.split(',')
+            codes[k + 1, :, parts.get_loc(voices[0])] = upper[window]
+            codes[k + 1, :, parts.get_loc(voices[1])] = lower[window]
+        heaviest = _label_weights[codes].argmax(axis=0)
+        codes = numpy.take_along_axis(codes, heaviest[None], axis=0)[0]
 
-        iterables = [[diss_types], self._score[dur_ind].columns]
+        iterables = [[diss_types], parts]
         d_types_multi_index = pandas.MultiIndex.from_product(iterables, names = ['Indexer', 'Parts'])
-        ret = pandas.DataFrame(index=self._score.index, columns=d_types_multi_index)
-        ret.fillna(_no_diss_label, inplace=True)
-
-        for col, pair_title in enumerate(diss_ints.columns):
-            voices = pair_title.split(',')
-            # assign top and bottom voices as integers
-            top_voice = self._score[dur_ind].columns.get_loc(voices[0])
-            bott_voice = self._score[dur_ind].columns.get_loc(voices[1])
-            for i, event in enumerate(diss_ints[pair_title]):
-                if event in _potential_consonances:
-                    # NB: all other events are definite consonances or
-                    # dissonances or don't qualify as interval onsets.
-                    event = self.check_4s_5s(pair_title, i, event, simuls)
-                    diss_ints.iat[i, col] = event
-
-                # The interval must be dissonant and neither voice
-                # should already have a dissonance label assigned.
-                if (event not in _ignored):
-                    # and ret.iat[i, top_voice] in _passes
-                    # and ret.iat[i, bott_voice] in _passes):
-                    prev_event = diss_ints[pair_title].iloc[:i].last_valid_index()
-                    if prev_event is not None:
-                        prev_event = diss_ints.at[prev_event, pair_title]
-                    # if prev_event not in _consonances and i > 0
-                    #   and (ret.iat[i-1, top_voice] in
-                    #   (_pass_rp_label, _pass_dp_label)
-                    #   or ret.iat[i-1, bott_voice] in
-                    #   (_pass_rp_label, _pass_dp_label)):
-                    #   prev_event = 'm3'
-                    # If there's a passing tone at the preceding note,
-                    # call the prev_event a consonance (any consonance
-                    # will do) so that there can be two passing tones in
-                    # a row.
-                    diss_analysis = self.classify(i, pair_title, event, prev_event)
-                    if (_weights[ret.iat[i, top_voice]] < _weights[diss_analysis[2]]):
-                        ret.iat[i, top_voice] = diss_analysis[2]
-                    if (_weights[ret.iat[i, bott_voice]] < _weights[diss_analysis[4]]):
-                        ret.iat[i, bott_voice] = diss_analysis[4]
+        ret = pandas.DataFrame(_labels[codes], index=self._score.index[window],
+                               columns=d_types_multi_index)
 
         '''
         # Remove lingering unexplainable labels from notes that are only
@@ -1335,4 +1546,4 @@ class DissonanceIndexer(indexer.Indexer):
                 ret.iat[ndx, unknowns[1][x]] = _only_diss_w_diss
         '''
 
-        return ret
+        return ret
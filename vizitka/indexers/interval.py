@@ -36,6 +36,7 @@ same part.
 import pandas
 from music21 import note, interval, pitch
 from vizitka.indexers import indexer
+from vizitka.models.vocabulary import as_vocabulary
 from itertools import combinations
 
 _names = ('Indexer', 'Part')
@@ -272,6 +273,10 @@ class IntervalIndexer(indexer.Indexer):
         If True (default), prepends a '-' before everything else if the first note passed is higher \
         than the second.
     :keyword boolean 'mp': Multiprocesses when True (default) or processes serially when False.
+    :keyword 'vocabulary': If given, the intervals are replaced by their int32 codes in this \
+        :class:`~vizitka.models.vocabulary.Vocabulary` (or the vocabulary file at this path), with \
+        -1 where there is no interval. Sharing one vocabulary across a corpus makes the codes of \
+        every piece comparable. The default is ``None``, which returns the interval names.
  
     **Example:**
 
@@ -281,7 +286,8 @@ class IntervalIndexer(indexer.Indexer):
     ip.get('vertical_interval', settings)
     """
     required_score_type = 'pandas.DataFrame'
-    default_settings = {'simple or compound': 'compound', 'quality': False, 'directed':True, 'mp': True}
+    default_settings = {'simple or compound': 'compound', 'quality': False, 'directed':True, 'mp': True,
+                        'vocabulary': None}
     "A dict of default settings for the :class:`IntervalIndexer`."
 
     def __init__(self, score, settings=None):
@@ -326,6 +332,16 @@ class IntervalIndexer(indexer.Indexer):
 
         self._indexer_func = indexer_funcs[self._indexer_number]
 
+    def _encode(self, post):
+        """
+        Used internally by :meth:`run` to replace the intervals with their codes when the
+        ``'vocabulary'`` setting is given.
+        """
+        vocabulary = as_vocabulary(self._settings['vocabulary'])
+        if vocabulary is None:
+            return post
+        return vocabulary.encode_frame(post)
+
     def run(self):
         """
         Make a new index of the piece.
@@ -340,7 +356,7 @@ class IntervalIndexer(indexer.Indexer):
         labels = ['{},{}'.format(x, y) for x, y in combinations(self._score.columns.get_level_values(1), 2)]
         post.columns = pandas.MultiIndex.from_product((('interval.IntervalIndexer',), labels), names=_names)
 
-        return post
+        return self._encode(post)
 
 
 class HorizontalIntervalIndexer(IntervalIndexer):
@@ -365,6 +381,10 @@ class HorizontalIntervalIndexer(IntervalIndexer):
         the offset of the later note in the interval. The default is ``False``, which gives \
         horizontal intervals the offset of the first note in the interval.
     :keyword boolean 'mp': Multiprocesses when True (default) or processes serially when False.
+    :keyword 'vocabulary': If given, the intervals are replaced by their int32 codes in this \
+        :class:`~vizitka.models.vocabulary.Vocabulary` (or the vocabulary file at this path), with \
+        -1 where there is no interval. Sharing one vocabulary across a corpus makes the codes of \
+        every piece comparable. The default is ``None``, which returns the interval names.
 
      **Example:**
      
@@ -375,7 +395,7 @@ class HorizontalIntervalIndexer(IntervalIndexer):
     """
 
     default_settings = {'simple or compound': 'compound', 'quality': False, 'directed':True, 
-                        'horiz_attach_later': False, 'mp': True}
+                        'horiz_attach_later': False, 'mp': True, 'vocabulary': None}
 
     def __init__(self, score, settings=None):
         """
@@ -409,7 +429,7 @@ class HorizontalIntervalIndexer(IntervalIndexer):
         post.columns = pandas.MultiIndex.from_product((('interval.HorizontalIntervalIndexer',),
                                                        part_labels), names=_names)
 
-        return post
+        return self._encode(post)
 
 
 class IntervalReindexer(HorizontalIntervalIndexer):
@@ -441,4 +461,4 @@ class IntervalReindexer(HorizontalIntervalIndexer):
         self._indexer_func = indexer_func
 
     def run(self):
-        return self._score.applymap(self._indexer_func)
+        return self._encode(self._score.applymap(self._indexer_func))
@@ -33,12 +33,38 @@ Indexers for metric concerns.
 # with Sphinx!
 # pylint: disable=W0105
 
+import numpy
 import pandas
 from vizitka.indexers import indexer
 
 tie_types = {'start': '[', 'continue': '_', 'stop': ']'}
 nan = float('nan')
 
+def _next_valid(valid):
+    """
+    Used internally by :class:`DurationIndexer`. For every row of a 2-dimensional boolean array,
+    find the next row below it that is ``True`` in each column, or the number of rows if there is
+    none.
+    """
+    rows = numpy.where(valid, numpy.arange(len(valid))[:, None], len(valid))
+    later = numpy.minimum.accumulate(rows[::-1], axis=0)[::-1]
+    return numpy.concatenate((later[1:], numpy.full((1, valid.shape[1]), len(valid))))
+
+def _measure_starts(offsets, lengths, end):
+    """
+    Used internally by :class:`MeasureIndexer` to lay out the measures of one part from its time
+    signatures. Each time signature, at its offset, starts as many measures of its length as fit
+    before the next time signature, or before the ``end`` of the part for the last one.
+
+    :returns: The offsets at which the measures start.
+    :rtype: :class:`numpy.ndarray`
+    """
+    stops = numpy.append(offsets[1:], end)
+    counts = numpy.maximum((stops - offsets) / lengths, 0).astype(numpy.int64)
+    segment = numpy.repeat(numpy.arange(len(offsets)), counts)
+    within = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return offsets[segment] + within * lengths[segment]
+
 def beatstrength_ind_func(event):
     """
     Used internally by :class:`NoteBeatStrengthIndexer`. Convert
@@ -56,6 +82,21 @@ def beatstrength_ind_func(event):
         return event
     return event.beatStrength
 
+def _accent_table(time_sig):
+    """
+    Used internally by :class:`NoteBeatStrengthIndexer` to read the accents of a music21
+    :class:`~music21.meter.TimeSignature` once: the offsets in the measure at which the spans of
+    its first accent level start, their weights, the weight of all other offsets, and the length of
+    the measure. This is what :meth:`~music21.meter.TimeSignature.getAccentWeight` consults for
+    every note.
+    """
+    level = time_sig.accentSequence.getLevel(0)
+    lengths = numpy.array([float(span.duration.quarterLength) for span in level])
+    starts = numpy.concatenate(([0.0], numpy.cumsum(lengths)[:-1]))
+    weights = numpy.array([float(span.weight) for span in level])
+    min_weight = min([span.weight for span in time_sig.accentSequence._partition]) * .5
+    return starts, weights, min_weight, float(time_sig.barDuration.quarterLength)
+
 def measure_ind_func(event):
     """
     The function that indexes the measure numbers of each part in a piece. Unlike most other
@@ -124,19 +165,125 @@ class NoteBeatStrengthIndexer(indexer.Indexer):
 
     required_score_type = 'pandas.DataFrame'
 
-    def __init__(self, score):
+    possible_settings = ['method', 'measures', 'time_signatures', 'ticks_per_quarter']
+    """
+    :keyword 'method': ``'music21'`` (the default) asks music21 for the beat strength of every
+        event. ``'arithmetic'`` works it out from the offset of each event in its measure and the
+        accents of the prevailing time signature, as music21 does, but for whole parts at once and
+        without a context search per event. Events that are not in a measure or have no time
+        signature before them are still given to music21.
+    :type 'method': str
+    :keyword 'measures': The music21 :class:`~music21.stream.Measure` objects of each part, in a
+        :class:`DataFrame` indexed like ``score``. Required by the ``'arithmetic'`` method.
+    :type 'measures': :class:`pandas.DataFrame`
+    :keyword 'time_signatures': The music21 :class:`~music21.meter.TimeSignature` objects of each
+        part, in a :class:`DataFrame` indexed like ``score``. Required by the ``'arithmetic'``
+        method.
+    :type 'time_signatures': :class:`pandas.DataFrame`
+    :keyword 'ticks_per_quarter': If the offsets are integer ticks, the number of ticks in a
+        quarter note.
+    :type 'ticks_per_quarter': int or None
+    """
+
+    default_settings = {'method': 'music21', 'measures': None, 'time_signatures': None,
+                        'ticks_per_quarter': None}
+
+    # When the 'method' setting is not one of the methods.
+    _UNKNOWN_METHOD = 'NoteBeatStrengthIndexer has no "{}" method. Use "music21" or "arithmetic".'
+    # When the 'arithmetic' method is missing its measures or time signatures.
+    _MISSING_CONTEXT = ('NoteBeatStrengthIndexer needs the "measures" and "time_signatures" '
+                        'settings for the "arithmetic" method.')
+
+    def __init__(self, score, settings=None):
         """
         :param score: A dataframe of the note, rest, and chord objects in a piece.
         :type score: pandas Dataframe
+        :param settings: See :const:`possible_settings`.
+        :type settings: dict or None
 
         :raises: :exc:`RuntimeError` if ``score`` is the wrong type.
+        :raises: :exc:`RuntimeError` if the ``'method'`` setting is unknown, or is
+            ``'arithmetic'`` without the ``'measures'`` and ``'time_signatures'`` settings.
         """
 
         super(NoteBeatStrengthIndexer, self).__init__(score, None)
         self._types = ('Note', 'Rest', 'Chord')
         self._indexer_func = beatstrength_ind_func
+        self._settings = NoteBeatStrengthIndexer.default_settings.copy()
+        if settings is not None:
+            self._settings.update(settings)
+        if self._settings['method'] not in ('music21', 'arithmetic'):
+            raise RuntimeError(NoteBeatStrengthIndexer._UNKNOWN_METHOD.format(self._settings['method']))
+        if self._settings['method'] == 'arithmetic' and (self._settings['measures'] is None or
+                                                         self._settings['time_signatures'] is None):
+            raise RuntimeError(NoteBeatStrengthIndexer._MISSING_CONTEXT)
+
+    def _part_strengths(self, events, offsets, measures, time_sigs):
+        """
+        Used internally by :meth:`run` to work out the beat strengths of the events of one part
+        from the offsets of its measures and time signatures, as
+        :attr:`~music21.base.Music21Object.beatStrength` does: the offset in the measure, counting
+        the padding of a pick-up measure, wrapped around the length of the time signature's measure
+        if it is longer, then the weight of the accent span that starts there, or half of the
+        smallest weight if no span starts there.
+        """
+        if len(time_sigs) == 0:
+            return numpy.array([beatstrength_ind_func(event) for event in events], dtype=float)
+        scale = float(self._settings['ticks_per_quarter'] or 1)
+        if len(measures) == 0:
+            # music21 counts from the start of a part without measures
+            m_offs, padding = numpy.zeros(1), numpy.zeros(1)
+        else:
+            m_offs = measures.index.values.astype(float)
+            padding = numpy.array([float(meas.paddingLeft) for meas in measures.values])
+        t_offs = time_sigs.index.values.astype(float)
+        in_measure = numpy.searchsorted(m_offs, offsets, 'right') - 1
+        in_time_sig = numpy.searchsorted(t_offs, offsets, 'right') - 1
+        post = numpy.full(len(offsets), nan)
+        # the offset of each time signature in its own measure
+        ts_measure = numpy.searchsorted(m_offs, t_offs, 'right') - 1
+        ts_offs = numpy.where(ts_measure >= 0, (t_offs - m_offs[numpy.maximum(ts_measure, 0)]) / scale, 0.0)
+        pos = (offsets - m_offs[numpy.maximum(in_measure, 0)]) / scale + padding[numpy.maximum(in_measure, 0)]
+        tables = {}
+        for sig in numpy.unique(in_time_sig[(in_measure >= 0) & (in_time_sig >= 0)]):
+            time_sig = time_sigs.iat[sig]
+            if id(time_sig) not in tables:
+                tables[id(time_sig)] = _accent_table(time_sig)
+            starts, weights, min_weight, bar = tables[id(time_sig)]
+            rows = numpy.flatnonzero((in_time_sig == sig) & (in_measure >= 0))
+            here = pos[rows]
+            here = numpy.where(here + ts_offs[sig] < bar, here, numpy.mod(here - ts_offs[sig], bar))
+            span = numpy.maximum(numpy.searchsorted(starts, here + 1e-9, 'right') - 1, 0)
+            post[rows] = numpy.where(numpy.abs(here - starts[span]) < 1e-9, weights[span], min_weight)
+        for row in numpy.flatnonzero((in_measure < 0) | (in_time_sig < 0)):
+            post[row] = beatstrength_ind_func(events[row])
+        return post
 
-    # NB: This indexer inherits its run() method from indexer.py
+    def run(self):
+        """
+        Make a new index of the piece.
+
+        :returns: The beat strength of each note, rest, and chord.
+        :rtype: :class:`pandas.DataFrame`
+        """
+        if self._settings['method'] == 'music21' or len(self._score.index) == 0:
+            return super(NoteBeatStrengthIndexer, self).run()
+        result = numpy.full(self._score.shape, nan)
+        offsets = self._score.index.values
+        measures = self._settings['measures']
+        time_sigs = self._settings['time_signatures']
+        for part in range(len(self._score.columns)):
+            column = self._score.iloc[:, part]
+            rows = numpy.flatnonzero(column.notnull().values)
+            result[rows, part] = self._part_strengths(
+                column.values[rows], offsets[rows].astype(float),
+                measures.iloc[:, part].dropna().sort_index(kind='mergesort'),
+                time_sigs.iloc[:, part].dropna().sort_index(kind='mergesort'))
+        if type(self._score.columns) == pandas.Index:
+            labels = self._score.columns
+        else:
+            labels = self._score.columns.get_level_values(-1)
+        return self.make_return(labels, pandas.DataFrame(result, index=self._score.index))
 
 
 class DurationIndexer(indexer.Indexer):
@@ -156,10 +303,13 @@ class DurationIndexer(indexer.Indexer):
 
     required_score_type = 'pandas.DataFrame'
 
-    def __init__(self, score, part_streams):
+    def __init__(self, score, part_streams, ticks_per_quarter=None):
         """
         :param score: A :class:`pandas.DataFrame` of the note, rest, and chord objects in a piece.
         :type score: :class:`pandas.DataFrame`
+        :param int ticks_per_quarter: If the index of ``score`` holds integer ticks rather than
+            quarterLength offsets, the number of ticks in a quarter note. The durations are still
+            given in quarterLengths.
 
         :raises: :exc:`RuntimeError` if ``score`` is the wrong type.
         """
@@ -167,6 +317,7 @@ class DurationIndexer(indexer.Indexer):
         super(DurationIndexer, self).__init__(score, None)
         self._types = ('Note', 'Rest', 'Chord')
         self._part_streams = part_streams
+        self._ticks_per_quarter = ticks_per_quarter
 
     def run(self):
         """
@@ -179,13 +330,25 @@ class DurationIndexer(indexer.Indexer):
         if len(self._score) == 0: # if there are no notes or rests
             result = self._score.copy()
         else:
-            durations = []
-            for part in range(len(self._score.columns)):
-                indx = self._score.iloc[:, part].dropna().index
-                new = indx.insert(len(indx), self._part_streams[part].highestTime)
-                durations.append(pandas.Series((new[1:].values - indx.values), index=indx))
-
-            result = pandas.concat(durations, sort=True, axis=1)
+            # Each event lasts until the next event in its part, or until the end of the part.
+            # This is worked out for all the parts at once, in the order of the offsets.
+            score = self._score
+            if not score.index.is_monotonic_increasing:
+                score = score.sort_index(kind='mergesort')
+            valid = score.notnull().values
+            ends = [part.highestTime for part in self._part_streams]
+            if self._ticks_per_quarter is not None:
+                ends = [int(round(end * self._ticks_per_quarter)) for end in ends]
+            offsets = score.index.values.astype(float)
+            # the offset of every row, followed by the end of each part
+            stops = numpy.concatenate((numpy.repeat(offsets[:, None], valid.shape[1], axis=1),
+                                       numpy.array(ends, dtype=float)[None, :]))
+            nexts = stops[_next_valid(valid), numpy.arange(valid.shape[1])]
+            durs = numpy.where(valid, nexts - offsets[:, None], nan)
+            if self._ticks_per_quarter is not None:
+                durs = durs / float(self._ticks_per_quarter)
+            keep = valid.any(axis=1)
+            result = pandas.DataFrame(durs[keep], index=score.index[keep])
         return self.make_return(self._score.columns.get_level_values(1), result)
 
 
@@ -234,15 +397,17 @@ class MeasureIndexer(indexer.Indexer): # MeasureIndexer is still experimental
     """
 
     required_score_type = 'pandas.DataFrame'
-    possible_settings = ('style')
+    possible_settings = ('style', 'ticks_per_quarter')
 
     def __init__(self, score, part_streams, settings=None):
         """
         :param score: :class:`pandas.DataFrame` of music21 measure objects.
         :type score: :class:`pandas.DataFrame`.
 
-        :param settings: Only setting is 'style'. If it's set to 'Humdrum',
-            will return Humdrum-style measure strings.
+        :param settings: If 'style' is set to 'Humdrum', will return
+            Humdrum-style measure strings. If the offsets of ``score`` are
+            integer ticks, 'ticks_per_quarter' is the number of ticks in a
+            quarter note.
         :type settings: Dict or None.
 
         :raises: :exc:`RuntimeError` if ``score`` is the wrong type.
@@ -276,17 +441,24 @@ class MeasureIndexer(indexer.Indexer): # MeasureIndexer is still experimental
         # can do if the user is parsing a midi file.
         if res.empty:
             ts = self._score[1] # time_signature indexer results
-            ts = ts.applymap(self._convert_ts)
+            # there are only a few different time signatures, so convert each one once
+            lengths = {cell: self._convert_ts(cell) for cell in pandas.unique(ts.values.ravel())
+                       if isinstance(cell, str)}
+            ticks = None
+            if isinstance(self._settings, dict):
+                ticks = self._settings.get('ticks_per_quarter')
             cols = []
             for i in range(ts.shape[1]):
-                col = ts.iloc[:,i].dropna()
-                col.at[self._part_streams[i].highestTime] = 9999999
-                m_indx = []
-                for jay in range(col.size-1):
-                    diff = col.index[jay+1] - col.index[jay]
-                    num_mea = int(diff/col.iat[jay])
-                    temp = [col.index[jay] + x*col.iat[jay] for x in range(num_mea)]
-                    m_indx.extend(temp)
+                col = ts.iloc[:, i].map(lengths).dropna().sort_index(kind='mergesort')
+                end = self._part_streams[i].highestTime
+                if ticks is not None: # measure lengths in ticks too
+                    col = col * ticks
+                    end = int(round(end * ticks))
+                col = col[col.index != end]
+                m_indx = _measure_starts(col.index.values.astype(float), col.values.astype(float),
+                                         float(end))
+                if ticks is not None:
+                    m_indx = numpy.rint(m_indx).astype(numpy.int64)
                 cols.append(pandas.Series(range(1, len(m_indx)), index=m_indx[:-1]))
             res = pandas.concat(cols, axis=1)
 
@@ -37,8 +37,10 @@ of the previous ngram_indexer.py file.
 
 # pylint: disable=pointless-string-statement
 
+import numpy
 import pandas
 from vizitka.indexers import indexer
+from vizitka.models.vocabulary import Vocabulary, as_vocabulary
 
 
 class NGramIndexer(indexer.Indexer):
@@ -224,7 +226,9 @@ class NGramIndexer(indexer.Indexer):
         'brackets',
         'terminator',
         'continuer',
-        'align'
+        'align',
+        'output',
+        'vocabulary'
     ]
 
     """
@@ -268,6 +272,31 @@ class NGramIndexer(indexer.Indexer):
 
     :type 'continuer': str, default '_'.
 
+    :keyword 'output': The format of the n-grams returned. ``'strings'``
+        gives the usual space-joined strings. ``'tuples'`` gives a tuple
+        of the original observations for each n-gram, in the order in
+        which they would appear in the string, without any brackets.
+        ``'codes'`` gives fixed-width integer arrays: each observation is
+        replaced by its code in the ``'vocabulary'`` and the
+        results have a third column level, ``'Position'``, with one
+        column per observation in the n-gram. Missing observations are
+        coded as ``-1``.
+
+    :type 'output': str, default 'strings'.
+
+    :keyword 'vocabulary': Only used when ``'output'`` is ``'codes'``.
+        The observations that the integer codes refer to. Observations
+        not yet in it are appended to it, so passing the same vocabulary
+        to several queries keeps their codes comparable. Use a
+        :class:`~vizitka.models.vocabulary.Vocabulary`, or the path of
+        its file, to share the codes across a whole corpus and with the
+        interval indexers. If it is not provided, a new list is made and
+        can be found in the indexer's ``vocabulary`` attribute after
+        :meth:`run`.
+
+    :type 'vocabulary': list, str, or
+        :class:`~vizitka.models.vocabulary.Vocabulary`, default ``None``.
+
     """
 
     default_settings = {
@@ -277,7 +306,9 @@ class NGramIndexer(indexer.Indexer):
         'terminator': [],
         'vertical': 'all',
         'continuer': '_',
-        'align': 'left'
+        'align': 'left',
+        'output': 'strings',
+        'vocabulary': None
     }
 
     _MISSING_SETTINGS = ("NGramIndexer requires 'vertical' and 'n' " +
@@ -312,6 +343,8 @@ class NGramIndexer(indexer.Indexer):
         "observations in either of the passed dataframes.")
     _WRONG_ALIGN_SETTING = ("Incorrect 'align' setting passed. " +
         "Please use 'left', 'right', 'l', or 'r'.")
+    _WRONG_OUTPUT_SETTING = ("Incorrect 'output' setting passed. " +
+        "Please use 'strings', 'tuples', or 'codes'.")
 
     def __init__(self, score, settings=None):
         """
@@ -388,16 +421,33 @@ class NGramIndexer(indexer.Indexer):
                                            'Right', 'LEFT', 'RIGHT'):
             raise RuntimeWarning(NGramIndexer._WRONG_ALIGN_SETTING)
 
+        if self._settings['output'] not in ('strings', 'tuples', 'codes'):
+            raise RuntimeWarning(NGramIndexer._WRONG_OUTPUT_SETTING)
+        if self._settings['vocabulary'] is None:
+            self.vocabulary = []
+        elif isinstance(self._settings['vocabulary'], str):
+            self.vocabulary = Vocabulary(self._settings['vocabulary'])
+        else:
+            self.vocabulary = self._settings['vocabulary']
+
     def run(self):
         """
         Make an index of k-part n-grams of anything.
 
         :returns: A new index of the piece in the form of a
             class:`~pandas.DataFrame` with as many columns as there are
-            tuples in the 'vertical' setting of the passed settings.
+            tuples in the 'vertical' setting of the passed settings. If
+            the ``'output'`` setting is ``'codes'``, each of these
+            becomes as many integer columns as there are observations in
+            an n-gram.
 
         """
         n = self._settings['n']
+        output = self._settings['output']
+        # Brackets and spaces are only needed to build strings.
+        punctuate = output == 'strings'
+        if output == 'codes':
+            vocabulary = as_vocabulary(self.vocabulary)
         post = []
         cols = []
         # Each i in this loop will be a dataframe column of ngrams for a
@@ -405,36 +455,38 @@ class NGramIndexer(indexer.Indexer):
         for i, verts in enumerate(self._settings['vertical']):
             events = {}
             col_label = []
-            if self._settings['brackets']:
+            if punctuate and self._settings['brackets']:
                 events[('v', 'v0')] = '['
 
             for j, name in enumerate(verts):
-                if j > 0: # add a space if it's a non-first observation
+                if punctuate and j > 0: # add a space if it's a non-first observation
                     events[('v', 'v' +str(j + .5))] = ' '
                 events[('v', 'v' + str(j + 1))] = self._score[0].loc[:, (self._vertical_indexer_name, name)].dropna()
                 col_label.append(name)
 
-            if self._settings['brackets']:
-                events[('v', 'v' + str(len(verts) + 1))] = ']'
-            # add a space after all vertical observations
-            events[('v', 'v' + str(len(verts) + 1.5))] = ' '
+            if punctuate:
+                if self._settings['brackets']:
+                    events[('v', 'v' + str(len(verts) + 1))] = ']'
+                # add a space after all vertical observations
+                events[('v', 'v' + str(len(verts) + 1.5))] = ' '
 
             if self._settings['horizontal']: # NB: the bool value of an empty list is False.
                 horizs = self._settings['horizontal'][i]
-                if self._settings['brackets']:
+                if punctuate and self._settings['brackets']:
                     events[('h', 'h0')] = '('
                 col_label.append(':')
 
                 for j, name in enumerate(horizs):
-                    if j > 0: # add a space if it's a non-first observation
+                    if punctuate and j > 0: # add a space if it's a non-first observation
                         events[('h', 'h' + str(j + .5))] = ' '
                     events[('h', 'h' + str(j + 1))] = self._score[1].loc[:, (self._horizontal_indexer_name, name)].dropna()
                     col_label.append(name)
 
-                if self._settings['brackets']:
-                    events[('h', 'h' + str(len(horizs) + 1))] = ')'
-                # add a space after all horizontal observations
-                events[('h', 'h' + str(len(horizs) + 1.5))] = ' '
+                if punctuate:
+                    if self._settings['brackets']:
+                        events[('h', 'h' + str(len(horizs) + 1))] = ')'
+                    # add a space after all horizontal observations
+                    events[('h', 'h' + str(len(horizs) + 1.5))] = ' '
 
             cols.append(' '.join(col_label))
             events = pandas.DataFrame.from_dict(events)
@@ -481,6 +533,15 @@ class NGramIndexer(indexer.Indexer):
             elif self._cut_off > 1:
                 ngram_df = ngram_df.iloc[:(-self._cut_off + 1), :]
 
+            if output == 'tuples':
+                post.append(pandas.Series([tuple(row) for row in ngram_df.values],
+                                          index=ngram_df.index))
+                continue
+            elif output == 'codes':
+                post.append(pandas.DataFrame(vocabulary.encode(ngram_df.values),
+                                             index=ngram_df.index))
+                continue
+
             # Try to concatenate strings of each row to turn df into a
             # series. If you encounter type other than string, first
             # convert the values to strings then do the concatenation.
@@ -496,4 +557,22 @@ class NGramIndexer(indexer.Indexer):
             # combination to post
             post.append(res.str.rstrip())
 
+        if output == 'codes':
+            return self._make_codes_return(cols, post)
         return self.make_return(cols, post)
+
+    def _make_codes_return(self, labels, codes):
+        """
+        Like :meth:`~vis.analyzers.indexers.indexer.Indexer.make_return`
+        but for the ``'codes'`` output, where each combination is a
+        :class:`DataFrame` with one column per observation. The columns
+        of the result get a third level, ``'Position'``, holding the
+        position of the observation in the n-gram.
+        """
+        ret = pandas.concat(codes, axis=1)
+        # just use the name of the indexer without the word "Indexer"
+        name = str(self.__class__).rsplit('.', 1)[-1][0:-9]
+        ret.columns = pandas.MultiIndex.from_tuples(
+            [(name, label, pos) for label, df in zip(labels, codes) for pos in range(df.shape[1])],
+            names=('Indexer', 'Part', 'Position'))
+        return ret.fillna(-1).astype(numpy.int32)
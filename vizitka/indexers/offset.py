@@ -37,6 +37,79 @@ import numpy
 from vizitka.indexers import indexer
 
 
+def _rolling_mode(values, length, window):
+    """
+    Used internally by :meth:`FilterByOffsetIndexer._dynamic_run` to
+    find the most common value in rows ``i`` to ``i + window - 1`` of a
+    2-dimensional array, for every ``i`` below ``length``, ignoring
+    NaNs. This is what ``stack().value_counts().index[0]`` gives on each
+    window: ties go to the value that comes first in the window, reading
+    row by row. The values are coded as integers and counted with
+    cumulative sums rather than once per window.
+
+    :returns: The most common value of each window, or NaN where a
+        window has no values.
+    :rtype: :class:`numpy.ndarray`
+    """
+    n_rows, n_cols = values.shape
+    codes, uniques = pandas.factorize(values.ravel())
+    post = numpy.full(length, numpy.nan)
+    if len(uniques) == 0 or length == 0:
+        return post
+    hits = codes.reshape(values.shape)[:, :, None] == numpy.arange(len(uniques))
+    counts = numpy.concatenate((numpy.zeros((1, len(uniques)), dtype=int),
+                                hits.sum(axis=1).cumsum(axis=0)))
+    starts = numpy.minimum(numpy.arange(length), n_rows)
+    in_window = counts[numpy.minimum(starts + window, n_rows)] - counts[starts]
+    # where each value first appears at or after each row, reading row by row
+    last = n_rows * n_cols
+    flat = numpy.arange(last).reshape(values.shape)[:, :, None]
+    first = numpy.where(hits, flat, last).min(axis=1)
+    first = numpy.minimum.accumulate(first[::-1], axis=0)[::-1]
+    first = numpy.concatenate((first, numpy.full((1, len(uniques)), last)))
+    choice = (in_window * (last + 1) - first[starts]).argmax(axis=1)
+    found = in_window.max(axis=1) > 0
+    post[found] = uniques[choice[found]]
+    return post
+
+
+def _reindex_grids(part, start, steps, method, ticks=False):
+    """
+    Used internally by :meth:`FilterByOffsetIndexer.run` to reindex one
+    part on the grids of several ``quarterLength`` values at once. The
+    ``start`` and ``steps`` are in thousandths of a quarter note, or in
+    the ticks of the part's index if ``ticks`` is ``True``. When
+    the ``method`` only ever looks backwards, a grid whose step is a
+    multiple of a finer one is taken from the finer results rather than
+    reindexed again: every offset of the coarser grid is on the finer
+    one, where it already has the value the reindex would give it.
+
+    :returns: The reindexed part for every step.
+    :rtype: dict of :class:`pandas.Series`
+    """
+    end = int(part.index[-1]) if ticks else int(part.index[-1] * 1000)
+    post = {}
+    for step in sorted(set(steps)):
+        grid = numpy.arange(start, end + step, step)
+        offsets = grid if ticks else grid / 1000.0
+        finer = []
+        if method in ('ffill', 'pad', None):
+            finer = [fine for fine in post if step % fine == 0 and len(post[fine]) > 0]
+        if not finer:
+            post[step] = part.reindex(index=offsets, method=method)
+            continue
+        fine = post[max(finer)]
+        spots = (grid - start) // max(finer)
+        # the last offset of a coarser grid can be past the end of the finer one
+        beyond = spots >= len(fine)
+        coarse = pandas.Series(fine.values[numpy.minimum(spots, len(fine) - 1)],
+                               index=offsets, name=fine.name)
+        if method is None and beyond.any():
+            coarse = coarse.where(~beyond)
+        post[step] = coarse
+    return post
+
+
 class FilterByOffsetIndexer(indexer.Indexer):
     """
     Indexer that regularizes the "offset" values of observations from
@@ -199,7 +272,7 @@ class FilterByOffsetIndexer(indexer.Indexer):
     required_score_type = 'pandas.Series'
     "The :class:`FilterByOffsetIndexer` uses :class:`pandas.Series` objects."
 
-    possible_settings = ['quarterLength', 'dom_data', 'method', 'mp']
+    possible_settings = ['quarterLength', 'dom_data', 'method', 'mp', 'ticks_per_quarter']
 
     """
     A ``list`` of possible settings for the
@@ -209,9 +282,12 @@ class FilterByOffsetIndexer(indexer.Indexer):
         observations desired in the output. This value must not have
         more than three digits to the right of the decimal (i.e. 0.001
         is the smallest possible value). For dynamic (i.e. variable)
-        and context-dependent value, pass the string 'dynamic'.
+        and context-dependent value, pass the string 'dynamic'. To
+        regularize the same data at several durations in one call,
+        pass a list of them; :meth:`run` then returns a ``dict`` with
+        the results for each one.
 
-    :type 'quarterLength': float or string
+    :type 'quarterLength': float, string, or list of float
 
     :keyword 'dom_data': A list of DataFrames and one integer is
         required here if the 'quarterLength' setting is set to
@@ -235,6 +311,15 @@ class FilterByOffsetIndexer(indexer.Indexer):
 
     :type 'mp': boolean
 
+    :keyword 'ticks_per_quarter': If the inputs are indexed by integer
+        ticks rather than quarterLength offsets, as with an
+        :class:`~vizitka.models.indexed_piece.IndexedPiece` imported
+        with ``ticks=True``, the number of ticks in a quarter note. The
+        output is then indexed by ticks too, and every ``quarterLength``
+        must be a whole number of ticks. The default is ``None``.
+
+    :type 'ticks_per_quarter': int or None
+
     **Examples:**
 
     ***Example:***
@@ -245,6 +330,11 @@ class FilterByOffsetIndexer(indexer.Indexer):
     >>> setts = {'quarterLength': 2}
     >>> ip.get('offset', data=notes, settings=setts)
 
+    # Several rhythmic levels at once, in a dict keyed by quarterLength.
+
+    >>> setts = {'quarterLength': [0.5, 1.0, 2.0, 4.0]}
+    >>> ip.get('offset', data=notes, settings=setts)[2.0]
+
     # Note that other analysis results can be passed to the offset indexer too,
     # such as the IntervalIndexer results as in the following example. Note
     # also that the original column names (or names of the series if a list of
@@ -253,7 +343,7 @@ class FilterByOffsetIndexer(indexer.Indexer):
 
     """
 
-    default_settings = {'method': 'ffill', 'mp': True, 'dom_data':[]}
+    default_settings = {'method': 'ffill', 'mp': True, 'dom_data':[], 'ticks_per_quarter': None}
 
     _ZERO_PART_ERROR = (u'FilterByOffsetIndexer requires an index ' +
         'with at least one part.')
@@ -265,6 +355,8 @@ class FilterByOffsetIndexer(indexer.Indexer):
 parameter to be a list of the dissonance, duration, beatstrength, noterest, \
 and timesignature indexers (in that order) if the "quarterLength" setting is \
 set to "dynamic"'
+    _NOT_ON_TICKS = 'FilterByOffsetIndexer cannot observe offsets {} quarter \
+notes apart with {} ticks per quarter note.'
     _UNSUPPORTED_TIME_SIGNATURE = 'FilterByOffsetIndexer only supports \
 the following time signatures when the "quarterLength" setting is set to \
 "dynamic": {}.'
@@ -290,7 +382,11 @@ the following time signatures when the "quarterLength" setting is set to \
             present in ``settings``.
 
         :raises: :exc:`RuntimeError` if the ``'quarterLength'`` setting
-            has a value less than ``0.001``.
+            has a value less than ``0.001``, or a list with one.
+
+        :raises: :exc:`RuntimeError` if a ``'quarterLength'`` is not a
+            whole number of ticks when there is a ``'ticks_per_quarter'``
+            setting.
 
         """
         super(FilterByOffsetIndexer, self).__init__(score, None)
@@ -298,6 +394,9 @@ the following time signatures when the "quarterLength" setting is set to \
         # check the settings instance has a u'quarterLength' property.
         if settings is None or u'quarterLength' not in settings:
             raise RuntimeError(FilterByOffsetIndexer._NO_QLENGTH_ERROR)
+        elif isinstance(settings['quarterLength'], (list, tuple)):
+            if len(settings['quarterLength']) == 0 or min(settings['quarterLength']) < 0.001:
+                raise RuntimeError(FilterByOffsetIndexer._QLENGTH_TOO_SMALL_ERROR)
         elif (type(settings['quarterLength']) != str and
               settings[u'quarterLength'] < 0.001):
             raise RuntimeError(FilterByOffsetIndexer._QLENGTH_TOO_SMALL_ERROR)
@@ -316,6 +415,13 @@ the following time signatures when the "quarterLength" setting is set to \
         if len(self._score) == 0:
             raise RuntimeError(FilterByOffsetIndexer._ZERO_PART_ERROR)
 
+        ticks = self._settings['ticks_per_quarter']
+        if ticks is not None and self._settings['quarterLength'] != 'dynamic':
+            q_ls = self._settings['quarterLength']
+            for q_l in (q_ls if isinstance(q_ls, (list, tuple)) else [q_ls]):
+                if abs(q_l * ticks - round(q_l * ticks)) > 1e-9:
+                    raise RuntimeError(FilterByOffsetIndexer._NOT_ON_TICKS.format(q_l, ticks))
+
         if (self._settings['quarterLength'] == 'dynamic' and
             len(self._settings['dom_data']) != 6):
             raise RuntimeError(FilterByOffsetIndexer._IMPROPER_DYNAMIC_INPUT)
@@ -348,37 +454,59 @@ the following time signatures when the "quarterLength" setting is set to \
 
         """
         dom_data = self._settings['dom_data']
-        #Remove the upper level of the columnar multi-index.
-        dds = dom_data[0].copy()
-        dds.columns = range(len(dds.columns))
+        ticks = self._settings['ticks_per_quarter']
+        if ticks is not None: # work in quarterLengths
+            dom_data = [frame.set_axis(frame.index / float(ticks), axis=0) for frame in dom_data[:5]] + \
+                       list(dom_data[5:])
+        # Remove the upper level of the columnar multi-index, and put
+        # the rows of all the inputs in the order of the durations.
         ddr = dom_data[1].copy()
-        ddr.columns = dds.columns
-        bbs = dom_data[2].copy()
-        bbs.columns = dds.columns
-        nnr = dom_data[3].copy()
-        nnr.columns = dds.columns
+        ddr.columns = range(len(ddr.columns))
+        dds = dom_data[0].reindex(ddr.index)
+        dds.columns = ddr.columns
+        bbs = dom_data[2].reindex(ddr.index)
+        bbs.columns = ddr.columns
+        nnr = dom_data[3].reindex(ddr.index)
+        nnr.columns = ddr.columns
         ts = dom_data[4]
 
         w = 6
-
-        # Remove weak dissonances
+        rows = numpy.arange(len(ddr))[:, None]
+        cols = numpy.arange(len(ddr.columns))[None, :]
+        durs = ddr.values.astype(float)
+        notes = nnr.values.copy()
+
+        # Remove weak dissonances: add the duration of each one, and of
+        # any weak dissonances right after it, to the note that
+        # immediately precedes them.
         weaks = ('R', 'D', 'L', 'U', 'E', 'C', 'A')
-        indx, cols = numpy.where(dom_data[0].isin(weaks))
-        for x in reversed(range(len(indx))):
-            spot = ddr.iloc[:indx[x], cols[x]].last_valid_index()
-            # Add the weak dissonance duration to the note that immediately precedes it.
-            ddr.at[spot, cols[x]] += ddr.iat[indx[x], cols[x]]
-
-        # Remove strong dissonances other than suspensions
+        weak = dds.isin(weaks).values
+        owner = numpy.maximum.accumulate(numpy.where(~numpy.isnan(durs) & ~weak, rows, -1), axis=0)
+        indx, col = numpy.nonzero(weak & (owner >= 0))
+        numpy.add.at(durs, (owner[indx, col], col), durs[indx, col])
+
+        # Remove strong dissonances other than suspensions: each one
+        # takes over the duration and the note of the note that
+        # immediately follows it, and a run of them all goes to the
+        # first one.
         strongs = ('Q', 'H')
-        indx, cols = numpy.where(dom_data[0].isin(strongs))
-        for x in reversed(range(len(indx))):
-            spot = ddr.iloc[indx[x]+1:, cols[x]].first_valid_index()
-            # Add the strong dissonance duration to the note that immediately follows it.
-            ddr.iat[indx[x], cols[x]] += ddr.at[spot, cols[x]]
-            ddr.at[spot, cols[x]] = float('nan')
-            nnr.iat[indx[x], cols[x]] = nnr.at[spot, cols[x]]
-            nnr.at[spot, cols[x]] = float('nan')
+        strong = dds.isin(strongs).values
+        valid = ~numpy.isnan(durs)
+        prev = numpy.maximum.accumulate(numpy.where(valid, rows, -1), axis=0)
+        prev = numpy.concatenate((numpy.full((1, len(ddr.columns)), -1), prev[:-1]))
+        taken = valid & (prev >= 0) & strong[prev, cols]
+        owner = numpy.maximum.accumulate(numpy.where(valid & ~taken, rows, -1), axis=0)
+        indx, col = numpy.nonzero(taken)
+        numpy.add.at(durs, (owner[indx, col], col), durs[indx, col])
+        # the last note taken over in each run is the one that sounds
+        nxt = numpy.minimum.accumulate(numpy.where(valid, rows, len(ddr))[::-1], axis=0)[::-1]
+        nxt = numpy.concatenate((nxt[1:], numpy.full((1, len(ddr.columns)), len(ddr))))
+        last = taken & ~numpy.vstack((taken, numpy.zeros((1, len(ddr.columns)), dtype=bool)))[nxt, cols]
+        notes[owner[last], numpy.nonzero(last)[1]] = notes[last]
+        durs[taken] = float('nan')
+        notes[taken] = float('nan')
+        ddr = pandas.DataFrame(durs, index=ddr.index, columns=ddr.columns)
+        nnr = pandas.DataFrame(notes, index=nnr.index, columns=nnr.columns)
 
         # Delete the duration entries of weak dissonances
         ddr[dds.isin(weaks)] = float('nan')
@@ -430,33 +558,43 @@ the following time signatures when the "quarterLength" setting is set to \
         ccr[cr > 1*mlt] = 2
         ccr[cr > 2*mlt] = 4
 
-        for i, val in enumerate(ccr):
-            counts = diss_cr.iloc[i:i+w].stack().value_counts()
-            lvi = ccr.iloc[:i].last_valid_index()
-            if len(counts) > 0 and counts.index[0] == val: # If the most common diss in the window corresponds to the attack-density reading, leave the current val
-                continue
-
-            elif lvi is not None and ccr.at[lvi] == val: # There is no dissonance in this window, but the IR analysis has not changed, so the reading is valid
-                continue
-            else: # The new level has not been confirmed by a corresponding dissonance
-                ccr.iat[i] = float('nan')
+        # A reading is valid if the most common dissonance in the window
+        # starting there corresponds to it, or if it has not changed
+        # since the last reading confirmed that way. Otherwise the new
+        # level has not been confirmed by a corresponding dissonance.
+        vals = ccr.values
+        confirmed = _rolling_mode(diss_cr.values.astype(float), len(ccr), w) == vals
+        last = pandas.Series(numpy.where(confirmed, vals, float('nan'))).ffill().shift().values
+        ccr[~(confirmed | (last == vals))] = float('nan')
 
         ccr.ffill(inplace=True)
         ccr.bfill(inplace=True)
         ccr = ccr.loc[ccr.shift() != ccr] # Remove consecutive duplicates
 
-        # Make the new index
+        # Make the new index: one stretch of offsets per reading, from the
+        # reading's offset snapped down to its grid until the next
+        # reading, all made with a single arange().
         end_time = int(dom_data[5]) # "highest time" of first part.
-        spots = list(ccr.index)
-        spots.append(end_time) # Add the index value of the last moment of the piece which usually has no event at it.
-        new_index = []
-        for i, spot in enumerate(spots[:-1]):
-            if spot % ccr.iat[i] != 0:
-                spot -= (spot % ccr.iat[i])
-            post = list(numpy.arange(spot, spots[i+1], ccr.iat[i])) # you can't use range() because range can't handle floats
-            if bool(new_index) and bool(post) and post[0] in new_index:
-                del post[0]
-            new_index.extend(post)
+        steps = ccr.values
+        starts = ccr.index.values - numpy.mod(ccr.index.values, steps)
+        # Add the index value of the last moment of the piece which usually has no event at it.
+        stops = numpy.append(ccr.index.values[1:], end_time)
+        sizes = numpy.maximum(numpy.ceil((stops - starts) / steps), 0).astype(int)
+        stretch = numpy.repeat(numpy.arange(len(sizes)), sizes)
+        heads = numpy.cumsum(sizes) - sizes
+        new_index = starts[stretch] + (numpy.arange(sizes.sum()) - heads[stretch]) * steps[stretch]
+        # Drop the first offset of a stretch if an earlier stretch has it.
+        codes = pandas.factorize(new_index)[0]
+        first_stretch = numpy.full(len(new_index), len(sizes))
+        numpy.minimum.at(first_stretch, codes, stretch)
+        heads = heads[sizes > 0]
+        new_index = numpy.delete(new_index, heads[first_stretch[codes[heads]] < stretch[heads]])
+
+        if ticks is not None:
+            new_ticks = numpy.rint(new_index * ticks)
+            if not numpy.allclose(new_ticks, new_index * ticks):
+                raise RuntimeError(FilterByOffsetIndexer._NOT_ON_TICKS.format(ccr.min(), ticks))
+            new_index = new_ticks.astype(numpy.int64)
 
         if isinstance(self._score, list):
             self._score = pandas.concat(self._score, axis=1)
@@ -473,21 +611,33 @@ the following time signatures when the "quarterLength" setting is set to \
             ``quarterLength`` until the final offset, which is either
             the last observation in the piece (if it is divisible by
             the ``quarterLength``) or the next-highest value that is
-            divisible by ``quarterLength``.
+            divisible by ``quarterLength``. If the ``quarterLength``
+            setting is a list, there is one such :class:`DataFrame`
+            for each of its values, and grids that nest in a finer one
+            are taken from its results.
 
-        :rtype: :class:`pandas.DataFrame`
+        :rtype: :class:`pandas.DataFrame`, or ``dict`` of them keyed by
+            ``quarterLength``
 
         """
         if self._settings['quarterLength'] == 'dynamic':
             return self._dynamic_run()
+        quarter_lengths = self._settings[u'quarterLength']
+        if not isinstance(quarter_lengths, (list, tuple)):
+            quarter_lengths = [quarter_lengths]
         # NB: we have to convert all the "offset" values to integers so
-        #     we can use the range() function to iterate through
-        #     offsets.
-        post = []
+        #     we can build the grids of offsets with numpy.arange(). Ticks
+        #     already are.
+        ticks = self._settings['ticks_per_quarter']
+        if ticks is None:
+            steps = [int(q_l * 1000) for q_l in quarter_lengths]
+        else:
+            steps = [int(round(q_l * ticks)) for q_l in quarter_lengths]
+        post = {step: [] for step in steps}
         start_offset = None
         try:
             # usually this finds the first offset in the piece
-            start_offset = int(min([part.index[0] for part in self._score]) * 1000)
+            start_offset = int(min([part.index[0] for part in self._score]) * (1000 if ticks is None else 1))
         except (ValueError, IndexError):
             # if one of the parts has 0 length
             start_offset = []
@@ -496,18 +646,21 @@ the following time signatures when the "quarterLength" setting is set to \
                     start_offset.append(part.index[0])
             if 0 == len(start_offset):
                 # all the parts have no length, so we need as many empty parts
-                post = [pandas.Series() for _ in range(len(self._score))]
+                post = {step: [pandas.Series() for _ in range(len(self._score))] for step in steps}
             else:
                 start_offset = int(min(start_offset))
-        if 0 == len(post):
+        if 0 == len(post[steps[0]]):
             for part in self._score:
                 if len(part.index) < 1:
-                    post.append(part)
+                    grids = {step: part for step in steps}
                 else:
-                    end_offset = int(part.index[-1] * 1000)
-                    step = int(self._settings[u'quarterLength'] * 1000)
-                    off_list = list(pandas.Series(range(start_offset, end_offset + step, step)).div(1000.0))
-                    # pylint: disable=C0301
-                    post.append(part.reindex(index=off_list, method=self._settings['method']))
-        post = self.make_return([ser.name[1] for ser in self._score], post)
-        return post
+                    if not part.index.is_monotonic_increasing:
+                        part = part.sort_index()
+                    grids = _reindex_grids(part, start_offset, steps, self._settings['method'],
+                                           ticks is not None)
+                for step in post:
+                    post[step].append(grids[step])
+        labels = [ser.name[1] for ser in self._score]
+        if not isinstance(self._settings[u'quarterLength'], (list, tuple)):
+            return self.make_return(labels, post[steps[0]])
+        return {q_l: self.make_return(labels, post[step]) for q_l, step in zip(quarter_lengths, steps)}
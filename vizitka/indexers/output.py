@@ -31,6 +31,10 @@
 Create a Humdrum-format kern score.
 """
 
+import csv
+import heapq
+import os
+import numpy
 import pandas as pd
 import pdb
 from vizitka.indexers import indexer
@@ -133,6 +137,24 @@ def indexer_func(event):
     return ''.join(res)
 
 
+def _sorted_rows(df, order, index=None):
+    """
+    Used internally by :meth:`Viz2HumIndexer.write`. Yields an
+    ``(offset, order, values)`` tuple for each offset of ``index`` in
+    ascending order, where ``values`` is the row of ``df`` at that offset, or
+    all NaN if ``df`` has none. ``index`` defaults to the index of ``df``.
+    """
+    if index is None:
+        index = df.index
+        positions = numpy.arange(len(index))
+    else:
+        positions = df.index.get_indexer(index)
+    values = df.values
+    empty = [float('nan')] * df.shape[1]
+    for i in numpy.argsort(index.values, kind='stable'):
+        pos = positions[i]
+        yield (index[i], order, values[pos] if pos >= 0 else empty)
+
 
 class XMLIndexer(object):
     """Creates an xml file of a score using music21's converter.
@@ -190,13 +212,12 @@ class Viz2HumIndexer(indexer.Indexer):
         self._vizmd = settings['vizmd']
         self._m21md = settings['m21md']
 
-    def run(self):
+    def _records(self, num_cols):
         """
-        Manage the primary indexing and also the secondary addition of
-        metadata, comments, etc. The first df in self._score is the measures,
-        the second one is the note, rest, and chord objects.
+        Used internally by :meth:`run` and :meth:`write`. Prepare the global
+        metadata records at the beginning of the file, the spine headers, and
+        the metadata records at the end of the file.
         """
-        num_cols = self._score[0].shape[1]
         col_indx = range(num_cols)
         # Prepare the fields at the beginning of the file.
         vizmd = self._vizmd # Vizitka metadata
@@ -223,6 +244,28 @@ class Viz2HumIndexer(indexer.Indexer):
                              )).dropna() for i in reversed(col_indx)]
         header = pd.concat(header, axis=1)
 
+        # metadata at the end of a file
+        tail_data = pd.Series(('!!!RDF**kern: l=long note in original notation', # meaning of l character
+                     '!!!RDF**kern: i=editorial accidental', # meaning of i character
+                     enc,
+                     eed,
+                     '!!!ONB: Converted to Humdrum using Vizitka', # Vizitka conversion stamp
+                     None if not (hasattr(m21md, 'copyright') and m21md.copyright is not None) else
+                        '!!!YEC: '+m21md.copyright.getNormalizedArticle(),
+                     None if not hasattr(m21md, 'date') or m21md.date == 'None' else '!!!DAT: '+m21md.date)).dropna()
+
+        return head_data, header, tail_data
+
+    def run(self):
+        """
+        Manage the primary indexing and also the secondary addition of
+        metadata, comments, etc. The first df in self._score is the measures,
+        the second one is the note, rest, and chord objects.
+        """
+        num_cols = self._score[0].shape[1]
+        col_indx = range(num_cols)
+        head_data, header, tail_data = self._records(num_cols)
+
         dfs = [df.copy() for df in self._score[:4]]
         # Index the note, rest and chord objects
         dfs.append(self._score[4].applymap(indexer_func))
@@ -274,16 +317,6 @@ class Viz2HumIndexer(indexer.Indexer):
 
         # final barlines and end of kern tokens
         footer = pd.concat([pd.Series(['==', '*_'])]*num_cols, axis=1)
-        # metadata at the end of a file
-        tail_data = pd.Series(('!!!RDF**kern: l=long note in original notation', # meaning of l character
-                     '!!!RDF**kern: i=editorial accidental', # meaning of i character
-                     enc,
-                     eed,
-                     '!!!ONB: Converted to Humdrum using Vizitka', # Vizitka conversion stamp
-                     None if not (hasattr(m21md, 'copyright') and m21md.copyright is not None) else
-                        '!!!YEC: '+m21md.copyright.getNormalizedArticle(),
-                     None if not hasattr(m21md, 'date') or m21md.date == 'None' else '!!!DAT: '+m21md.date)).dropna()
-
         # Make the empty cells into period strings.
         post.fillna('.', inplace=True)
 
@@ -291,3 +324,57 @@ class Viz2HumIndexer(indexer.Indexer):
         res = pd.concat((head_data, header, post, footer, tail_data), ignore_index=True)
 
         return res
+
+    def write(self, handle):
+        """
+        Write the same kern score that :meth:`run` returns, as
+        :meth:`~vizitka.models.indexed_piece.IndexedPiece.to_kern` would save
+        it, to the open text file ``handle``. Instead of concatenating and
+        sorting every spine in one DataFrame, the already indexed clef,
+        key-signature, time-signature, measure, and note/rest/chord (and
+        lyric) events are merged by offset and order, and each line is
+        written as soon as it is known. Open ``handle`` with ``newline=''``.
+
+        :param handle: The file to write to.
+        :type handle: file object
+        """
+        num_cols = self._score[0].shape[1]
+        head_data, header, tail_data = self._records(num_cols)
+        lyrics = not self._score[5].empty
+        width = num_cols * 2 if lyrics else num_cols
+        writer = csv.writer(handle, delimiter='\t', quotechar='`', lineterminator=os.linesep)
+
+        for record in head_data:
+            writer.writerow([record] + [''] * (width - 1))
+        for i, row in enumerate(header.fillna('').values):
+            if lyrics: # each **text spine repeats the header of its **kern spine
+                row = [cell for tok in row for cell in (tok, '**text' if i == 0 else tok)]
+            writer.writerow(row)
+
+        streams = [_sorted_rows(df, i) for i, df in enumerate(self._score[:4])]
+        nrc = self._score[4]
+        if lyrics:
+            # Notes and lyrics share the union of their offsets, as in run()
+            index = nrc.index.union(self._score[5].index)
+            streams.append(_sorted_rows(nrc, 4, index))
+            ly_rows = _sorted_rows(self._score[5], 4, index)
+        else:
+            streams.append(_sorted_rows(nrc, 4))
+        parts = range(num_cols - 1, -1, -1)
+
+        for offset, order, values in heapq.merge(*streams, key=lambda row: row[:2]):
+            if order == 4:
+                values = [indexer_func(event) for event in values]
+                syllables = next(ly_rows)[2] if lyrics else None
+            else:
+                syllables = values
+            cells = ['.' if pd.isnull(values[p]) else values[p] for p in parts]
+            if lyrics:
+                ly_cells = ['.' if pd.isnull(syllables[p]) else syllables[p] for p in parts]
+                cells = [cell for pair in zip(cells, ly_cells) for cell in pair]
+            writer.writerow(cells)
+
+        writer.writerow(['=='] * width)
+        writer.writerow(['*_'] * width)
+        for record in tail_data:
+            writer.writerow([record] + [''] * (width - 1))
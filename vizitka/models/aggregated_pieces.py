@@ -30,7 +30,323 @@ The model representing data from multiple :class:`~vis.models.indexed_piece.Inde
 
 import sys
 import os
+import collections
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+import numpy
 import pandas
+from music21 import converter
+from vizitka.indexers import dissonance
+from vizitka.models import fingerprint
+
+# The dissonance types counted by AggregatedPieces.dissonance_profile(), in the order of its columns.
+_DISSONANCE_LABELS = numpy.array([label for label in dissonance._weights
+                                  if label != dissonance._no_diss_label], dtype=object)
+
+
+def _dissonance_counts(piece):
+    """
+    Used internally by :meth:`AggregatedPieces.dissonance_profile` to count the dissonance types of
+    each voice of one piece. Unless the piece had already cached its dissonances, they are dropped
+    from its cache as soon as they are counted.
+
+    :returns: The names of the voices, and how many of each of ``_DISSONANCE_LABELS`` each has.
+    :rtype: 2-tuple of list and :class:`numpy.ndarray`
+    """
+    was_cached = 'dissonance' in piece._analyses
+    labels = piece.get('dissonance')
+    voices = list(labels.columns.get_level_values(-1))
+    counts = (labels.values[:, :, None] == _DISSONANCE_LABELS).sum(axis=0)
+    del labels
+    if not was_cached:
+        piece._analyses.pop('dissonance', None)
+    return voices, counts
+
+
+def _count_file(pathname):
+    """
+    Used internally by :meth:`AggregatedPieces.dissonance_profile` to count the dissonance types of
+    a piece in a worker process. The piece is imported anew from its file there, since music21
+    scores cannot be unpickled reliably.
+    """
+    # indexed_piece imports this module, so it cannot be imported at the top.
+    from vizitka.models.indexed_piece import _import_file
+    return _dissonance_counts(_import_file(pathname)[0])
+
+
+# The analyses that IndexedPiece caches which hold music21 objects, and so are never sent between
+# processes by AggregatedPieces.get().
+_MUSIC21_ANALYSES = ('part_streams', 'm21_objs', 'm21_nrc_objs', 'm21_nrc_objs_no_tied',
+                     'm21_measure_objs', 'm21_ts_objs')
+
+
+def _cache_key(piece, ind_analyzer):
+    """
+    Used internally by :meth:`AggregatedPieces.get` to find the key under which ``piece`` caches
+    the results of ``ind_analyzer``, from the name of its ``_get_*`` method, or ``None``.
+    """
+    name = getattr(piece._indexers.get(ind_analyzer), '__name__', '')
+    return name[len('_get_'):] if name.startswith('_get_') else None
+
+
+def _get_remote(source, ticks, metadata, ind_analyzer, args, ship_cache):
+    """
+    Used internally by :meth:`AggregatedPieces.get` to run one piece's
+    :meth:`~vizitka.models.indexed_piece.IndexedPiece.get` in a worker process. The piece is
+    imported anew from its file if ``source`` is a pathname, as in :func:`_count_file`, or else
+    thawed from a score frozen with :func:`music21.converter.freezeStr`.
+
+    :returns: The results, and the analyses the piece cached along the way except those that hold
+        music21 objects, or ``None`` unless ``ship_cache``.
+    :rtype: 2-tuple
+    """
+    from vizitka.models.indexed_piece import _import_file, IndexedPiece
+    if isinstance(source, str):
+        piece = _import_file(source, ticks=ticks)[0]
+    else:
+        piece = IndexedPiece(metadata['pathname'], score=converter.thawStr(source), ticks=ticks)
+        piece._metadata.update(metadata)
+        piece._imported = True
+    results = piece.get(ind_analyzer, **args)
+    cache = None
+    if ship_cache:
+        cache = {key: val for key, val in piece._analyses.items() if key not in _MUSIC21_ANALYSES}
+    return results, cache
+
+
+def _typed(values):
+    """
+    Used internally by :func:`_long_frame` to give a column of the long-format frame the narrowest
+    NumPy type that holds all of its values: integers, floats, or booleans where possible, and
+    otherwise the original objects.
+    """
+    kind = pandas.api.types.infer_dtype(values, skipna=True)
+    if kind in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+        floats = values.astype(numpy.float64)
+        if kind == 'integer' and not numpy.isnan(floats).any():
+            return values.astype(numpy.int64)
+        return floats
+    if kind == 'boolean' and not pandas.isnull(values).any():
+        return values.astype(bool)
+    return values
+
+
+def _long_frame(results):
+    """
+    Used internally by :meth:`AggregatedPieces.get` to stack the results of each piece into one
+    long-format frame. The frame has one row per piece, part, and offset at which the part has a
+    result, and one column per indexer. The arrays of the frame are sized in a first pass over the
+    results and filled in a second, rather than concatenating DataFrames.
+
+    :param results: The results of one or more indexers for each piece, each with
+        ``('Indexer', 'Part')`` columns.
+    :type results: list of :class:`pandas.DataFrame`
+    :returns: The results, indexed by ``('Piece', 'Part', 'Offset')``.
+    :rtype: :class:`pandas.DataFrame`
+    """
+    layout, names, total = [], [], 0
+    for frame in results:
+        if isinstance(frame, pandas.Series):
+            frame = frame.to_frame()
+        order = numpy.argsort(frame.index.values, kind='stable')
+        if isinstance(frame.columns, pandas.MultiIndex):
+            indexers = frame.columns.get_level_values(0)
+            parts = frame.columns.get_level_values(-1)
+        else: # one indexer, whose columns are the parts
+            indexers, parts = ['Value'] * frame.shape[1], frame.columns
+        values = frame.values[order]
+        blocks = []
+        for part in pandas.unique(parts):
+            cols = [j for j, name in enumerate(parts) if name == part]
+            rows = pandas.notnull(values[:, cols]).any(axis=1).nonzero()[0]
+            blocks.append((part, cols, rows))
+            total += len(rows)
+        names.extend(name for name in pandas.unique(indexers) if name not in names)
+        layout.append((frame.index.values[order], values, list(indexers), blocks))
+
+    offset_types = [offsets.dtype for offsets, _, _, _ in layout]
+    if offset_types and all(numpy.issubdtype(kind, numpy.number) for kind in offset_types):
+        offset_type = numpy.result_type(*offset_types)
+    else:
+        offset_type = object
+    piece_col = numpy.empty(total, dtype=numpy.int64)
+    part_col = numpy.empty(total, dtype=object)
+    offset_col = numpy.empty(total, dtype=offset_type)
+    value_cols = {name: numpy.full(total, numpy.nan, dtype=object) for name in names}
+    start = 0
+    for i, (offsets, values, indexers, blocks) in enumerate(layout):
+        for part, cols, rows in blocks:
+            stop = start + len(rows)
+            piece_col[start:stop] = i
+            part_col[start:stop] = part
+            offset_col[start:stop] = offsets[rows]
+            for j in cols:
+                value_cols[indexers[j]][start:stop] = values[rows, j]
+            start = stop
+
+    index = pandas.MultiIndex.from_arrays((piece_col, part_col, offset_col),
+                                          names=('Piece', 'Part', 'Offset'))
+    return pandas.DataFrame({name: _typed(col) for name, col in value_cols.items()}, index=index,
+                            columns=names)
+
+
+# The file extension of each format that AggregatedPieces.export() can write.
+_EXPORT_FORMATS = {'kern': '.krn', 'xml': '.xml'}
+
+# The file in each output directory where AggregatedPieces.export() records which source files its
+# outputs were made from.
+_EXPORT_MANIFEST = '.vizitka_export.json'
+
+
+def _source_stamp(pathname, recorded=None):
+    """
+    Used internally by :meth:`AggregatedPieces.export` to describe the current state of a source
+    file. The file is only hashed again if its size or modification time differ from those of the
+    ``recorded`` stamp.
+
+    :returns: The absolute path, modification time, size, and SHA-1 digest of the file.
+    :rtype: dict
+    """
+    pathname = os.path.abspath(pathname)
+    stat = os.stat(pathname)
+    if (recorded is not None and recorded.get('source') == pathname and
+            recorded.get('mtime') == stat.st_mtime and recorded.get('size') == stat.st_size):
+        return recorded
+    digest = hashlib.sha1()
+    with open(pathname, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 20), b''):
+            digest.update(chunk)
+    return {'source': pathname, 'mtime': stat.st_mtime, 'size': stat.st_size,
+            'sha1': digest.hexdigest()}
+
+
+def _export_piece(piece, fmt, out_path):
+    """
+    Used internally by :meth:`AggregatedPieces.export` to write one piece with
+    :meth:`~vizitka.models.indexed_piece.IndexedPiece.to_kern` or
+    :meth:`~vizitka.models.indexed_piece.IndexedPiece.to_xml`.
+
+    :returns: How many seconds it took, and the error that stopped it or ``None``.
+    :rtype: 2-tuple of float and str
+    """
+    start = time.perf_counter()
+    try:
+        if fmt == 'kern':
+            piece.to_kern(out_path)
+        else:
+            piece.to_xml(out_path)
+    except Exception as err: # pylint: disable=broad-except
+        return time.perf_counter() - start, '{}: {}'.format(type(err).__name__, err)
+    return time.perf_counter() - start, None
+
+
+def _export_file(pathname, ticks, fmt, out_path):
+    """
+    Used internally by :meth:`AggregatedPieces.export` to write a piece in a worker process. The
+    piece is imported anew from its file there, as in :func:`_count_file`, and the time this takes
+    is included in the result.
+    """
+    from vizitka.models.indexed_piece import _import_file
+    start = time.perf_counter()
+    try:
+        piece = _import_file(pathname, ticks=ticks)[0]
+    except Exception as err: # pylint: disable=broad-except
+        return time.perf_counter() - start, '{}: {}'.format(type(err).__name__, err)
+    error = _export_piece(piece, fmt, out_path)[1]
+    return time.perf_counter() - start, error
+
+
+# The file extension of each format that AggregatedPieces.export_dataset() can write.
+_DATASET_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# The piece metadata that AggregatedPieces.export_dataset() adds to every row, as pairs of the
+# AggregatedPieces.metadata() field and the name of its column.
+_DATASET_METADATA = (('composers', 'Composer'), ('dates', 'Date'), ('titles', 'Title'),
+                     ('locales', 'Locale'), ('pathnames', 'Pathname'))
+
+
+def _flat_results(results, metadata):
+    """
+    Used internally by :meth:`AggregatedPieces.export_dataset` to make one piece's results into a
+    flat table. The offsets become an ``'Offset'`` column, each ``('Indexer', 'Part')`` column
+    becomes an ``'Indexer/Part'`` column, and ``metadata`` is added as one column per field.
+    Object columns that do not hold only strings are converted to strings, keeping missing values,
+    so each column has a single type.
+
+    :param results: The results of an indexer for one piece.
+    :type results: :class:`pandas.DataFrame` or :class:`pandas.Series`
+    :param dict metadata: Column names and the value of each for this piece.
+    :rtype: :class:`pandas.DataFrame`
+    """
+    if isinstance(results, pandas.Series):
+        results = results.to_frame()
+    columns = {'Offset': results.index.values}
+    for j, name in enumerate(results.columns):
+        if isinstance(name, tuple):
+            name = '/'.join(str(level) for level in name)
+        values = results.iloc[:, j].values
+        if values.dtype == object and pandas.api.types.infer_dtype(values) not in ('string', 'empty'):
+            missing = pandas.isnull(values)
+            values = values.astype(str)
+            values[missing] = None
+        columns[str(name)] = values
+    for name, value in metadata.items():
+        columns[name] = numpy.full(len(results), None if value is None else str(value), dtype=object)
+    return pandas.DataFrame(columns)
+
+
+def _write_partition(frame, path, fmt):
+    """
+    Used internally by :meth:`AggregatedPieces.export_dataset` to write one partition with
+    pyarrow, which is only needed for this.
+    """
+    import pyarrow
+    table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == 'parquet':
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(table, path)
+    else:
+        import pyarrow.feather
+        pyarrow.feather.write_feather(table, path)
+    return len(frame)
+
+
+def _export_results(piece, ind_analyzer, settings, metadata, path, fmt):
+    """
+    Used internally by :meth:`AggregatedPieces.export_dataset` to write one piece's results.
+
+    :returns: How many seconds it took, the number of rows written, and the error that stopped it
+        or ``None``.
+    :rtype: 3-tuple of float, int, and str
+    """
+    start = time.perf_counter()
+    try:
+        args = {} if settings is None else {'settings': settings}
+        rows = _write_partition(_flat_results(piece.get(ind_analyzer, **args), metadata), path, fmt)
+    except Exception as err: # pylint: disable=broad-except
+        return time.perf_counter() - start, 0, '{}: {}'.format(type(err).__name__, err)
+    return time.perf_counter() - start, rows, None
+
+
+def _export_results_file(pathname, ticks, *args):
+    """
+    Used internally by :meth:`AggregatedPieces.export_dataset` to write one piece's results in a
+    worker process. The piece is imported anew from its file there, as in :func:`_export_file`.
+    """
+    from vizitka.models.indexed_piece import _import_file
+    start = time.perf_counter()
+    try:
+        piece = _import_file(pathname, ticks=ticks)[0]
+    except Exception as err: # pylint: disable=broad-except
+        return time.perf_counter() - start, 0, '{}: {}'.format(type(err).__name__, err)
+    _, rows, error = _export_results(piece, *args)
+    return time.perf_counter() - start, rows, error
 
 
 class AggregatedPieces(object):
@@ -56,6 +372,18 @@ arguments. Please refer to the {} documentation to see what it requires.'
 
     _UNKNOWN_INPUT = "The input type is not one of the supported options"
 
+    # When export() gets a format it cannot write
+    _UNKNOWN_FORMAT = 'export() can write "kern" or "xml" files, but not "{}".'
+
+    # When export_dataset() gets a format it cannot write
+    _UNKNOWN_DATASET_FORMAT = 'export_dataset() can write "parquet" or "arrow" files, but not "{}".'
+
+    # When save_cache() is called on pieces that were not imported with a cache
+    _NO_CACHE = 'save_cache() needs pieces imported with the "cache" argument of Importer().'
+
+    # When export_dataset() is called but pyarrow is not installed
+    _NO_PYARROW = 'export_dataset() needs the pyarrow package. Please install it with pip.'
+
     class Metadata(object):
         """
         Used internally by :class:`AggregatedPieces` ... at least for now.
@@ -70,10 +398,21 @@ arguments. Please refer to the {} documentation to see what it requires.'
         """
         __slots__ = ('composers', 'dates', 'date_range', 'titles', 'locales', 'pathnames')
 
-    def __init__(self, pieces=None, metafile=None):
+    def __init__(self, pieces=None, metafile=None, memory_budget=None, spill_dir=None, cache=None):
         """
         :param pieces: The IndexedPieces to collect.
         :type pieces: list of :class:`~vis.models.indexed_piece.IndexedPiece`
+        :param int memory_budget: The most bytes, as estimated by :meth:`memory_usage`, that the
+            pieces may hold. When :meth:`get` takes them over the budget, the least recently used
+            pieces are spilled: the analyses they cached are pickled to disk, and their scores and
+            the analyses that hold music21 objects are dropped. A spilled piece is imported again
+            from its file and its analyses read back the next time it is used. Pieces without a
+            file of their own keep their scores. The default of ``None`` has no budget.
+        :param str spill_dir: The directory in which to make the temporary directory for the
+            spilled analyses. It is deleted with this :class:`AggregatedPieces`. The default is
+            the system's temporary directory.
+        :param cache: The corpus cache that the pieces were loaded from, for :meth:`save_cache`.
+        :type cache: :class:`~vizitka.models.corpus_cache.CorpusCache`
         """
         def init_metadata():
             """
@@ -88,6 +427,11 @@ arguments. Please refer to the {} documentation to see what it requires.'
         self._pieces = pieces if pieces is not None else []
         self._metafile = metafile if metafile is not None else []
         self._metadata = {}
+        self._budget = memory_budget
+        self._spill_parent = spill_dir
+        self._spill_dir = None
+        self._usage = None # position of each piece in memory: its estimated bytes, in LRU order
+        self._cache = cache
         init_metadata()
 
 
@@ -189,7 +533,8 @@ arguments. Please refer to the {} documentation to see what it requires.'
         else:
             return None
 
-    def get(self, ind_analyzer=None, settings=None, data=None):
+    def get(self, ind_analyzer=None, settings=None, data=None, long_format=False, workers=1,
+            executor=None, merge_cache=False):
         """
         Get the results of an :class:`Indexer` run on all the
         :class:`IndexedPiece` objects either individually, or all together. If
@@ -214,6 +559,25 @@ arguments. Please refer to the {} documentation to see what it requires.'
             argument was calculated on this indexed_piece.
         :type data: Depends on the requirement of the analyzer designated by the ``analyzer_cls``
             argument. Usually a list of :class:`pandas.DataFrame`.
+        :param bool long_format: Instead of a list of wide DataFrames, return one long-format
+            DataFrame indexed by ``('Piece', 'Part', 'Offset')``, where ``'Piece'`` is the position
+            of the piece, with one column per indexer. Each part of each piece has a row at the
+            offsets where it has a result, and each column has the narrowest type that holds its
+            values. This lets the results of the whole corpus be filtered and grouped at once.
+        :param int workers: The number of worker processes that run the pieces' ``get()``. The
+            default of ``1`` runs them one after another in this process, and ``None`` uses one
+            worker per processor. Pieces imported from a file of their own are sent to the
+            workers by pathname and imported again there, and other pieces are sent as their
+            score frozen with :func:`music21.converter.freezeStr`. Pieces that already cached
+            these results, pieces with neither a file nor a score, and pieces given ``data`` are
+            run in this process.
+        :param executor: Run the pieces with this executor rather than a new
+            :class:`~concurrent.futures.ProcessPoolExecutor` of ``workers`` processes. It is not
+            shut down afterwards.
+        :type executor: :class:`concurrent.futures.Executor`
+        :param bool merge_cache: Have the workers send back the analyses that their pieces cached,
+            except those holding music21 objects, and add them to the cache of the pieces here, so
+            later calls can reuse them.
         :returns: Results of the analyzer.
         :rtype: Depending on the ``analyzer_cls``, either a :class:`pandas.DataFrame` or more often
             a list of :class:`pandas.DataFrame`.
@@ -229,9 +593,395 @@ arguments. Please refer to the {} documentation to see what it requires.'
             args_dict['settings'] = settings
 
         if ind_analyzer is not None: # for indexers run individually on each indexed_piece in self._pieces
-            if data is None:
-                results = [p.get(ind_analyzer, **args_dict) for p in self._pieces]
+            if data is None and (workers != 1 or executor is not None):
+                results = self._get_parallel(ind_analyzer, args_dict, workers, executor, merge_cache)
             else:
-                results = [p.get(ind_analyzer, data[i], **args_dict) for i, p in enumerate(self._pieces)]
+                results = []
+                for i, p in enumerate(self._pieces):
+                    if data is None:
+                        results.append(p.get(ind_analyzer, **args_dict))
+                    else:
+                        results.append(p.get(ind_analyzer, data[i], **args_dict))
+                    self._enforce_budget(i)
+            if long_format:
+                results = _long_frame(results)
+
+        return results
+
+    def _get_parallel(self, ind_analyzer, args, workers, executor, merge_cache):
+        """
+        Used internally by :meth:`get` to run the pieces' ``get()`` with :meth:`_fan_out`, in the
+        order of the pieces. Refer to :meth:`get` for the arguments.
+        """
+        def local(i):
+            return self._pieces[i].get(ind_analyzer, **args), None
+
+        def remote(i, source):
+            return (source, self._pieces[i]._ticks, self._pieces[i]._metadata, ind_analyzer, args,
+                    merge_cache)
 
+        keys = None
+        if not args:
+            keys = [_cache_key(piece, ind_analyzer) for piece in self._pieces]
+        done = self._fan_out(range(len(self._pieces)), local, _get_remote, remote, workers,
+                             executor=executor, keys=keys, frozen=True)
+        results = []
+        for i, (result, cache) in done.items():
+            results.append(result)
+            if cache:
+                for key, val in cache.items():
+                    self._pieces[i]._analyses.setdefault(key, val)
+        for i in range(len(self._pieces)):
+            self._enforce_budget(i)
         return results
+
+    def _fan_out(self, todo, local, worker, remote, workers, executor=None, keys=None,
+                 frozen=False, failed=None):
+        """
+        Used internally by :meth:`get`, :meth:`dissonance_profile`, :meth:`export`, and
+        :meth:`export_dataset` to run one job for each of the pieces at the positions in ``todo``.
+        Pieces imported from a file of their own are sent to ``worker`` in a worker process by
+        pathname, and with ``frozen`` other pieces are sent as their score frozen with
+        :func:`music21.converter.freezeStr`. The rest are run here with ``local`` while the workers
+        are busy, as are pieces whose ``keys`` entry names an analysis they already cached,
+        perhaps on disk. With ``workers`` of ``1`` and no ``executor``, every piece is run here.
+
+        :param todo: The positions of the pieces to run, in order.
+        :param local: Called with the position of a piece to run it here.
+        :param worker: The module-level function run in the worker processes.
+        :param remote: Called with the position of a piece and what is sent for it, to give the
+            arguments of ``worker``.
+        :param int workers: The number of worker processes, as for :meth:`get`.
+        :param executor: Run the workers' jobs with this executor, as for :meth:`get`.
+        :param list keys: For each piece, the analysis that lets it be run here, or ``None``.
+        :param bool frozen: Send pieces without a file of their own as their frozen score.
+        :param failed: Called with the exception of a job that failed in a worker to give its
+            result. Without it, the exception is raised.
+        :returns: The result of each job, by the position of its piece, in the order of ``todo``.
+        :rtype: dict
+        """
+        sources = {}
+        if workers != 1 or executor is not None:
+            for i in todo:
+                piece = self._pieces[i]
+                if keys is not None and keys[i] is not None:
+                    piece._restore() # the analyses may be on disk
+                    if keys[i] in piece._analyses:
+                        continue
+                if piece._pathname and piece._opus_id is None and os.path.isfile(piece._pathname):
+                    sources[i] = piece._pathname
+                elif frozen and piece._score is not None:
+                    sources[i] = converter.freezeStr(piece._score)
+
+        results = {i: None for i in todo}
+        if not sources:
+            for i in todo:
+                results[i] = local(i)
+            return results
+        pool = executor if executor is not None else ProcessPoolExecutor(workers)
+        try:
+            futures = {i: pool.submit(worker, *remote(i, source)) for i, source in sources.items()}
+            # run the other pieces here while the workers are busy
+            for i in todo:
+                if i not in futures:
+                    results[i] = local(i)
+            for i, future in futures.items():
+                try:
+                    results[i] = future.result()
+                except Exception as err: # pylint: disable=broad-except
+                    if failed is None:
+                        raise
+                    results[i] = failed(err)
+        finally:
+            if executor is None:
+                pool.shutdown()
+        return results
+
+    def _enforce_budget(self, i):
+        """
+        Used internally by :meth:`get` to note that the piece at ``i`` was just used and, while the
+        pieces in memory are over the memory budget, spill the least recently used of the others.
+        """
+        if self._budget is None:
+            return
+        if self._usage is None:
+            self._usage = collections.OrderedDict((j, p._memory_usage())
+                                                  for j, p in enumerate(self._pieces)
+                                                  if p._spilled is None)
+        self._usage[i] = self._pieces[i]._memory_usage()
+        self._usage.move_to_end(i)
+        total = sum(self._usage.values())
+        for j in list(self._usage)[:-1]:
+            if total <= self._budget:
+                break
+            if self._pieces[j]._spilled is not None and not self._pieces[j]._analyses:
+                continue # only the score is left, which cannot be spilled
+            if self._spill_dir is None:
+                if self._spill_parent is not None:
+                    os.makedirs(self._spill_parent, exist_ok=True)
+                self._spill_dir = tempfile.mkdtemp(prefix='vizitka-', dir=self._spill_parent)
+                weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+            self._pieces[j]._spill(os.path.join(self._spill_dir, '{}.pickle'.format(j)))
+            left = self._pieces[j]._memory_usage()
+            total -= self._usage[j] - left
+            if left: # the score stays unless it can be imported again from its file
+                self._usage[j] = left
+            else:
+                del self._usage[j]
+
+    def save_cache(self):
+        """
+        Save the analyses that the pieces have made, except those that hold music21 objects, to
+        the corpus cache that they were imported with, so that the next
+        :func:`~vizitka.models.indexed_piece.Importer` with the same ``cache`` reuses them.
+
+        :returns: The number of pieces whose analyses were saved.
+        :rtype: int
+        :raises: :exc:`RuntimeError` if the pieces were not imported with a cache.
+        """
+        if self._cache is None:
+            raise RuntimeError(AggregatedPieces._NO_CACHE)
+        return self._cache.save(self._pieces)
+
+    def memory_usage(self):
+        """
+        Estimate how much memory each piece holds: its cached analyses and, at a fixed number of
+        bytes per element, its music21 score. Use it to choose a ``memory_budget``.
+
+        :returns: One row per piece with its ``'Pathname'``, the estimated ``'Bytes'`` it holds,
+            and whether it is ``'Spilled'`` to disk.
+        :rtype: :class:`pandas.DataFrame`
+        """
+        return pandas.DataFrame([(p._pathname, p._memory_usage(), p._spilled is not None)
+                                 for p in self._pieces], columns=('Pathname', 'Bytes', 'Spilled'))
+
+    def near_duplicates(self, threshold=0.8, settings=None, bands=None):
+        """
+        Find the pairs of pieces that are probably concordances, contrafacta, or duplicate
+        encodings of each other. Each piece is fingerprinted with
+        ``get('fingerprint', settings)`` and the fingerprints are put in a
+        :class:`~vizitka.models.fingerprint.LSHIndex`, so only pieces that share a bucket are
+        compared.
+
+        :param float threshold: The estimated Jaccard similarity of two pieces' interval n-grams
+            above which they are reported.
+        :param settings: Settings for the fingerprints. Refer to
+            :meth:`~vizitka.models.indexed_piece.IndexedPiece._get_fingerprint`.
+        :type settings: dict
+        :param int bands: The number of LSH bands. Refer to
+            :class:`~vizitka.models.fingerprint.LSHIndex`.
+
+        :returns: One row per pair of pieces, with their positions in this
+            :class:`AggregatedPieces` and their estimated similarity, most similar first.
+        :rtype: :class:`pandas.DataFrame`
+        """
+        signatures = self.get('fingerprint', settings)
+        lsh = fingerprint.LSHIndex(len(signatures[0]), threshold, bands)
+        for i, sig in enumerate(signatures):
+            lsh.add(i, sig)
+        return pandas.DataFrame(lsh.near_duplicates(), columns=('Piece A', 'Piece B', 'Similarity'))
+
+    def dissonance_profile(self, workers=None, by_voice=False):
+        """
+        Count the dissonance types that the
+        :class:`~vizitka.indexers.dissonance.DissonanceIndexer` finds in each piece. The pieces are
+        analyzed in worker processes, which send back only their counts, so the labels of the
+        whole corpus are never held in memory at once.
+
+        :param int workers: The number of worker processes. The default of ``None`` uses one per
+            processor. Each worker imports its pieces again from their files. With ``1`` the
+            pieces are analyzed in this process instead, and they keep the cached inputs of the
+            DissonanceIndexer but not its results. Pieces that already cached their dissonances,
+            or that were not imported from a file of their own, are always counted in this
+            process.
+        :param bool by_voice: Count each voice of each piece separately rather than each piece.
+
+        :returns: One row per piece, or per voice of each piece, in the order of the pieces, and a
+            last row ``'All'`` with the totals of the corpus. There is one column per dissonance
+            type, from ``'Q'`` to ``'Z'``.
+        :rtype: :class:`pandas.DataFrame`
+        :raises: :exc:`RuntimeWarning` if there are no pieces.
+        """
+        if not self._pieces:
+            raise RuntimeWarning(AggregatedPieces._NO_PIECES)
+
+        counts = list(self._fan_out(range(len(self._pieces)),
+                                    lambda i: _dissonance_counts(self._pieces[i]), _count_file,
+                                    lambda i, source: (source,), workers,
+                                    keys=['dissonance'] * len(self._pieces)).values())
+
+        if by_voice:
+            rows = numpy.concatenate([piece for _, piece in counts])
+            index = pandas.MultiIndex.from_tuples(
+                [(i, voice) for i, (voices, _) in enumerate(counts) for voice in voices] +
+                [('All', 'All')], names=('Piece', 'Voice'))
+        else:
+            rows = numpy.array([piece.sum(axis=0) for _, piece in counts])
+            index = pandas.Index(list(range(len(counts))) + ['All'], name='Piece')
+        rows = numpy.concatenate((rows, rows.sum(axis=0, keepdims=True)))
+        return pandas.DataFrame(rows, index=index, columns=list(_DISSONANCE_LABELS))
+
+    def _export_names(self, extension):
+        """
+        Used internally by :meth:`export` to name the output file of each piece after the file it
+        was imported from, or else after its title. Movements of an opus are numbered, and a name
+        that is already taken gets the position of the piece appended.
+        """
+        names, taken = [], set()
+        for i, piece in enumerate(self._pieces):
+            if piece._pathname:
+                stem = os.path.splitext(os.path.basename(piece._pathname))[0]
+                if piece._opus_id is not None:
+                    stem = '{}_{}'.format(stem, piece._opus_id)
+            else:
+                stem = piece.metadata('title') or 'piece'
+            name = stem + extension
+            if name in taken:
+                name = '{}_{}{}'.format(stem, i, extension)
+            taken.add(name)
+            names.append(name)
+        return names
+
+    def export(self, format, out_dir, workers=None, force=False): # pylint: disable=redefined-builtin
+        """
+        Write every piece to a kern or MusicXML file in ``out_dir``, as
+        :meth:`~vizitka.models.indexed_piece.IndexedPiece.to_kern` or
+        :meth:`~vizitka.models.indexed_piece.IndexedPiece.to_xml` would. The pieces are exported
+        in worker processes, and a piece that cannot be exported is reported rather than stopping
+        the others.
+
+        Each output file is named after the file its piece was imported from, and ``out_dir``
+        keeps a record of the size, modification time, and hash of that source file. A piece is
+        skipped if its output file exists and its source file has not changed since, so running
+        the same export again only writes the pieces whose sources were edited. A source file is
+        only hashed again when its size or modification time has changed.
+
+        :param str format: Either ``'kern'`` or ``'xml'``.
+        :param str out_dir: The directory for the output files. It is created if necessary.
+        :param int workers: The number of worker processes. The default of ``None`` uses one per
+            processor. Each worker imports its pieces again from their files. With ``1`` the
+            pieces are exported in this process instead. Pieces that were not imported from a
+            file of their own are always exported in this process.
+        :param bool force: Export every piece, even those that are up to date.
+
+        :returns: One row per piece, in the order of the pieces, with its ``'Source'`` and
+            ``'Output'`` paths, its ``'Status'`` (``'exported'``, ``'skipped'``, or
+            ``'failed'``), the ``'Seconds'`` its export took, and the ``'Error'`` that stopped it.
+        :rtype: :class:`pandas.DataFrame`
+        :raises: :exc:`ValueError` if ``format`` is neither ``'kern'`` nor ``'xml'``.
+        :raises: :exc:`RuntimeWarning` if there are no pieces.
+        """
+        if format not in _EXPORT_FORMATS:
+            raise ValueError(AggregatedPieces._UNKNOWN_FORMAT.format(format))
+        if not self._pieces:
+            raise RuntimeWarning(AggregatedPieces._NO_PIECES)
+
+        os.makedirs(out_dir, exist_ok=True)
+        manifest_path = os.path.join(out_dir, _EXPORT_MANIFEST)
+        try:
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            manifest = {}
+
+        names = self._export_names(_EXPORT_FORMATS[format])
+        rows = [[p._pathname or None, os.path.join(out_dir, name), 'skipped', 0.0, None]
+                for p, name in zip(self._pieces, names)]
+        stamps, todo = {}, []
+        for i, piece in enumerate(self._pieces):
+            recorded = manifest.get(names[i])
+            if piece._pathname and os.path.isfile(piece._pathname):
+                stamps[i] = _source_stamp(piece._pathname, recorded)
+                if (not force and recorded is not None and os.path.exists(rows[i][1]) and
+                        stamps[i]['source'] == recorded.get('source') and
+                        stamps[i]['sha1'] == recorded.get('sha1')):
+                    manifest[names[i]] = stamps[i] # remember a new mtime of the same contents
+                    continue
+            todo.append(i)
+
+        results = self._fan_out(
+            todo, lambda i: _export_piece(self._pieces[i], format, rows[i][1]), _export_file,
+            lambda i, source: (source, self._pieces[i]._ticks, format, rows[i][1]), workers,
+            failed=lambda err: (float('nan'), '{}: {}'.format(type(err).__name__, err)))
+
+        for i, (seconds, error) in results.items():
+            rows[i][2:] = ['exported' if error is None else 'failed', seconds, error]
+            if error is None and i in stamps:
+                manifest[names[i]] = stamps[i]
+            else:
+                manifest.pop(names[i], None)
+        with open(manifest_path + '.tmp', 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+        return pandas.DataFrame(rows, columns=('Source', 'Output', 'Status', 'Seconds', 'Error'))
+
+    def export_dataset(self, ind_analyzer, out_dir, settings=None, format='parquet', workers=None): # pylint: disable=redefined-builtin
+        """
+        Write the results of an indexer for every piece to a columnar dataset that other tools can
+        read, with one partition per piece. Each partition is a directory ``piece=<i>`` holding
+        one Parquet or Arrow file, so the dataset can be read with
+        ``pyarrow.dataset.dataset(out_dir, partitioning='hive')`` or as a Spark or DuckDB table.
+
+        Every row has the ``'Offset'`` of its events, one column per ``('Indexer', 'Part')``
+        column of the results named ``'Indexer/Part'``, and the ``'Composer'``, ``'Date'``,
+        ``'Title'``, ``'Locale'``, and ``'Pathname'`` of its piece, from :meth:`metadata`, or
+        ``None`` for the fields that cannot be found. Each partition is written as soon as its
+        piece is analyzed, so the results of the whole corpus are never held in memory at once.
+        Pieces with different parts have different columns, so read the dataset with the schema
+        that ``pyarrow.unify_schemas()`` makes of the schemas of its files.
+
+        :param ind_analyzer: The indexer to run, as for :meth:`get`.
+        :type ind_analyzer: str
+        :param str out_dir: The directory for the dataset. It is created if necessary.
+        :param settings: Settings to be used with the indexer.
+        :type settings: dict
+        :param str format: Either ``'parquet'`` or ``'arrow'`` (the Arrow IPC, or Feather, format).
+        :param int workers: The number of worker processes, as for :meth:`export`. Each worker
+            imports its pieces again from their files and writes their partitions itself.
+
+        :returns: One row per piece, in the order of the pieces, with its ``'Source'`` and
+            ``'Output'`` paths, its ``'Status'`` (``'exported'`` or ``'failed'``), the ``'Rows'``
+            written, the ``'Seconds'`` its export took, and the ``'Error'`` that stopped it.
+        :rtype: :class:`pandas.DataFrame`
+        :raises: :exc:`ValueError` if ``format`` is neither ``'parquet'`` nor ``'arrow'``.
+        :raises: :exc:`ImportError` if pyarrow is not installed.
+        :raises: :exc:`RuntimeWarning` if there are no pieces.
+        """
+        if format not in _DATASET_FORMATS:
+            raise ValueError(AggregatedPieces._UNKNOWN_DATASET_FORMAT.format(format))
+        try:
+            import pyarrow # pylint: disable=unused-import
+        except ImportError:
+            raise ImportError(AggregatedPieces._NO_PYARROW)
+        if not self._pieces:
+            raise RuntimeWarning(AggregatedPieces._NO_PIECES)
+
+        fields = {}
+        for field, name in _DATASET_METADATA:
+            try:
+                fields[name] = self.metadata(field)
+            except AttributeError: # a field that these pieces do not have
+                fields[name] = None
+            if fields[name] is None:
+                fields[name] = [None] * len(self._pieces)
+        rows, jobs = [], []
+        for i, piece in enumerate(self._pieces):
+            path = os.path.join(out_dir, 'piece={}'.format(i), 'part-0' + _DATASET_FORMATS[format])
+            rows.append([piece._pathname or None, path])
+            metadata = {name: values[i] for name, values in fields.items()}
+            jobs.append((ind_analyzer, settings, metadata, path, format))
+
+        keys = None
+        if settings is None:
+            keys = [_cache_key(piece, ind_analyzer) for piece in self._pieces]
+        results = self._fan_out(
+            range(len(self._pieces)), lambda i: _export_results(self._pieces[i], *jobs[i]),
+            _export_results_file, lambda i, source: (source, self._pieces[i]._ticks) + jobs[i],
+            workers, keys=keys,
+            failed=lambda err: (float('nan'), 0, '{}: {}'.format(type(err).__name__, err)))
+
+        for i, (seconds, count, error) in results.items():
+            rows[i].extend(['exported' if error is None else 'failed', count, seconds, error])
+        return pandas.DataFrame(rows, columns=('Source', 'Output', 'Status', 'Rows', 'Seconds',
+                                               'Error'))
@@ -0,0 +1,652 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models/batch.py
+# Purpose:                Resumable batch analysis of large corpora.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+.. codeauthor:: Alexander Morgan
+
+The :class:`BatchRunner` runs an indexer over a corpus that is too large or too fragile to analyze
+in one go. Each piece is analyzed in a process of its own, its results are saved as soon as they
+are ready, and a manifest records which pieces are done, so a job that was interrupted carries on
+from where it stopped when it is run again.
+
+The :class:`Coordinator` shares the pieces of a corpus among worker processes on any number of
+machines, which connect to it over TCP with :func:`run_worker`.
+"""
+
+import collections
+import hashlib
+import multiprocessing
+from multiprocessing.connection import wait
+from multiprocessing.managers import BaseManager
+import os
+import socket
+import sqlite3
+import threading
+import time
+import pandas
+from vizitka.models.indexed_piece import _find_files, _import_file
+
+
+def _run_piece(pathname, ind_analyzer, settings, ticks, out_path, conn):
+    """
+    Used internally by :class:`BatchRunner` as the target of the process that analyzes one piece.
+    The results are pickled to a temporary file that is renamed to ``out_path`` once it is
+    complete, then ``None``, or a description of the error that stopped the analysis, is sent
+    through ``conn``.
+    """
+    try:
+        piece = _import_file(pathname, ticks=ticks)[0]
+        args = {} if settings is None else {'settings': settings}
+        results = piece.get(ind_analyzer, **args)
+        pandas.to_pickle(results, out_path + '.tmp', compression=None)
+        os.replace(out_path + '.tmp', out_path)
+        conn.send(None)
+    except Exception as err: # pylint: disable=broad-except
+        conn.send('{}: {}'.format(type(err).__name__, err))
+    finally:
+        conn.close()
+
+
+class BatchRunner(object):
+    """
+    Run :meth:`~vizitka.models.indexed_piece.IndexedPiece.get` on every file of a corpus, one
+    process per piece, and save each piece's results to ``out_dir`` as a pickle as soon as they
+    are ready.
+
+    The progress of the job is checkpointed after every piece in an SQLite manifest,
+    ``out_dir/manifest.sqlite``. When a job is run again with the same ``out_dir``, the pieces
+    whose results were saved are skipped and the others, including those that failed or were
+    running when the job was interrupted, are analyzed again. A piece that raises an exception,
+    takes longer than ``timeout`` seconds, or whose process dies (when it runs out of memory, for
+    example) is retried up to ``retries`` times and then marked as failed, without stopping the
+    other pieces.
+
+    **Example:**
+
+    >>> runner = BatchRunner('path/to/corpus', 'dissonance', 'path/to/results', timeout=600,
+    ...                      retries=1, workers=8)
+    >>> runner.run()
+    >>> for pathname, dissonances in runner.results():
+    ...     pass
+    """
+
+    # When there are no files in the location given.
+    _NO_FILES = 'There are no files to analyze in {}.'
+
+    # When the out_dir was used for a different job.
+    _OTHER_JOB = 'The manifest in {} is for a different job ({}). Please use another out_dir.'
+
+    # The columns of the manifest, as returned by manifest().
+    _COLUMNS = ('Pathname', 'Status', 'Attempts', 'Seconds', 'Error', 'Output')
+
+    def __init__(self, location, ind_analyzer, out_dir, settings=None, timeout=None, retries=0,
+                 workers=1, ticks=False):
+        """
+        :param location: A file, a list of files, or a directory of files to analyze, as for
+            :func:`~vizitka.models.indexed_piece.Importer`. The files of a directory are analyzed
+            in alphabetical order.
+        :type location: str or list of str
+        :param str ind_analyzer: The indexer to run on each piece.
+        :param str out_dir: The directory for the results and the manifest. It is created if
+            necessary.
+        :param dict settings: Settings for the indexer.
+        :param float timeout: The number of seconds a piece may take, or ``None`` for no limit.
+        :param int retries: How many more times to try a piece that failed.
+        :param int workers: How many pieces to analyze at once.
+        :param bool ticks: Whether the pieces index their events with integer ticks.
+
+        :raises: :exc:`RuntimeError` if ``location`` has no files.
+        :raises: :exc:`RuntimeError` if ``out_dir`` holds the manifest of a job with a different
+            indexer, settings, or timebase.
+        """
+        if isinstance(location, list) or os.path.isdir(location):
+            file_paths = _find_files(location)[0]
+            if not isinstance(location, list):
+                file_paths = sorted(file_paths)
+        else:
+            file_paths = [location]
+        if not file_paths:
+            raise RuntimeError(BatchRunner._NO_FILES.format(location))
+
+        self._paths = [os.path.abspath(path) for path in file_paths]
+        self._ind_analyzer = ind_analyzer
+        self._settings = settings
+        self._timeout = timeout
+        self._retries = retries
+        self._workers = workers
+        self._ticks = ticks
+        self._out_dir = out_dir
+
+        os.makedirs(out_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(out_dir, 'manifest.sqlite'))
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS job (key TEXT PRIMARY KEY, value TEXT)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS pieces (pathname TEXT PRIMARY KEY, '
+                             'position INTEGER, status TEXT, attempts INTEGER, seconds REAL, '
+                             'error TEXT, output TEXT)')
+            job = repr((ind_analyzer, sorted((settings or {}).items()), ticks))
+            self._db.execute('INSERT OR IGNORE INTO job VALUES (?, ?)', ('job', job))
+            recorded = self._db.execute("SELECT value FROM job WHERE key = 'job'").fetchone()[0]
+            if recorded != job:
+                raise RuntimeError(BatchRunner._OTHER_JOB.format(out_dir, recorded))
+            for position, path in enumerate(self._paths):
+                self._db.execute('INSERT OR IGNORE INTO pieces VALUES (?, ?, ?, 0, NULL, NULL, ?)',
+                                 (path, position, 'pending', self._output(path)))
+                self._db.execute('UPDATE pieces SET position = ? WHERE pathname = ?',
+                                 (position, path))
+
+    def _output(self, pathname):
+        """
+        Used internally to name the file of a piece's results after the piece's file and a hash of
+        its full pathname, so files with the same name in different directories do not collide.
+        """
+        stem = os.path.splitext(os.path.basename(pathname))[0]
+        digest = hashlib.sha1(pathname.encode('utf-8')).hexdigest()[:10]
+        return os.path.join(self._out_dir, '{}-{}.pickle'.format(stem, digest))
+
+    def _record(self, pathname, **fields):
+        """
+        Used internally to update the manifest entry of a piece and commit it immediately.
+        """
+        assignments = ', '.join('{} = ?'.format(field) for field in fields)
+        with self._db:
+            self._db.execute('UPDATE pieces SET {} WHERE pathname = ?'.format(assignments),
+                             list(fields.values()) + [pathname])
+
+    def manifest(self):
+        """
+        The state of every piece of the job.
+
+        :returns: One row per piece, in the order of the pieces, with its ``'Pathname'``, its
+            ``'Status'`` (``'pending'``, ``'running'``, ``'done'``, or ``'failed'``), the number
+            of ``'Attempts'`` made, the ``'Seconds'`` the last one took, the ``'Error'`` that
+            stopped the last one, and the ``'Output'`` file of its results.
+        :rtype: :class:`pandas.DataFrame`
+        """
+        marks = ', '.join('?' * len(self._paths))
+        rows = self._db.execute('SELECT pathname, status, attempts, seconds, error, output '
+                                'FROM pieces WHERE pathname IN ({}) ORDER BY position'.format(marks),
+                                self._paths).fetchall()
+        return pandas.DataFrame(rows, columns=BatchRunner._COLUMNS)
+
+    def run(self):
+        """
+        Analyze every piece that is not done yet, in order, and save their results.
+
+        :returns: The manifest after the run. Refer to :meth:`manifest`.
+        :rtype: :class:`pandas.DataFrame`
+        """
+        state = self.manifest()
+        queue = collections.deque(
+            (path, out) for path, status, out in zip(state['Pathname'], state['Status'], state['Output'])
+            if status != 'done' or not os.path.exists(out))
+        tries = collections.Counter()
+        running = {}
+        context = multiprocessing.get_context()
+
+        while queue or running:
+            while queue and len(running) < self._workers:
+                path, out = queue.popleft()
+                receiver, sender = context.Pipe(duplex=False)
+                proc = context.Process(target=_run_piece, daemon=True,
+                                       args=(path, self._ind_analyzer, self._settings,
+                                             self._ticks, out, sender))
+                proc.start()
+                sender.close()
+                tries[path] += 1
+                with self._db:
+                    self._db.execute("UPDATE pieces SET status = 'running', "
+                                     "attempts = attempts + 1 WHERE pathname = ?", (path,))
+                running[receiver] = (path, out, proc, time.monotonic())
+
+            wait_for = None
+            if self._timeout is not None:
+                oldest = min(start for _, _, _, start in running.values())
+                wait_for = max(0.0, oldest + self._timeout - time.monotonic())
+            finished = {conn: None for conn in wait(list(running), wait_for)}
+            for conn in finished:
+                path, out, proc, start = running[conn]
+                try:
+                    finished[conn] = conn.recv()
+                except EOFError: # the process died without reporting
+                    proc.join()
+                    finished[conn] = 'The process stopped with exit code {}.'.format(proc.exitcode)
+            now = time.monotonic()
+            for conn, (path, out, proc, start) in list(running.items()):
+                if conn not in finished:
+                    if self._timeout is None or now - start < self._timeout:
+                        continue
+                    proc.terminate()
+                    finished[conn] = 'Timed out after {} seconds.'.format(self._timeout)
+                proc.join()
+                conn.close()
+                del running[conn]
+                error = finished[conn]
+                if error is None:
+                    status = 'done'
+                elif tries[path] <= self._retries:
+                    status = 'pending'
+                    queue.append((path, out))
+                else:
+                    status = 'failed'
+                self._record(path, status=status, seconds=now - start, error=error)
+
+        return self.manifest()
+
+    def results(self):
+        """
+        Load the saved results of the pieces that are done, one piece at a time.
+
+        :returns: The pathname and results of each piece that is done, in the order of the pieces.
+        :rtype: generator of 2-tuples
+        """
+        state = self.manifest()
+        for path, status, out in zip(state['Pathname'], state['Status'], state['Output']):
+            if status == 'done' and os.path.exists(out):
+                yield path, pandas.read_pickle(out)
+
+    def close(self):
+        """
+        Close the manifest.
+        """
+        self._db.close()
+
+
+class _WorkQueue(object):
+    """
+    Used internally by :class:`Coordinator` to hand out the pieces of a corpus to the workers and
+    collect their results. It lives in the server process of a
+    :class:`multiprocessing.managers.BaseManager`, where the workers call its methods, each from a
+    thread of its own.
+    """
+
+    def __init__(self, paths, requests, ticks, lease, retries):
+        self._lock = threading.Lock()
+        self._paths = paths
+        self._job = {'requests': requests, 'ticks': ticks, 'lease': lease}
+        self._lease = lease
+        self._retries = retries
+        self._pending = collections.deque(range(len(paths)))
+        self._holders = {} # position of a piece: {worker: when it claimed the piece}
+        self._seen = {} # worker: when it was last heard from
+        self._finished = collections.Counter() # worker: number of results accepted
+        self._failures = collections.Counter()
+        self._results = {}
+        self._errors = {}
+        self._failed = set()
+
+    def _expire(self, now):
+        """
+        Give the pieces held only by workers that have not been heard from for longer than the
+        lease back to the front of the queue.
+        """
+        gone = {worker for worker, seen in self._seen.items() if now - seen > self._lease}
+        for pos, holders in list(self._holders.items()):
+            for worker in gone.intersection(holders):
+                del holders[worker]
+            if not holders:
+                del self._holders[pos]
+                self._pending.appendleft(pos)
+
+    def job(self):
+        """The get() requests, the timebase, and the lease of the job."""
+        return self._job
+
+    def claim(self, worker):
+        """
+        Lease a piece to ``worker``.
+
+        :returns: The position and pathname of the piece, an empty tuple if every piece that is
+            not finished is already leased to two workers or to this one, or ``None`` if every
+            piece is finished.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._seen[worker] = now
+            self._expire(now)
+            if len(self._results) + len(self._failed) == len(self._paths):
+                return None
+            while self._pending and (self._pending[0] in self._results or
+                                     self._pending[0] in self._failed):
+                self._pending.popleft() # finished by a late submission after it was queued again
+            if self._pending:
+                pos = self._pending.popleft()
+            else: # steal the piece that has been held longest by one other worker
+                stealable = [(min(holders.values()), pos) for pos, holders in self._holders.items()
+                             if len(holders) < 2 and worker not in holders]
+                if not stealable:
+                    return ()
+                pos = min(stealable)[1]
+            self._holders.setdefault(pos, {})[worker] = now
+            return pos, self._paths[pos]
+
+    def heartbeat(self, worker):
+        """Note that ``worker`` is still working."""
+        with self._lock:
+            self._seen[worker] = time.monotonic()
+
+    def submit(self, worker, pos, results, error=None):
+        """
+        Record the ``results`` of the piece at ``pos``, or the ``error`` that stopped them. A
+        failed piece is queued again until it has failed more than ``retries`` times.
+
+        :returns: Whether the results were used, rather than being a duplicate.
+        :rtype: bool
+        """
+        with self._lock:
+            self._seen[worker] = time.monotonic()
+            holders = self._holders.get(pos, {})
+            holders.pop(worker, None)
+            if pos in self._results or pos in self._failed:
+                return False
+            if error is None:
+                self._results[pos] = results
+                self._errors.pop(pos, None)
+                self._finished[worker] += 1
+                self._holders.pop(pos, None)
+                return True
+            self._errors[pos] = error
+            self._failures[pos] += 1
+            if not holders: # unless another worker is still on it
+                self._holders.pop(pos, None)
+                if self._failures[pos] > self._retries:
+                    self._failed.add(pos)
+                elif pos not in self._pending: # its lease may have expired and queued it already
+                    self._pending.append(pos)
+            return True
+
+    def finished(self):
+        """Whether every piece has results or has failed."""
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._results) + len(self._failed) == len(self._paths)
+
+    def results(self):
+        """The results of each piece, or ``None``, in the order of the pieces."""
+        with self._lock:
+            return [self._results.get(pos) for pos in range(len(self._paths))]
+
+    def status(self):
+        """The pathname, status, workers, and error of each piece."""
+        with self._lock:
+            rows = []
+            for pos, path in enumerate(self._paths):
+                if pos in self._results:
+                    state = 'done'
+                elif pos in self._failed:
+                    state = 'failed'
+                elif pos in self._holders:
+                    state = 'running'
+                else:
+                    state = 'pending'
+                rows.append((path, state, sorted(self._holders.get(pos, ())),
+                             self._errors.get(pos)))
+            return rows
+
+    def workers(self):
+        """How long ago each worker was heard from, its pieces, and its accepted results."""
+        with self._lock:
+            now = time.monotonic()
+            return [(worker, now - seen, sorted(pos for pos, holders in self._holders.items()
+                                                if worker in holders), self._finished[worker])
+                    for worker, seen in sorted(self._seen.items())]
+
+
+_SERVED = {}
+
+
+def _serve_queue():
+    """
+    Used internally by :class:`Coordinator` to give each connection to its manager the same
+    :class:`_WorkQueue`, which :func:`_init_queue` made in the manager's server process.
+    """
+    return _SERVED['queue']
+
+
+def _init_queue(*args):
+    """
+    Used internally by :meth:`Coordinator.start` to make the :class:`_WorkQueue` of the
+    manager's server process.
+    """
+    _SERVED['queue'] = _WorkQueue(*args)
+
+
+class _QueueManager(BaseManager):
+    """
+    Used internally by :class:`Coordinator` to serve its :class:`_WorkQueue`, and by
+    :func:`run_worker` to reach it.
+    """
+
+_QueueManager.register('work_queue', callable=_serve_queue)
+
+
+class Coordinator(object):
+    """
+    Serve the pieces of a corpus to worker processes, on this machine or others, and collect their
+    results. Each worker, started with :func:`run_worker` and the coordinator's ``address`` and
+    ``authkey``, claims a piece, imports it, runs every request of the job with
+    :meth:`~vizitka.models.indexed_piece.IndexedPiece.get`, and sends back the results before it
+    claims another.
+
+    - A worker sends a heartbeat while it analyzes a piece. The pieces of a worker that has not
+      been heard from for ``lease`` seconds are given to the next idle worker.
+    - When no pieces are left to hand out, idle workers steal the piece that has been running the
+      longest on another worker, so a slow machine does not hold up the end of the job.
+    - Only the first results of each piece are kept. The duplicates sent by workers whose pieces
+      were stolen or expired are dropped.
+    - A piece that raises an exception is retried on any worker up to ``retries`` times.
+
+    **Example:**
+
+    >>> coordinator = Coordinator('path/to/corpus', ['noterest', ('duration', None)],
+    ...                           address=('0.0.0.0', 50000))
+    >>> address = coordinator.start()
+    >>> # on each node: run_worker(('coordinator.host', 50000), coordinator.authkey)
+    >>> coordinator.wait()
+    >>> results = coordinator.results()
+    """
+
+    # When a request is not an indexer name or an (indexer name, settings) pair.
+    _BAD_REQUEST = 'Each request must be the name of an indexer or an (indexer, settings) tuple.'
+
+    def __init__(self, location, requests, address=('127.0.0.1', 0), authkey=None, lease=60.0,
+                 retries=0, ticks=False):
+        """
+        :param location: A file, a list of files, or a directory of files to analyze, as for
+            :class:`BatchRunner`.
+        :type location: str or list of str
+        :param requests: The indexers to run on each piece, each either a name or a 2-tuple of a
+            name and its settings.
+        :type requests: list
+        :param address: The host and port to listen on. Port 0 picks a free port.
+        :type address: 2-tuple of str and int
+        :param bytes authkey: The key that workers must present. The default is a random key,
+            available as :attr:`authkey`.
+        :param float lease: How many seconds a worker may go without being heard from before its
+            pieces are handed to another worker.
+        :param int retries: How many more times to try a piece that raised an exception.
+        :param bool ticks: Whether the pieces index their events with integer ticks.
+
+        :raises: :exc:`RuntimeError` if ``location`` has no files.
+        :raises: :exc:`TypeError` if a request is malformed.
+        """
+        if isinstance(location, list) or os.path.isdir(location):
+            file_paths = _find_files(location)[0]
+            if not isinstance(location, list):
+                file_paths = sorted(file_paths)
+        else:
+            file_paths = [location]
+        if not file_paths:
+            raise RuntimeError(BatchRunner._NO_FILES.format(location))
+        jobs = []
+        for request in requests:
+            if isinstance(request, str):
+                request = (request, None)
+            if not (isinstance(request, tuple) and len(request) == 2):
+                raise TypeError(Coordinator._BAD_REQUEST)
+            jobs.append(request)
+
+        self.paths = [os.path.abspath(path) for path in file_paths]
+        self.authkey = os.urandom(32) if authkey is None else authkey
+        self.address = address
+        self._args = (self.paths, jobs, ticks, lease, retries)
+        self._manager = None
+        self._queue = None
+
+    def start(self):
+        """
+        Start serving the pieces from a server process.
+
+        :returns: The address the coordinator listens on, with the actual port.
+        :rtype: 2-tuple of str and int
+        """
+        if self._manager is None:
+            self._manager = _QueueManager(address=self.address, authkey=self.authkey)
+            self._manager.start(_init_queue, self._args)
+            self.address = self._manager.address
+            self._queue = self._manager.work_queue()
+        return self.address
+
+    def wait(self, timeout=None, poll=0.1):
+        """
+        Wait until every piece has results or has failed.
+
+        :param float timeout: The most seconds to wait, or ``None`` to wait as long as it takes.
+        :returns: Whether every piece is finished.
+        :rtype: bool
+        """
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._queue.finished():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def results(self):
+        """
+        :returns: For each piece, in order, the list of the results of each request, or ``None``
+            if the piece has failed or is not finished.
+        :rtype: list
+        """
+        self.start()
+        return self._queue.results()
+
+    def status(self):
+        """
+        :returns: One row per piece with its ``'Pathname'``, its ``'Status'`` (``'pending'``,
+            ``'running'``, ``'done'``, or ``'failed'``), the ``'Workers'`` running it, and the
+            last ``'Error'`` it raised.
+        :rtype: :class:`pandas.DataFrame`
+        """
+        self.start()
+        return pandas.DataFrame(self._queue.status(),
+                                columns=('Pathname', 'Status', 'Workers', 'Error'))
+
+    def workers(self):
+        """
+        :returns: One row per worker that has connected, with the ``'Seconds'`` since it was last
+            heard from, the positions of the ``'Pieces'`` it holds, the number of its results that
+            were ``'Accepted'``, and whether it is ``'Idle'``: alive but holding no pieces.
+        :rtype: :class:`pandas.DataFrame`
+        """
+        self.start()
+        post = pandas.DataFrame(self._queue.workers(),
+                                columns=('Worker', 'Seconds', 'Pieces', 'Accepted'))
+        lease = self._args[3]
+        post['Idle'] = [not pieces and secs <= lease
+                        for pieces, secs in zip(post['Pieces'], post['Seconds'])]
+        return post
+
+    def shutdown(self):
+        """
+        Stop the server process. The results, status, and workers of the job are lost, and workers
+        that are still running stop when they next contact the coordinator.
+        """
+        if self._manager is not None:
+            self._queue = None
+            self._manager.shutdown()
+            self._manager = None
+
+
+def run_worker(address, authkey, worker=None, poll=0.5):
+    """
+    Work for a :class:`Coordinator` until it has no more pieces: claim a piece, import it, run the
+    job's requests on it, and send back the results. A heartbeat is sent from another thread while
+    a piece is analyzed. The worker stops when every piece is finished or the coordinator cannot
+    be reached.
+
+    :param address: The address of the coordinator.
+    :type address: 2-tuple of str and int
+    :param bytes authkey: The :attr:`Coordinator.authkey` of the coordinator.
+    :param str worker: The name of this worker. The default is the host name and process ID.
+    :param float poll: How many seconds to wait before asking again when every piece is leased.
+
+    :returns: The number of pieces this worker analyzed.
+    :rtype: int
+    """
+    worker = worker or '{}:{}'.format(socket.gethostname(), os.getpid())
+    client = _QueueManager(address=address, authkey=authkey)
+    client.connect()
+    queue = client.work_queue()
+    job = queue.job()
+    stop = threading.Event()
+
+    def beat():
+        """Send heartbeats over a connection of this thread's own."""
+        beats = _QueueManager(address=address, authkey=authkey)
+        try:
+            beats.connect()
+            beat_queue = beats.work_queue()
+            while not stop.wait(job['lease'] / 3.0):
+                beat_queue.heartbeat(worker)
+        except (EOFError, OSError):
+            return
+
+    beating = threading.Thread(target=beat, daemon=True)
+    beating.start()
+    count = 0
+    try:
+        while True:
+            claim = queue.claim(worker)
+            if claim is None:
+                break
+            if not claim:
+                time.sleep(poll)
+                continue
+            pos, path = claim
+            results, error = None, None
+            try:
+                piece = _import_file(path, ticks=job['ticks'])[0]
+                results = [piece.get(ind, **({} if setts is None else {'settings': setts}))
+                           for ind, setts in job['requests']]
+            except Exception as err: # pylint: disable=broad-except
+                error = '{}: {}'.format(type(err).__name__, err)
+            queue.submit(worker, pos, results, error)
+            count += 1
+    except (EOFError, OSError): # the coordinator has gone away
+        pass
+    finally:
+        stop.set()
+    return count
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models/contour_search.py
+# Purpose:                Search a corpus for melodic segments with a given contour.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+.. codeauthor:: Alexander Morgan
+
+Find every melodic segment in a corpus whose contour matches, or is similar to, a query contour.
+The :class:`ContourIndex` computes the contours of all the voices of all the pieces once, with the
+same windows as the :class:`~vizitka.indexers.contour.ContourIndexer`, and groups identical
+contours into buckets. Exact queries are a bucket lookup and similarity queries compare the query
+with each distinct contour only once, all at the same time, with the measure of
+:func:`~vizitka.indexers.contour.compare`.
+"""
+
+import numpy
+import pandas
+from vizitka.indexers import contour
+
+# The most comparisons ContourIndex.search() holds in memory at once.
+_CHUNK = 1 << 20
+
+
+def canonical(cseg):
+    """
+    Put a contour in its canonical form, where the lowest note is 0 and each successively higher
+    note is one more than the last, so that contours with the same shape are equal.
+
+    :param cseg: A contour as output by the :class:`~vizitka.indexers.contour.ContourIndexer`, or
+        its numbers. Several contours can be given as the rows of a 2-dimensional array.
+    :type cseg: str, sequence of int, or 2-dimensional :class:`numpy.ndarray`
+
+    :returns: The canonical contour or contours.
+    :rtype: :class:`numpy.ndarray` of int
+    """
+    cseg = contour._to_array(cseg) if isinstance(cseg, str) else numpy.asarray(cseg)
+    # the number of distinct values below each value
+    ordered = numpy.sort(cseg, axis=-1)
+    distinct = numpy.concatenate((numpy.ones(ordered.shape[:-1] + (1,), dtype=bool),
+                                  ordered[..., 1:] != ordered[..., :-1]), axis=-1)
+    below = (cseg[..., None] > ordered[..., None, :]) & distinct[..., None, :]
+    return below.sum(axis=-1)
+
+
+def _upper_signs(csegs):
+    """
+    Used internally by :class:`ContourIndex` to flatten the part of the COM matrices of contours
+    above the diagonal, i.e. whether each later note is higher (1), lower (-1), or the same (0)
+    as each earlier note.
+    """
+    rows, cols = numpy.triu_indices(csegs.shape[-1], 1)
+    return numpy.sign(csegs[..., cols] - csegs[..., rows]).astype(numpy.int8)
+
+
+class ContourIndex(object):
+    """
+    Index of the contours of one length in every voice of an
+    :class:`~vizitka.models.aggregated_pieces.AggregatedPieces`.
+
+    **Example:**
+
+    >>> from vizitka.models.indexed_piece import Importer
+    >>> corpus = Importer('path_to_corpus')
+    >>> index = ContourIndex(corpus, 4)
+    >>> index.search('[0, 2, 1, 3]', threshold=0.8)
+    """
+
+    # When a query does not have the length of the indexed contours.
+    _WRONG_LENGTH = 'This ContourIndex holds contours of length {}, but the query has length {}.'
+
+    def __init__(self, aggregated_pieces, length):
+        """
+        :param aggregated_pieces: The pieces to index. Their
+            :class:`~vizitka.indexers.noterest.NoteRestIndexer` results are used.
+        :type aggregated_pieces: :class:`~vizitka.models.aggregated_pieces.AggregatedPieces`
+        :param int length: The number of notes in each contour.
+        """
+        self.length = length
+        csegs = []
+        pieces = []
+        voices = []
+        offsets = []
+        for p, notes in enumerate(aggregated_pieces.get('noterest')):
+            for voice in notes.columns:
+                cons, starts = contour.voice_contours(notes[voice].values, length)
+                csegs.append(cons)
+                pieces.append(numpy.full(len(cons), p, dtype=numpy.int64))
+                voices.append(numpy.full(len(cons), voice[-1], dtype=object))
+                offsets.append(notes.index.values[starts])
+        if not csegs:
+            csegs, pieces, voices, offsets = ([numpy.zeros((0, length), dtype=numpy.int64)],
+                                              [[]], [[]], [[]])
+        self._pieces = numpy.concatenate(pieces).astype(numpy.int64)
+        self._voices = numpy.concatenate(voices).astype(object)
+        self._offsets = numpy.concatenate(offsets).astype(numpy.float64)
+        # Bucket identical canonical contours. self._bucket_of[i] is the bucket of segment i and
+        # each row of self._distinct is the contour of one bucket.
+        canon = canonical(numpy.concatenate(csegs)).reshape(-1, length)
+        self._distinct, self._bucket_of = numpy.unique(canon, axis=0, return_inverse=True)
+        self._bucket_of = self._bucket_of.ravel()
+        self._buckets = {tuple(row): b for b, row in enumerate(self._distinct.tolist())}
+        self._signs = _upper_signs(self._distinct)
+
+    def __len__(self):
+        return len(self._bucket_of)
+
+    def _similarities(self, query):
+        """
+        Used internally by :meth:`search` to find the similarity of the query with the contour of
+        every bucket, as :func:`~vizitka.indexers.contour.compare` would find it between their COM
+        matrices.
+        """
+        if self.length < 2:
+            return numpy.ones(len(self._distinct))
+        query = _upper_signs(query)
+        post = numpy.empty(len(self._distinct))
+        chunk = max(1, _CHUNK // len(query))
+        for start in range(0, len(self._distinct), chunk):
+            block = self._signs[start:start + chunk]
+            post[start:start + chunk] = (block == query).mean(axis=1)
+        return post
+
+    def search(self, query, threshold=1.0, limit=None):
+        """
+        Find the melodic segments whose contour is within ``threshold`` of the query.
+
+        :param query: The contour to search for. It does not need to be canonical.
+        :type query: str or sequence of int
+        :param float threshold: The lowest similarity to report. ``1.0`` (the default) finds only
+            segments with exactly the query's contour.
+        :param int limit: The largest number of matches to return, or ``None`` for all of them.
+
+        :returns: One row per matching segment with the position of its piece in the
+            :class:`AggregatedPieces`, its voice, the offset where it starts, its canonical
+            contour, and its similarity to the query, the most similar first.
+        :rtype: :class:`pandas.DataFrame`
+        :raises: :exc:`ValueError` if the query is not of the indexed length.
+        """
+        query = canonical(query)
+        if len(query) != self.length:
+            raise ValueError(ContourIndex._WRONG_LENGTH.format(self.length, len(query)))
+        if threshold >= 1.0:
+            bucket = self._buckets.get(tuple(query.tolist()))
+            hits = [] if bucket is None else [bucket]
+            scores = numpy.ones(len(hits))
+        else:
+            similarities = self._similarities(query)
+            hits = numpy.flatnonzero(similarities >= threshold)
+            scores = similarities[hits]
+        score_of = numpy.full(len(self._distinct), numpy.nan)
+        score_of[hits] = scores
+        rows = numpy.flatnonzero(numpy.isin(self._bucket_of, hits))
+        post = pandas.DataFrame({'Piece': self._pieces[rows],
+                                 'Voice': self._voices[rows],
+                                 'Offset': self._offsets[rows],
+                                 'Contour': [str(row) for row in self._distinct[self._bucket_of[rows]].tolist()],
+                                 'Similarity': score_of[self._bucket_of[rows]]},
+                                columns=('Piece', 'Voice', 'Offset', 'Contour', 'Similarity'))
+        post = post.sort_values(['Similarity', 'Piece', 'Offset'], ascending=[False, True, True],
+                                kind='mergesort').reset_index(drop=True)
+        if limit is not None:
+            post = post.iloc[:limit]
+        return post
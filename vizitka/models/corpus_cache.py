@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models/corpus_cache.py
+# Purpose:                Re-import a corpus incrementally from a persistent cache.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+.. codeauthor:: Alexander Morgan
+
+The :class:`CorpusCache` keeps a manifest of the files of a corpus, with their size, modification
+time, content hash, and the metadata of their pieces, along with the scores of the pieces and the
+analyses they made. When the corpus is imported again, only the files that were added or changed
+are parsed, the files that are gone are dropped, and the other pieces are made from the cache
+without parsing anything until they are used.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import pandas
+from music21 import converter
+from vizitka.models.aggregated_pieces import _MUSIC21_ANALYSES, _source_stamp
+
+
+class CorpusCache(object):
+    """
+    Persistent cache of an imported corpus, usually used through the ``cache`` argument of
+    :func:`~vizitka.models.indexed_piece.Importer`. The cache directory holds the manifest,
+    ``manifest.sqlite``, and the scores and analyses of the pieces, which are named after the
+    SHA-1 digest of their file, so a file that is touched but not changed is not parsed again.
+
+    - The score of each piece of a new or changed file is saved with
+      :func:`music21.converter.freezeStr` when the file is parsed. A piece made from the cache
+      thaws its score the first time it is used, which is several times faster than parsing.
+    - The analyses of the pieces, except those that hold music21 objects, are saved by
+      :meth:`save`, or :meth:`~vizitka.models.aggregated_pieces.AggregatedPieces.save_cache`, and
+      read back the first time a piece is used.
+
+    **Example:**
+
+    >>> corpus = Importer('path/to/corpus', cache='path/to/cache')
+    >>> results = corpus.get('dissonance')
+    >>> corpus.save_cache()
+    >>> # the next day, only the files that changed are parsed
+    >>> corpus = Importer('path/to/corpus', cache='path/to/cache')
+    """
+
+    def __init__(self, directory):
+        """
+        :param str directory: The directory of the cache. It is created if necessary.
+        """
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, 'manifest.sqlite'))
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS files (pathname TEXT PRIMARY KEY, '
+                             'stamp TEXT, pieces BLOB)')
+
+    def _score_file(self, digest, opus_id):
+        """Used internally to name the file of a piece's frozen score."""
+        return os.path.join(self._directory, '{}-{}.m21'.format(digest, opus_id or 0))
+
+    def _analyses_file(self, digest, opus_id, ticks):
+        """Used internally to name the file of a piece's analyses."""
+        return os.path.join(self._directory, '{}-{}{}.pickle'.format(digest, opus_id or 0,
+                                                                    '-ticks' if ticks else ''))
+
+    def _recorded(self):
+        """Used internally for the stamp and pickled pieces of each file of the manifest."""
+        return {path: (json.loads(stamp), pieces) for path, stamp, pieces in
+                self._db.execute('SELECT pathname, stamp, pieces FROM files')}
+
+    def diff(self, location):
+        """
+        Compare the files of ``location`` with the manifest. A file whose size or modification
+        time differs from the manifest's is hashed to find whether it really changed.
+
+        :param location: A file, a list of files, or a directory of files, as for
+            :func:`~vizitka.models.indexed_piece.Importer`.
+        :type location: str or list of str
+
+        :returns: The absolute pathnames of the files that are ``'added'``, ``'changed'``,
+            ``'removed'``, and ``'unchanged'``. Files of the manifest that no longer exist are
+            removed.
+        :rtype: dict of lists of str
+        """
+        return self._diff(location)[0]
+
+    def _diff(self, location):
+        """
+        Used internally by :meth:`diff` and :meth:`load`.
+
+        :returns: The diff, the current stamp of each file, the files as given, the metafile, and
+            the manifest's records that the stamps were checked against.
+        """
+        from vizitka.models.indexed_piece import _find_files
+        if isinstance(location, list) or os.path.isdir(location):
+            file_paths, meta = _find_files(location)
+        else:
+            file_paths, meta = [location], None
+        recorded = self._recorded()
+        post = {'added': [], 'changed': [], 'removed': [], 'unchanged': []}
+        stamps = {}
+        for path in file_paths:
+            path = os.path.abspath(path)
+            old = recorded.get(path)
+            stamps[path] = _source_stamp(path, old[0] if old is not None else None)
+            if old is None:
+                post['added'].append(path)
+            elif old[0]['sha1'] != stamps[path]['sha1']:
+                post['changed'].append(path)
+            else:
+                post['unchanged'].append(path)
+        post['removed'] = sorted(path for path in recorded
+                                 if path not in stamps and not os.path.exists(path))
+        return post, stamps, file_paths, meta, recorded
+
+    def load(self, location, metafile=None, ticks=False, corpus=None):
+        """
+        Import the files of ``location``, parsing only those that were added or changed since
+        they were last loaded, and update the manifest.
+
+        :param location: A file, a list of files, or a directory of files, as for
+            :func:`~vizitka.models.indexed_piece.Importer`.
+        :type location: str or list of str
+        :param str metafile: The metafile, if not in the directory.
+        :param bool ticks: Whether the pieces index their events with integer ticks.
+        :param corpus: Add the pieces to this :class:`AggregatedPieces` one file at a time, keeping
+            to its memory budget, rather than to a new list.
+        :type corpus: :class:`~vizitka.models.aggregated_pieces.AggregatedPieces`
+
+        :returns: The pieces, and the metafile.
+        :rtype: 2-tuple of list of :class:`~vizitka.models.indexed_piece.IndexedPiece` and str
+        """
+        from vizitka.models.indexed_piece import _import_file, IndexedPiece
+        changes, stamps, file_paths, meta, recorded = self._diff(location)
+        meta = metafile if metafile is not None else meta
+        reused = set(changes['unchanged'])
+        pieces = [] if corpus is None else corpus._pieces
+        with self._db:
+            for path in file_paths:
+                absolute = os.path.abspath(path)
+                stamp = stamps[absolute]
+                first = len(pieces)
+                if absolute in reused:
+                    for opus_id, metadata in pickle.loads(recorded[absolute][1]):
+                        piece = IndexedPiece(path, opus_id=opus_id, ticks=ticks)
+                        piece._metadata.update(metadata)
+                        piece._imported = True
+                        frozen = self._score_file(stamp['sha1'], opus_id)
+                        piece._frozen = frozen if os.path.isfile(frozen) else None
+                        cached = self._analyses_file(stamp['sha1'], opus_id, ticks)
+                        piece._cached = cached if os.path.isfile(cached) else None
+                        pieces.append(piece)
+                    if stamp != recorded[absolute][0]: # touched but not changed
+                        self._db.execute('UPDATE files SET stamp = ? WHERE pathname = ?',
+                                         (json.dumps(stamp), absolute))
+                else:
+                    parsed = _import_file(path, metafile=meta, ticks=ticks)
+                    for piece in parsed:
+                        if piece._score is not None:
+                            score_file = self._score_file(stamp['sha1'], piece._opus_id)
+                            with open(score_file, 'wb') as frozen:
+                                frozen.write(converter.freezeStr(piece._score))
+                    pieces.extend(parsed)
+                    self._db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+                                     (absolute, json.dumps(stamp), pickle.dumps(
+                                         [(p._opus_id, p._metadata) for p in parsed])))
+                if corpus is not None:
+                    for i in range(first, len(pieces)):
+                        corpus._enforce_budget(i)
+            self._db.executemany('DELETE FROM files WHERE pathname = ?',
+                                 [(path,) for path in changes['removed']])
+        self._sweep()
+        return pieces, meta
+
+    def _sweep(self):
+        """
+        Used internally by :meth:`load` to delete the scores and analyses of files that are no
+        longer in the manifest.
+        """
+        digests = {stamp['sha1'] for stamp, _ in self._recorded().values()}
+        for name in os.listdir(self._directory):
+            if name.endswith(('.m21', '.pickle')) and name.split('-', 1)[0] not in digests:
+                os.remove(os.path.join(self._directory, name))
+
+    def save(self, pieces):
+        """
+        Save the analyses of ``pieces`` that were loaded from this cache, except those that hold
+        music21 objects, so the next :meth:`load` reuses them.
+
+        :param pieces: The pieces.
+        :type pieces: list of :class:`~vizitka.models.indexed_piece.IndexedPiece`
+
+        :returns: The number of pieces whose analyses were saved.
+        :rtype: int
+        """
+        digests = {path: stamp['sha1'] for path, (stamp, _) in self._recorded().items()}
+        count = 0
+        for piece in pieces:
+            digest = digests.get(os.path.abspath(piece._pathname)) if piece._pathname else None
+            analyses = {key: val for key, val in piece._analyses.items()
+                        if key not in _MUSIC21_ANALYSES}
+            if digest is None or not (analyses or piece._spilled):
+                continue
+            for stored in (piece._spilled, piece._cached): # not yet restored
+                if stored is not None:
+                    analyses = dict(pandas.read_pickle(stored, compression=None), **analyses)
+            target = self._analyses_file(digest, piece._opus_id, piece._ticks)
+            pandas.to_pickle(analyses, target + '.tmp', compression=None)
+            os.replace(target + '.tmp', target)
+            count += 1
+        return count
+
+    def close(self):
+        """
+        Close the manifest.
+        """
+        self._db.close()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models/fingerprint.py
+# Purpose:                MinHash fingerprints of pieces for near-duplicate detection.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+.. codeauthor:: Alexander Morgan
+
+Fingerprint pieces to find concordances, contrafacta and duplicate encodings in a corpus. Each
+piece is reduced to the set of its melodic and vertical interval n-grams, and that set to a
+MinHash signature: a short array whose agreement with the signature of another piece estimates the
+Jaccard similarity of their n-gram sets. The :class:`LSHIndex` then buckets the signatures so that
+only pieces likely to be similar are ever compared.
+"""
+
+import zlib
+from collections import defaultdict
+from itertools import combinations
+import numpy
+from vizitka.indexers import ngram
+
+# The Mersenne prime 2**31 - 1. Hashes and permutation coefficients stay below it so that a*h + b
+# fits in a uint64 without overflowing.
+_PRIME = numpy.uint64((1 << 31) - 1)
+# How many shingles to permute at once in MinHasher.signature(); bounds its memory use.
+_CHUNK = 4096
+_melodic_setts = {'quality': False, 'simple or compound': 'compound', 'directed': True,
+                  'horiz_attach_later': True}
+_vertical_setts = {'quality': False, 'simple or compound': 'simple', 'directed': True}
+
+
+def piece_shingles(indexed_piece, n=3):
+    """
+    Collect the set of melodic and vertical interval n-grams of a piece, the "shingles" that its
+    fingerprint is made from. Melodic n-grams come from each voice's horizontal intervals and
+    vertical n-grams from each pair of voices' vertical intervals connected by the lower voice's
+    melodic motion, both made by the :class:`~vizitka.indexers.ngram.NGramIndexer`. Diatonic
+    intervals without quality are used so that small differences of musica ficta between sources
+    do not hide a concordance. N-grams never cross a rest, and which voices an n-gram came from is
+    ignored so that the same music in a different part order still matches.
+
+    :param indexed_piece: The piece to collect n-grams from.
+    :type indexed_piece: :class:`~vizitka.models.indexed_piece.IndexedPiece`
+    :param int n: The number of intervals in each n-gram.
+
+    :returns: The piece's n-grams as tuples of intervals, prefixed with ``'h'`` for melodic and
+        ``'v'`` for vertical n-grams.
+    :rtype: set of tuple
+    """
+    horiz = indexed_piece.get('horizontal_interval', settings=_melodic_setts.copy())
+    vert = indexed_piece.get('vertical_interval', settings=_vertical_setts.copy())
+    queries = [('h', [horiz], {'n': n, 'vertical': [(x,) for x in horiz.columns.get_level_values(1)]})]
+    if len(vert.columns) and n > 1:
+        queries.append(('v', [vert, horiz], {'n': n, 'horizontal': 'lowest',
+                                              'vertical': [(x,) for x in vert.columns.get_level_values(1)]}))
+    post = set()
+    for kind, data, setts in queries:
+        setts.update({'output': 'tuples', 'terminator': ['Rest']})
+        try:
+            grams = ngram.NGramIndexer(data, setts).run()
+        except RuntimeWarning:  # the piece is shorter than n
+            continue
+        for col in range(len(grams.columns)):
+            post.update((kind,) + gram for gram in grams.iloc[:, col].dropna())
+    return post
+
+
+class MinHasher(object):
+    """
+    Make MinHash signatures of sets of hashable observations. Two signatures can only be compared
+    if they were made with the same ``num_perm`` and ``seed``. The shingles are hashed with CRC-32
+    of their ``repr()`` rather than Python's :func:`hash` so that signatures made in different
+    processes or sessions agree.
+    """
+
+    def __init__(self, num_perm=128, seed=1):
+        """
+        :param int num_perm: The number of hash permutations, which is also the length of the
+            signatures. More permutations give more accurate similarity estimates.
+        :param int seed: Seeds the choice of permutations.
+        """
+        self.num_perm = num_perm
+        self.seed = seed
+        rand = numpy.random.RandomState(seed)
+        self._a = rand.randint(1, int(_PRIME), size=(num_perm, 1)).astype(numpy.uint64)
+        self._b = rand.randint(0, int(_PRIME), size=(num_perm, 1)).astype(numpy.uint64)
+
+    def signature(self, shingles):
+        """
+        Make the MinHash signature of a set.
+
+        :param shingles: The observations in the set.
+        :type shingles: iterable of objects whose ``repr()`` identifies them
+
+        :returns: The signature. An empty set gets a signature that matches nothing but other
+            empty sets.
+        :rtype: :class:`numpy.ndarray` of uint32 with ``num_perm`` elements
+        """
+        hashes = numpy.fromiter((zlib.crc32(repr(x).encode('utf-8')) for x in shingles),
+                                dtype=numpy.uint64)
+        hashes %= _PRIME
+        sig = numpy.full(self.num_perm, _PRIME, dtype=numpy.uint64)
+        for start in range(0, len(hashes), _CHUNK):
+            chunk = hashes[start:start + _CHUNK]
+            permuted = (self._a * chunk + self._b) % _PRIME
+            numpy.minimum(sig, permuted.min(axis=1), out=sig)
+        return sig.astype(numpy.uint32)
+
+
+def similarity(sig_a, sig_b):
+    """
+    Estimate the Jaccard similarity of two sets from their MinHash signatures.
+
+    :returns: The fraction of the signatures' elements that agree, between 0.0 and 1.0.
+    :rtype: float
+    """
+    return float(numpy.mean(numpy.asarray(sig_a) == numpy.asarray(sig_b)))
+
+
+def _choose_bands(num_perm, threshold):
+    """
+    Used internally by :class:`LSHIndex` to choose how many bands to split signatures into. Two
+    sets with Jaccard similarity ``s`` share a bucket with probability ``1 - (1 - s**r)**b`` for
+    ``b`` bands of ``r`` rows, which rises most steeply around ``(1/b)**(1/r)``. Pick the ``b``
+    that divides ``num_perm`` and puts that point closest to ``threshold``, erring low so that
+    true near-duplicates are rarely missed.
+    """
+    options = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda b: abs((1.0 / b) ** (b / num_perm) - (threshold - 0.05)))
+
+
+class LSHIndex(object):
+    """
+    Locality-sensitive hashing index of MinHash signatures. Each signature is cut into bands and
+    each band is hashed into a bucket; pieces that share a bucket in any band are candidates for
+    being near-duplicates, and only candidates get their signatures compared. Finding all the
+    near-duplicate pairs among N pieces therefore takes roughly linear rather than quadratic time.
+
+    **Example:**
+
+    >>> hasher = MinHasher()
+    >>> lsh = LSHIndex(threshold=0.8)
+    >>> for i, piece in enumerate(pieces):
+    ...     lsh.add(i, hasher.signature(piece_shingles(piece)))
+    >>> lsh.near_duplicates()
+    [(0, 4, 0.9296875), (2, 3, 0.8125)]
+    """
+
+    # When a signature is added that does not have the index's number of permutations.
+    _WRONG_LENGTH = 'This LSHIndex holds signatures of length {}, not {}.'
+
+    def __init__(self, num_perm=128, threshold=0.8, bands=None):
+        """
+        :param int num_perm: The length of the signatures that will be added.
+        :param float threshold: The estimated Jaccard similarity above which two pieces are
+            reported as near-duplicates.
+        :param int bands: The number of bands to cut signatures into. It must divide ``num_perm``.
+            If it is not given it is chosen to suit ``threshold``.
+        :raises: :exc:`ValueError` if ``bands`` does not divide ``num_perm``.
+        """
+        if bands is None:
+            bands = _choose_bands(num_perm, threshold)
+        elif num_perm % bands != 0:
+            raise ValueError('bands ({}) must divide num_perm ({})'.format(bands, num_perm))
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.bands = bands
+        self._rows = num_perm // bands
+        self._tables = [defaultdict(list) for _ in range(bands)]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        """Used internally to hash each band of a signature to its bucket key."""
+        signature = numpy.asarray(signature, dtype=numpy.uint32)
+        if len(signature) != self.num_perm:
+            raise ValueError(LSHIndex._WRONG_LENGTH.format(self.num_perm, len(signature)))
+        return [signature[i * self._rows:(i + 1) * self._rows].tobytes()
+                for i in range(self.bands)]
+
+    def add(self, key, signature):
+        """
+        Add a piece's signature to the index.
+
+        :param key: What identifies the piece in the results, e.g. its position in an
+            :class:`~vizitka.models.aggregated_pieces.AggregatedPieces` or its pathname.
+        :type key: hashable
+        :param signature: The piece's signature from :meth:`MinHasher.signature`.
+        :type signature: :class:`numpy.ndarray`
+        :raises: :exc:`ValueError` if the signature does not have ``num_perm`` elements.
+        """
+        for table, band in zip(self._tables, self._band_keys(signature)):
+            table[band].append(key)
+        self._signatures[key] = numpy.asarray(signature, dtype=numpy.uint32)
+
+    def query(self, signature):
+        """
+        Find the pieces in the index that are near-duplicates of the piece with this signature.
+
+        :returns: The keys of the matching pieces and their estimated similarity, most similar
+            first and then in the order they were added.
+        :rtype: list of 2-tuple
+        """
+        candidates = set()
+        for table, band in zip(self._tables, self._band_keys(signature)):
+            candidates.update(table.get(band, ()))
+        order = {key: i for i, key in enumerate(self._signatures)}
+        post = [(key, similarity(signature, self._signatures[key])) for key in candidates]
+        post = [match for match in post if match[1] >= self.threshold]
+        return sorted(post, key=lambda match: (-match[1], order[match[0]]))
+
+    def near_duplicates(self):
+        """
+        Find all the pairs of pieces in the index that are near-duplicates of each other.
+
+        :returns: The keys of each pair, in the order they were added, and their estimated
+            similarity, most similar first.
+        :rtype: list of 3-tuple
+        """
+        order = {key: i for i, key in enumerate(self._signatures)}
+        pairs = set()
+        for table in self._tables:
+            for bucket in table.values():
+                if len(bucket) > 1:
+                    pairs.update(combinations(sorted(set(bucket), key=order.get), 2))
+        post = [(a, b, similarity(self._signatures[a], self._signatures[b])) for a, b in pairs]
+        post = [trio for trio in post if trio[2] >= self.threshold]
+        return sorted(post, key=lambda trio: (-trio[2], order[trio[0]], order[trio[1]]))
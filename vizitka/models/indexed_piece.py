@@ -31,12 +31,20 @@ This model represents an indexed and analyzed piece of music.
 
 # Imports
 import os
+import sys
+from fractions import Fraction
+from functools import reduce
+from math import gcd
 import music21
 import music21.chord as chord
 import pandas
 import numpy
 from music21 import converter, stream, analysis
-from vizitka.models.aggregated_pieces import AggregatedPieces
+from vizitka.models.aggregated_pieces import AggregatedPieces, _MUSIC21_ANALYSES
+from vizitka.models.vocabulary import as_vocabulary
+from vizitka.models.metadata_index import MetadataIndex
+from vizitka.models.corpus_cache import CorpusCache
+from vizitka.models import fingerprint
 from vizitka.indexers.indexer import Indexer
 from vizitka.indexers import noterest, output, staff, lyric, approach, articulation, meter, interval, dissonance, expression, offset, repeat, active_voices, offset, over_bass, contour, ngram
 from collections import Counter
@@ -45,8 +53,12 @@ import pdb
 # Error message when importing doesn't work because of unknown file type
 _UNKNOWN_INPUT = 'This file type was not recognized. The file is probably not \
 a score in symbolic notation.'
+# Error message when no file matches the metadata predicate given to Importer()
+_NO_MATCHES = 'None of the files in {} have metadata that match.'
 # the title given to a piece when we cannot determine its title
 _UNKNOWN_PIECE_TITLE = 'Unknown Piece'
+# The estimated bytes held by each element of a music21 score
+_M21_ELEMENT_BYTES = 4096
 # Types for noterest indexing
 _noterest_types = ('Note', 'Rest', 'Chord')
 _default_interval_setts = {'quality':True, 'directed':True, 'simple or compound':'compound', 'horiz_attach_later':True}
@@ -130,6 +142,24 @@ def _get_offsets(event, part):
         if y[0] is part:
             return float(y[1])
 
+def _get_exact_offsets(event, part):
+    """Like _get_offsets() but keeps music21's own value of the offset, which is a Fraction for
+    tuplets, so that it can be converted to ticks without rounding."""
+    for y in event.contextSites():
+        if y[0] is part:
+            return y[1]
+
+def _ticks_per_quarter(offsets):
+    """Used internally by IndexedPiece._get_m21_objs() to find the number of ticks in a quarter
+    note that puts every offset of a piece on a whole tick: the least common multiple of the
+    denominators of the offsets as fractions of a quarter note, like the PPQ of a MIDI file."""
+    denominators = {Fraction(off).limit_denominator(1 << 20).denominator for off in offsets}
+    return reduce(lambda x, y: x * y // gcd(x, y), denominators, 1)
+
+def _to_ticks(offset, ticks_per_quarter):
+    """Convert a quarterLength offset to a whole number of ticks."""
+    return int(round(Fraction(offset).limit_denominator(1 << 20) * ticks_per_quarter))
+
 def _eliminate_ties(event):
     """Gets rid of the notes and rests that have non-start ties. This is used internally for
     noterest and beatstrength indexing."""
@@ -151,6 +181,13 @@ def _type_func_measure(event):
         return event
     return float('nan')
 
+def _type_func_time_signature(event):
+    """Used internally by _get_m21_ts_objs() to filter for just the 'TimeSignature' objects in a
+    piece."""
+    if 'TimeSignature' in event.classes:
+        return event
+    return float('nan')
+
 def _type_func_voice(event):
     """Used internally by _combine_voices() to filter for just the 'Voice' objects in a part."""
     if 'Voice' in event.classes:
@@ -208,6 +245,27 @@ def _attach_before(df):
         re_indexed.append(ser)
     return pandas.concat(re_indexed, axis=1)
 
+def _in_span(df, start, end):
+    """Used internally by _get_dissonance_inputs() to cut the rows of a dataframe down to those
+    from offset start to offset end, either of which may be None. A mask is used rather than
+    slicing by label since the index is not always sorted, and the order of the rows is kept."""
+    keep = numpy.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= df.index >= start
+    if end is not None:
+        keep &= df.index <= end
+    return df[keep]
+
+def _pop_vocabulary(settings):
+    """Used internally by _get_vertical_interval() and _get_horizontal_interval() to take the
+    'vocabulary' setting out of the user's settings, so that the cached interval names can be
+    reindexed as usual and only encoded at the end. Returns the settings without 'vocabulary' and
+    the vocabulary, which is None if the user did not ask for codes."""
+    if settings is None or settings.get('vocabulary') is None:
+        return settings, None
+    settings = settings.copy()
+    return settings, as_vocabulary(settings.pop('vocabulary'))
+
 def _find_piece_range(the_score):
 
     p = analysis.discrete.Ambitus()
@@ -232,25 +290,35 @@ def _find_part_ranges(the_score):
 
     return ranges
 
-def _import_file(pathname, metafile=None):
+def _parse_file(pathname):
+    """
+    Used internally by _import_file() and IndexedPiece._restore() to parse a file with music21.
+
+    :returns: The score or opus.
+    :rtype: :class:`music21.stream.Score` or :class:`music21.stream.Opus`
+    """
+    score = converter.Converter()
+    score.parseFile(pathname, forceSource=True, storePickle=False)
+    return score.stream
+
+def _import_file(pathname, metafile=None, ticks=False):
     """
     Import the score to music21 format.
     :param pathname: Location of the file to import on the local disk.
     :type pathname: str
+    :param bool ticks: Whether the pieces index their events with integer ticks.
     :returns: A 1-tuple of :class:`IndexedPiece` if the file imported as a
         :class:`music21.stream.Score` object or a multi-element list if it imported as a
         :class:`music21.stream.Opus` object.
         respectively.
     :rtype: 1-tuple or list of :class:`IndexedPiece`
     """
-    score = converter.Converter()
-    score.parseFile(pathname, forceSource=True, storePickle=False)
-    score = score.stream
+    score = _parse_file(pathname)
     if isinstance(score, stream.Opus):
         # make an AggregatedPieces object containing IndexedPiece objects of each movement of the opus.
-        score = [IndexedPiece(pathname, opus_id=i) for i in xrange(len(score))]
+        score = [IndexedPiece(pathname, opus_id=i, ticks=ticks) for i in xrange(len(score))]
     elif isinstance(score, stream.Score):
-        score = (IndexedPiece(pathname, score=score),)
+        score = (IndexedPiece(pathname, score=score, ticks=ticks),)
     for ip in score:
         for field in ip._metadata:
             if hasattr(ip.metadata, field):
@@ -265,9 +333,14 @@ def _import_file(pathname, metafile=None):
 
     return score
 
-def _import_directory(directory, metafile=None):
+def _find_files(directory, metafile=None):
+    """
+    Used internally by _import_directory() and the batch runner to list the files to import from
+    a list of pathnames or a directory, and to find the directory's metafile.
 
-    pieces = [] # a list of the pieces being imported
+    :returns: The pathnames of the files, and the metafile or ``metafile``.
+    :rtype: 2-tuple of list and str
+    """
     meta = metafile
 
     if isinstance(directory, list):
@@ -286,38 +359,101 @@ def _import_directory(directory, metafile=None):
                     continue
                 file_paths.append('/'.join((root, f)))
 
+    return file_paths, meta
+
+def _import_directory(directory, metafile=None, ticks=False, corpus=None):
+
+    # a list of the pieces being imported, or those of the AggregatedPieces that keeps to its budget
+    pieces = [] if corpus is None else corpus._pieces
+    file_paths, meta = _find_files(directory, metafile)
+
     if not file_paths:
         raise RuntimeError(vis.models.aggregated_piece.AggregatedPieces._NO_FILES)
 
     for path in file_paths:
         # use extend rather than append because it could import as a multi-movement opus
-        pieces.extend(_import_file(pathname=path, metafile=meta))
+        first = len(pieces)
+        pieces.extend(_import_file(pathname=path, metafile=meta, ticks=ticks))
+        if corpus is not None:
+            for i in range(first, len(pieces)):
+                corpus._enforce_budget(i)
 
     return (pieces, meta)
 
-def Importer(location, metafile=None):
+def Importer(location, metafile=None, ticks=False, where=None, index=None, memory_budget=None,
+             spill_dir=None, cache=None):
     """
     Import the file, website link, or directory of files designated by ``location`` to music21
     format.
 
     :param location: Location of the file to import on the local disk.
     :type location: str
+    :param bool ticks: If ``True``, index the events of each piece with integer ticks rather than
+        quarterLength offsets. See :meth:`IndexedPiece.ticks_per_quarter`.
+    :param where: Import only the files whose metadata match, as found in their headers without
+        importing them. Either a function that takes the metadata of a file and returns whether
+        to import it, or a dict of fields and the values they must have. See
+        :meth:`~vizitka.models.metadata_index.MetadataIndex.select`.
+    :type where: callable or dict
+    :param index: The metadata index to use with ``where``, or the pathname of its SQLite
+        database, so that the headers of a corpus are only read again when they change. The
+        default reads every header.
+    :type index: :class:`~vizitka.models.metadata_index.MetadataIndex` or str
+    :param int memory_budget: For a directory or list of files, the most bytes that the pieces
+        may hold, even while they are imported. See :class:`AggregatedPieces`.
+    :param str spill_dir: Where to spill the pieces over the ``memory_budget``. See
+        :class:`AggregatedPieces`.
+    :param cache: For a directory or list of files, the corpus cache, or its directory, from
+        which to reuse the pieces of the files that have not changed since they were last
+        imported with it. Only the files that are new or changed are parsed. Save the analyses
+        made since with :meth:`AggregatedPieces.save_cache`. See
+        :class:`~vizitka.models.corpus_cache.CorpusCache`.
+    :type cache: :class:`~vizitka.models.corpus_cache.CorpusCache` or str
     :returns: An :class:`IndexedPiece` or an :class:`AggregatedPieces` object if the file passed
         imports as a :class:`music21.stream.Score` or :class:`music21.stream.Opus` object
         respectively.
     :rtype: A new :class:`IndexedPiece` or :class:`AggregatedPieces` object.
+    :raises: :exc:`RuntimeError` if no file matches ``where``.
     """
     pieces = []
 
+    if where is not None and (isinstance(location, list) or os.path.exists(location)):
+        headers = index if isinstance(index, MetadataIndex) else MetadataIndex(index or ':memory:')
+        headers.update(location)
+        selected = set(headers.select(where))
+        if headers is not index:
+            headers.close()
+        if isinstance(location, list) or os.path.isdir(location):
+            file_paths, metafile = _find_files(location, metafile)
+        else:
+            file_paths = [location]
+        file_paths = [path for path in file_paths if os.path.abspath(path) in selected]
+        if not file_paths:
+            raise RuntimeError(_NO_MATCHES.format(location))
+        location = file_paths
+
     # load directory of pieces
     if isinstance(location, list) or os.path.isdir(location):
-        directory_return = _import_directory(location, metafile)
-        pieces.extend(directory_return[0])
-        metafile = directory_return[1]
+        if memory_budget is not None or cache is not None:
+            if cache is not None and not isinstance(cache, CorpusCache):
+                cache = CorpusCache(cache)
+            corpus = AggregatedPieces(memory_budget=memory_budget, spill_dir=spill_dir,
+                                      cache=cache)
+            if cache is not None:
+                pieces, metafile = cache.load(location, metafile, ticks, corpus)
+            else:
+                pieces, metafile = _import_directory(location, metafile, ticks, corpus)
+            if len(pieces) != 1:
+                corpus._metafile = metafile if metafile is not None else []
+                return corpus
+        else:
+            directory_return = _import_directory(location, metafile, ticks)
+            pieces.extend(directory_return[0])
+            metafile = directory_return[1]
 
     # index piece if it is a file or a link
     elif os.path.isfile(location):
-        pieces.extend(_import_file(location))
+        pieces.extend(_import_file(location, ticks=ticks))
 
     else:
         raise RuntimeError(_UNKNOWN_INPUT)
@@ -378,11 +514,14 @@ strings to identify the desired Indexer: {}.'
 
     _MISSING_USERNAME = ('You must enter a username to access the elvis database')
     _MISSING_PASSWORD = ('You must enter a password to access the elvis database')
-    def __init__(self, pathname='', opus_id=None, score=None, metafile=None, username=None, password=None):
+    def __init__(self, pathname='', opus_id=None, score=None, metafile=None, username=None, password=None,
+                 ticks=False):
         """
         :param str pathname: Pathname to the file music21 will import for this :class:`IndexedPiece`.
         :param opus_id: The index of the :class:`Score` for this :class:`IndexedPiece`, if the file
             imports as a :class:`music21.stream.Opus`.
+        :param bool ticks: If ``True``, the results of every indexer are indexed by integer ticks
+            rather than quarterLength offsets. See :meth:`ticks_per_quarter`.
         :returns: A new :class:`IndexedPiece`.
         :rtype: :class:`IndexedPiece`
         """
@@ -408,6 +547,11 @@ strings to identify the desired Indexer: {}.'
         self._opus_id = opus_id  # if the file imports as an Opus, this is the index of the Score
         self._username = username
         self._password = password
+        self._ticks = ticks
+        self._spilled = None # the file of the analyses put aside by _spill()
+        self._frozen = None # the file of the score frozen in a CorpusCache
+        self._cached = None # the file of the analyses saved in a CorpusCache, until they are read
+        self._score_elements = None # the number of elements in the score, for _memory_usage()
         # Dictionary of indexers and their shorts for calls to get()
         self._indexers = { # Indexers :
             'av': self._get_active_voices,
@@ -423,6 +567,8 @@ strings to identify the desired Indexer: {}.'
             'di': self._get_dissonance,
             'dissonance': self._get_dissonance,
             'ex': self._get_expression,
+            'fp': self._get_fingerprint,
+            'fingerprint': self._get_fingerprint,
             'expression': self._get_expression,
             'ly': self._get_lyric,
             'lyric': self._get_lyric,
@@ -539,10 +685,110 @@ strings to identify the desired Indexer: {}.'
         else:
             self._metadata[field] = value
 
+    def ticks_per_quarter(self):
+        """
+        The number of ticks in a quarter note when this :class:`IndexedPiece` indexes its events
+        with integer ticks. It is the smallest resolution that puts every event of the piece,
+        tuplets included, on a whole tick, so that the results of different indexers and parts
+        join exactly, without float offsets like 0.3333333 that differ in the last digits.
+
+        :returns: The ticks in a quarter note, or ``None`` if the events are indexed with
+            quarterLength offsets.
+        :rtype: int or None
+        """
+        if not self._ticks:
+            return None
+        self._restore()
+        self._get_m21_objs()
+        return self._analyses['ticks_per_quarter']
+
+    def _spill(self, pathname):
+        """
+        Used internally by :class:`AggregatedPieces` to free the memory this piece holds. The
+        analyses that do not hold music21 objects are pickled to ``pathname`` and dropped with the
+        others, and so is the score if it can be imported again from its file. They come back
+        with :meth:`_restore` when they are next needed.
+        """
+        kept = {key: val for key, val in self._analyses.items() if key not in _MUSIC21_ANALYSES}
+        previous = self._spilled
+        if previous is not None and not os.path.exists(previous):
+            previous = None # its spill directory is gone
+        if previous is not None: # still on disk from the last time
+            kept = dict(pandas.read_pickle(previous, compression=None), **kept)
+        pandas.to_pickle(kept, pathname, compression=None)
+        if previous is not None and previous != pathname:
+            os.remove(previous)
+        self._analyses = {}
+        if self._pathname:
+            self._score = None
+            self._score_elements = None
+        self._spilled = pathname
+
+    def _restore(self):
+        """
+        Used internally to bring back the analyses that :meth:`_spill` put aside, or that a
+        :class:`~vizitka.models.corpus_cache.CorpusCache` saved. The analyses made since then are
+        kept. The score is only brought back by :meth:`_get_score`, when it is needed. If the file
+        is gone, e.g. with the spill directory of an :class:`AggregatedPieces` that was garbage
+        collected, its analyses are simply made again when they are asked for.
+        """
+        if self._spilled is None and self._cached is None:
+            return
+        analyses = {}
+        for stored in (self._cached, self._spilled):
+            if stored is not None and os.path.exists(stored):
+                analyses.update(pandas.read_pickle(stored, compression=None))
+        analyses.update(self._analyses)
+        self._analyses = analyses
+        if self._spilled is not None and os.path.exists(self._spilled):
+            os.remove(self._spilled)
+        self._spilled = self._cached = None
+
+    def _get_score(self):
+        """
+        Returns the music21 score of this piece. If it was dropped, it is thawed from the
+        :class:`~vizitka.models.corpus_cache.CorpusCache` it was frozen in, or else imported again
+        from its file.
+        """
+        if self._score is None and self._pathname:
+            if self._frozen is not None:
+                try:
+                    with open(self._frozen, 'rb') as frozen:
+                        self._score = converter.thawStr(frozen.read())
+                except Exception: # pylint: disable=broad-except
+                    pass # frozen by another version of music21, so import the file again
+            if self._score is None:
+                score = _parse_file(self._pathname)
+                self._score = score.scores[self._opus_id] if self._opus_id is not None else score
+        return self._score
+
+    def _memory_usage(self):
+        """
+        Used internally by :class:`AggregatedPieces` to estimate how many bytes this piece holds:
+        its analyses, and its score at ``_M21_ELEMENT_BYTES`` per element. The frames of music21
+        objects are counted without the objects, which belong to the score.
+
+        :rtype: int
+        """
+        post = 0
+        if self._score is not None:
+            if self._score_elements is None:
+                self._score_elements = sum(1 for _ in self._score.recurse())
+            post += self._score_elements * _M21_ELEMENT_BYTES
+        for key, val in self._analyses.items():
+            if isinstance(val, (pandas.DataFrame, pandas.Series)):
+                usage = val.memory_usage(index=True, deep=key not in _MUSIC21_ANALYSES)
+                post += int(usage.sum()) if isinstance(usage, pandas.Series) else int(usage)
+            elif isinstance(val, numpy.ndarray):
+                post += val.nbytes
+            else:
+                post += sys.getsizeof(val)
+        return post
+
     def _get_part_streams(self):
         """Returns a list of the part streams in this indexed_piece."""
         if 'part_streams' not in self._analyses:
-            self._analyses['part_streams'] = self._score.parts
+            self._analyses['part_streams'] = self._get_score().parts
         return self._analyses['part_streams']
 
     def _get_m21_objs(self):
@@ -569,8 +815,18 @@ strings to identify the desired Indexer: {}.'
                 # skipSelf will soon change its default to True in music21.
                 ser = pandas.Series(p.recurse(restoreActiveSites=False, skipSelf=True),
                                     name=self.metadata('parts')[i])
-                ser.index = ser.apply(_get_offsets, args=(p,))
+                if self._ticks:
+                    ser.index = ser.apply(_get_exact_offsets, args=(p,))
+                else:
+                    ser.index = ser.apply(_get_offsets, args=(p,))
                 sers.append(ser)
+            if self._ticks:
+                ends = [p.highestTime for p in self._get_part_streams()]
+                ticks = _ticks_per_quarter([off for ser in sers for off in ser.index] + ends)
+                for ser in sers:
+                    ser.index = pandas.Index([_to_ticks(off, ticks) for off in ser.index],
+                                             dtype=numpy.int64)
+                self._analyses['ticks_per_quarter'] = ticks
             self._analyses['m21_objs'] = sers
         return self._analyses['m21_objs']
 
@@ -633,9 +889,10 @@ strings to identify the desired Indexer: {}.'
         a dataframe of results with one column per voice (like the noterest indexer) and the second
         element is a list of the part streams, one per part."""
         if data is not None:
-            return meter.DurationIndexer(data[0], data[1]).run()
+            return meter.DurationIndexer(data[0], data[1], self.ticks_per_quarter()).run()
         elif 'duration' not in self._analyses:
-            self._analyses['duration'] = meter.DurationIndexer(self._get_noterest(), self._get_part_streams()).run()
+            self._analyses['duration'] = meter.DurationIndexer(self._get_noterest(), self._get_part_streams(),
+                                                               self.ticks_per_quarter()).run()
         return self._analyses['duration']
 
     def _get_tie(self, data=None):
@@ -662,11 +919,20 @@ strings to identify the desired Indexer: {}.'
             return self._analyses['active_voices']
         return active_voices.ActiveVoicesIndexer(self._get_noterest(), settings).run()
 
-    def _get_beat_strength(self):
+    def _get_beat_strength(self, settings=None):
         """Used internally by get() to cache and retrieve results from the
-        meter.NoteBeatStrengthIndexer."""
+        meter.NoteBeatStrengthIndexer. With {'method': 'arithmetic'} as the settings, the beat
+        strengths are worked out from this piece's measures and time signatures rather than asked
+        of music21 one event at a time. They are the same either way, so they are cached either
+        way."""
         if 'beat_strength' not in self._analyses:
-            self._analyses['beat_strength'] = meter.NoteBeatStrengthIndexer(self._get_m21_nrc_objs_no_tied()).run()
+            if settings is not None and settings.get('method') == 'arithmetic':
+                settings = dict(settings)
+                settings.setdefault('measures', self._get_m21_measure_objs())
+                settings.setdefault('time_signatures', self._get_m21_ts_objs())
+                settings.setdefault('ticks_per_quarter', self.ticks_per_quarter())
+            self._analyses['beat_strength'] = meter.NoteBeatStrengthIndexer(self._get_m21_nrc_objs_no_tied(),
+                                                                            settings).run()
         return self._analyses['beat_strength']
 
     def _get_articulation(self):
@@ -689,14 +955,19 @@ strings to identify the desired Indexer: {}.'
         what the user asks for intervals are calculated as compound, directed, and diatonic with
         quality. The results with these settings are stored and if the user asked for different
         settings, they are recalculated from these 'complete' cached results. This reindexing is
-        done with the interval.IntervalReindexer."""
+        done with the interval.IntervalReindexer. If the settings include a 'vocabulary', the
+        intervals are encoded with it after they are reindexed."""
+        settings, vocabulary = _pop_vocabulary(settings)
         if 'vertical_interval' not in self._analyses:
             self._analyses['vertical_interval'] = interval.IntervalIndexer(self._get_noterest(), settings=_default_interval_setts.copy()).run()
+        post = self._analyses['vertical_interval']
         if settings is not None and not ('directed' in settings and settings['directed'] == True and
                 'quality' in settings and settings['quality'] in (True, 'diatonic with quality') and
                 'simple or compound' in settings and settings['simple or compound'] == 'compound'):
-            return interval.IntervalReindexer(self._analyses['vertical_interval'], settings).run()
-        return self._analyses['vertical_interval']
+            post = interval.IntervalReindexer(post, settings).run()
+        if vocabulary is not None:
+            return vocabulary.encode_frame(post)
+        return post
 
     def _get_horizontal_interval(self, settings=None):
         """Used internally by get() to cache and retrieve results from the
@@ -707,33 +978,122 @@ strings to identify the desired Indexer: {}.'
         done with the interval.IntervalReindexer. Those details are the same as for the
         _get_vertical_interval() method, but this method has an added check to see if the user asked
         for horiz_attach_later == False. In this case the index of each part's horizontal intervals
-        is shifted forward one element and 0.0 is assigned as the first element."""
+        is shifted forward one element and 0.0 is assigned as the first element. As with vertical
+        intervals, a 'vocabulary' setting encodes the results once everything else is done."""
+        settings, vocabulary = _pop_vocabulary(settings)
         # No matter what settings the user specifies, calculate the intervals in the most complete way.
         if 'horizontal_interval' not in self._analyses:
             self._analyses['horizontal_interval'] = interval.HorizontalIntervalIndexer(self._get_noterest(), _default_interval_setts.copy()).run()
+        post = self._analyses['horizontal_interval']
         # If the user's settings were different, reindex the stored intervals.
         if settings is not None and not ('directed' in settings and settings['directed'] == True and
                 'quality' in settings and settings['quality'] in (True, 'diatonic with quality') and
                 'simple or compound' in settings and settings['simple or compound'] == 'compound'):
-            post = interval.IntervalReindexer(self._analyses['horizontal_interval'], settings).run()
+            post = interval.IntervalReindexer(post, settings).run()
             # Switch to 'attach before' if necessary.
             if 'horiz_attach_later' not in settings or not settings['horiz_attach_later']:
                 post = _attach_before(post)
-            return post
-        return self._analyses['horizontal_interval']
+        if vocabulary is not None:
+            return vocabulary.encode_frame(post)
+        return post
 
-    def _get_dissonance(self):
+    def _get_dissonance(self, settings=None):
         """Used internally by get() to cache and retrieve results from the
         dissonance.DissonanceIndexer. This method automatically supplies the input dataframes from
         the indexed_piece that is the self argument. If you want to call this with indexer results
-        other than those associated with self, you can call the indexer directly."""
-        if 'dissonance' not in self._analyses:
-            h_setts = {'quality': False, 'simple or compound': 'compound', 'horiz_attach_later': False}
-            v_setts = setts = {'quality': True, 'simple or compound': 'simple', 'directed': True}
-            in_dfs = [self._get_beat_strength(), self._get_duration(),
-                      self._get_horizontal_interval(h_setts), self._get_vertical_interval(v_setts)]
-            self._analyses['dissonance'] = dissonance.DissonanceIndexer(in_dfs).run()
-        return self._analyses['dissonance']
+        other than those associated with self, you can call the indexer directly. With 'pairs'
+        and/or 'offsets' settings only those voice pairs and that span of the piece are analyzed,
+        e.g. to relabel the part of a score that was just edited. These partial results are not
+        cached on their own, but when the whole piece's results are cached, the voices whose pairs
+        were all analyzed are updated in them. If the partial results have offsets that the cached
+        results lack, the cached results are dropped instead."""
+        h_setts = {'quality': False, 'simple or compound': 'compound', 'horiz_attach_later': False}
+        v_setts = {'quality': True, 'simple or compound': 'simple', 'directed': True}
+        if settings is None or (settings.get('pairs') is None and settings.get('offsets') is None):
+            if 'dissonance' not in self._analyses:
+                in_dfs = [self._get_beat_strength(), self._get_duration(),
+                          self._get_horizontal_interval(h_setts), self._get_vertical_interval(v_setts)]
+                self._analyses['dissonance'] = dissonance.DissonanceIndexer(in_dfs, settings).run()
+            return self._analyses['dissonance']
+
+        in_dfs = self._get_dissonance_inputs(settings, h_setts, v_setts)
+        post = dissonance.DissonanceIndexer(in_dfs, settings).run()
+        if 'dissonance' in self._analyses:
+            cached = self._analyses['dissonance']
+            if not post.index.isin(cached.index).all():
+                del self._analyses['dissonance']
+            else:
+                # A voice's labels depend on all the pairs it is in. The cached results may have
+                # been returned already, so a copy of them is updated.
+                cached = cached.copy()
+                all_pairs = in_dfs[3].columns.get_level_values(-1)
+                done = set(all_pairs if settings.get('pairs') is None else settings['pairs'])
+                for col in post.columns:
+                    if all(pair in done for pair in all_pairs if col[-1] in pair.split(',')):
+                        cached.loc[post.index, col] = post[col].values
+                self._analyses['dissonance'] = cached
+        return post
+
+    def _get_dissonance_inputs(self, settings, h_setts, v_setts):
+        """Used internally by _get_dissonance() to make the inputs of the
+        dissonance.DissonanceIndexer for the 'pairs' and 'offsets' settings without analyzing the
+        whole piece. The beat strengths and durations are only those of the voices in the pairs,
+        and every input is cut down to the offsets widened by the two events of each voice before
+        and after them, which are as far as the dissonance types look. The vertical intervals are
+        those of every pair in that span, since fourths and fifths are judged against the other
+        voices. The durations are worked out over the whole of each voice, since each event lasts
+        until the next one, and the horizontal intervals over the whole piece, since the offsets
+        they are given depend on the events of every voice. Both are cheap next to the beat
+        strengths. The inputs that are cached for the whole piece are cut down instead of being
+        worked out again."""
+        noterest = self._get_noterest()
+        parts = list(noterest.columns.get_level_values(-1))
+        if settings.get('pairs') is None:
+            cols = list(range(len(parts)))
+        else:
+            named = {voice for pair in settings['pairs'] for voice in pair.split(',')}
+            cols = [i for i, part in enumerate(parts) if part in named]
+
+        horiz = self._get_horizontal_interval(h_setts).iloc[:, cols]
+
+        # The span runs from the earliest of the second-to-last events of the voices before the
+        # offsets to the latest of their second events after them, and takes in the events of the
+        # whole piece just before and after the offsets that the vertical intervals are read at.
+        start, end = settings.get('offsets') or (None, None)
+        lo = hi = None
+        if start is not None:
+            starts = [noterest.index[noterest.index < start][-1:]]
+            for col in range(len(horiz.columns)):
+                events = horiz.iloc[:, col].dropna().index
+                starts.append(events[events < start][-2:][:1])
+            starts = [found[0] for found in starts if len(found)]
+            lo = min(starts) if starts else None
+        if end is not None:
+            ends = [noterest.index[noterest.index > end][:1]]
+            for col in range(len(horiz.columns)):
+                events = horiz.iloc[:, col].dropna().index
+                ends.append(events[events > end][:2][-1:])
+            ends = [found[0] for found in ends if len(found)]
+            hi = max(ends) if ends else None
+
+        if 'beat_strength' in self._analyses:
+            beat_strength = _in_span(self._analyses['beat_strength'].iloc[:, cols], lo, hi)
+        else:
+            events = _in_span(self._get_m21_nrc_objs_no_tied().iloc[:, cols], lo, hi)
+            beat_strength = meter.NoteBeatStrengthIndexer(events).run()
+        if 'duration' in self._analyses:
+            duration = self._analyses['duration'].iloc[:, cols]
+        else:
+            streams = self._get_part_streams()
+            duration = meter.DurationIndexer(noterest.iloc[:, cols], [streams[i] for i in cols],
+                                             self.ticks_per_quarter()).run()
+        if 'vertical_interval' in self._analyses:
+            vert = _in_span(self._analyses['vertical_interval'], lo, hi)
+        else: # every interval is carried forward to the next event, so the span is filled first
+            vert = interval.IntervalIndexer(_in_span(noterest.ffill(), lo, hi),
+                                            settings=_default_interval_setts.copy()).run()
+        vert = interval.IntervalReindexer(vert, v_setts).run()
+        return [beat_strength, _in_span(duration, lo, hi), _in_span(horiz, lo, hi), vert]
 
     def _get_lyric(self):
         """Used internally by get() as a convenience method to simplify
@@ -762,12 +1122,21 @@ strings to identify the desired Indexer: {}.'
             self._analyses['m21_measure_objs'] = pandas.concat(sers, axis=1)
         return self._analyses['m21_measure_objs']
 
+    def _get_m21_ts_objs(self):
+        """Makes a dataframe of the music21 time signature objects in the indexed_piece."""
+        if 'm21_ts_objs' not in self._analyses:
+            sers = [s.apply(_type_func_time_signature).dropna() for s in self._get_m21_objs()]
+            self._analyses['m21_ts_objs'] = pandas.concat(sers, axis=1)
+        return self._analyses['m21_ts_objs']
+
     def _get_measure(self, settings=None):
         """Fetches and caches a dataframe of the measure numbers in a piece.
         Can also return Humdrum-style measure numbers if {'style': 'Humdrum'}
         is passed as the settings. In this case, the results are not cached."""
         if (settings is not None and 'style' in settings and
             settings['style'] == 'Humdrum'): # this case is not cached.
+            if self._ticks:
+                settings = dict(settings, ticks_per_quarter=self.ticks_per_quarter())
             return meter.MeasureIndexer([self._get_m21_measure_objs(),
                                          self._get_time_signature()],
                                         self._get_part_streams(),
@@ -776,6 +1145,7 @@ strings to identify the desired Indexer: {}.'
             self._analyses['measure'] = meter.MeasureIndexer([self._get_m21_measure_objs(),
                                                               self._get_time_signature()],
                                                              self._get_part_streams(),
+                                                             {'ticks_per_quarter': self.ticks_per_quarter()},
                                                              ).run()
         return self._analyses['measure']
 
@@ -785,12 +1155,16 @@ strings to identify the desired Indexer: {}.'
         return ngram.NGramIndexer(data, settings).run()
 
     def _get_offset(self, data, settings=None):
+        if settings is not None: # AggregatedPieces.get() gives every piece the same dict
+            settings = dict(settings)
         if (settings is not None and settings['quarterLength'] == 'dynamic' and
             ('dom_data' not in settings or type(settings['dom_data']) != list)):
             settings['dom_data'] = [self._get_dissonance(), self._get_duration(),
                                      self._get_beat_strength(), self._get_noterest(),
                                      self._get_time_signature(),
                                      self._get_part_streams()[0].highestTime]
+        if self._ticks and settings is not None and 'ticks_per_quarter' not in settings:
+            settings['ticks_per_quarter'] = self.ticks_per_quarter()
         return offset.FilterByOffsetIndexer(data, settings).run()
 
     def _get_clef(self, data=None):
@@ -817,28 +1191,52 @@ strings to identify the desired Indexer: {}.'
             self._analyses['time_signature'] = meter.TimeSignatureIndexer(self._get_m21_objs()).run()
         return self._analyses['time_signature']
 
+    def _get_fingerprint(self, settings=None):
+        """Fetches and caches the MinHash signature of the piece's melodic and vertical interval
+        n-grams, which is used to find near-duplicates of it in a corpus. The settings 'n' (3),
+        'num_perm' (128), and 'seed' (1) are passed on to fingerprint.piece_shingles() and
+        fingerprint.MinHasher. Only signatures made with the default settings are cached."""
+        setts = {'n': 3, 'num_perm': 128, 'seed': 1}
+        if settings is not None:
+            setts.update(settings)
+        cacheable = setts == {'n': 3, 'num_perm': 128, 'seed': 1}
+        if not cacheable or 'fingerprint' not in self._analyses:
+            hasher = fingerprint.MinHasher(setts['num_perm'], setts['seed'])
+            post = hasher.signature(fingerprint.piece_shingles(self, setts['n']))
+            if not cacheable:
+                return post
+            self._analyses['fingerprint'] = post
+        return self._analyses['fingerprint']
+
     def _get_viz2hum(self):
         """Fetches and caches a dataframe of a kern representation of a piece.
         Don't even try to use this indexer without this convenience method. It's
         relatively complicated and poorly documented, but that's where this
         method comes in handy. """
         if 'viz2hum' not in self._analyses:
-            score_arg = [self._get_clef(),
-                         self._get_key_signature(),
-                         self._get_time_signature(),
-                         self._get_measure(settings={'style': 'Humdrum'}),
-                         self._get_m21_nrc_objs(),
-                         self._get_lyric()]
-            setts = {'vizmd': self._metadata, 'm21md': self._score.metadata}
-            self._analyses['viz2hum'] = output.Viz2HumIndexer(score_arg, setts).run()
+            self._analyses['viz2hum'] = self._viz2hum_indexer().run()
 
         return self._analyses['viz2hum']
 
+    def _viz2hum_indexer(self):
+        """Used internally by _get_viz2hum() and to_kern() to prepare a
+        Viz2HumIndexer with the clefs, key signatures, time signatures,
+        Humdrum-style measures, note, rest, and chord objects, and lyrics of
+        this piece."""
+        score_arg = [self._get_clef(),
+                     self._get_key_signature(),
+                     self._get_time_signature(),
+                     self._get_measure(settings={'style': 'Humdrum'}),
+                     self._get_m21_nrc_objs(),
+                     self._get_lyric()]
+        setts = {'vizmd': self._metadata, 'm21md': self._get_score().metadata}
+        return output.Viz2HumIndexer(score_arg, setts)
+
     def _get_xml(self):
         """Fetches and caches a string of an XML representation of a piece, as
         generated by music21."""
         if 'xml' not in self._analyses:
-            self._analyses['xml'] = output.XMLIndexer(self._score).run()
+            self._analyses['xml'] = output.XMLIndexer(self._get_score()).run()
 
         return self._analyses['xml']
 
@@ -870,6 +1268,7 @@ strings to identify the desired Indexer: {}.'
         if settings is not None:
             args_dict['settings'] = settings
 
+        self._restore()
         try: # Fetch or calculate the actual results requested.
             if data is None:
                 results = self._indexers[analyzer_cls](**args_dict)
@@ -888,7 +1287,8 @@ strings to identify the desired Indexer: {}.'
         default is to use the title of the piece in the metadata (not a very
         reliable naming convention) or the current indexed_piece's current
         path if there is no title. If there are lyrics in the piece, they
-        will be included in the new kern file.
+        will be included in the new kern file. The file is written one line at
+        a time, so the whole kern score is never held in memory at once.
 
         **Example**
         from vizitka.models.indexed_piece import Importer()
@@ -907,8 +1307,11 @@ strings to identify the desired Indexer: {}.'
         if not path.endswith('.krn'):
             path += '.krn'
 
-        return self._get_viz2hum().to_csv(path, sep='\t', index=False, header=False,
-                                          index_label=False, quotechar='`')
+        # Stream the kern file line by line rather than building it as one DataFrame.
+        self._restore()
+        kern = self._viz2hum_indexer()
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            kern.write(handle)
 
     def to_xml(self, path=None):
         """Exports score to an xml file at the location specified in the `path`
@@ -934,8 +1337,7 @@ strings to identify the desired Indexer: {}.'
         if not path.endswith('.xml'):
             path += '.xml'
 
-        pdb.set_trace()
-
+        self._restore()
         with open(path, 'w') as f:
             # writes the file and returns the number of characters written. The
             # number of characters is simply discarded
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models/metadata_index.py
+# Purpose:                Index the metadata in the headers of the files of a corpus.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+.. codeauthor:: Alexander Morgan
+
+Read the metadata of a score from its header without parsing the music, and keep the metadata of
+every file of a corpus in an SQLite index that can be searched before anything is imported.
+:func:`read_header` understands MusicXML (compressed or not), MEI, and Humdrum ``**kern`` files,
+and the :class:`MetadataIndex` adds the fields of the ``meta`` files of ELVIS downloads.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import xml.etree.ElementTree as ElementTree
+import zipfile
+import pandas
+
+# The metadata fields of the index, named as by IndexedPiece.metadata() where it has them.
+FIELDS = ('title', 'composer', 'date', 'movementName', 'movementNumber', 'opusNumber',
+          'localeOfComposition', 'genre')
+
+# The Humdrum reference records of each field, in order of preference.
+_REFERENCE_RECORDS = (('COM', 'composer'), ('COA', 'composer'), ('COS', 'composer'),
+                      ('OTL', 'title'), ('ODT', 'date'), ('OMD', 'movementName'),
+                      ('OMV', 'movementNumber'), ('OPS', 'opusNumber'),
+                      ('OPC', 'localeOfComposition'), ('AGN', 'genre'))
+
+# A reference record of a **kern file, like "!!!COM: Palestrina, Giovanni Perluigi da".
+_RECORD = re.compile(r'^!!!([^:]+):\s*(.*?)\s*$')
+
+# An attribute of a processing instruction, like key="COM" in <?Humdrum key="COM" value="..."?>
+_PI_ATTRIBUTE = re.compile(r'([\w.-]+)="([^"]*)"')
+
+# The elements at which the header of a MusicXML or MEI file ends.
+_END_OF_HEADER = frozenset(('part-list', 'part', 'measure', 'music'))
+
+
+def _from_records(records):
+    """
+    Used internally by :func:`read_header` to find the fields given by Humdrum reference records,
+    as (key, value) pairs in the order of the file. The first record of each key is used, and
+    language variants like ``OTL@@LAT`` count as their key.
+    """
+    firsts = {}
+    for key, value in records:
+        key = key.split('@')[0]
+        if value and key not in firsts:
+            firsts[key] = value
+    post = {}
+    for key, field in _REFERENCE_RECORDS:
+        if key in firsts and field not in post:
+            post[field] = firsts[key]
+    return post
+
+
+def _kern_header(pathname):
+    """
+    Used internally by :func:`read_header` to read the reference records of a ``**kern`` file.
+    Since they may come at the end of the file, every line is looked at, but none is parsed.
+    """
+    with open(pathname, encoding='utf-8', errors='replace') as handle:
+        return _from_records(match.groups() for match in map(_RECORD.match, handle) if match)
+
+
+def _text(elem):
+    """Used internally by :func:`_xml_header` for the text of an element and its children."""
+    return ' '.join(''.join(elem.itertext()).split())
+
+
+def _xml_header(source):
+    """
+    Used internally by :func:`read_header` to read the ``<work>``, ``<movement-*>``, and
+    ``<identification>`` elements of a MusicXML file, or the ``<meiHead>`` of an MEI file and the
+    Humdrum reference records it keeps as processing instructions. The file is read only up to
+    its first part or measure, and a file that is not well-formed gives what was read before the
+    error.
+    """
+    post = {}
+    records = []
+    path = []
+    try:
+        for event, elem in ElementTree.iterparse(source, events=('start', 'end', 'pi')):
+            if event == 'pi':
+                if elem.text.startswith('Humdrum'):
+                    attributes = dict(_PI_ATTRIBUTE.findall(elem.text))
+                    records.append((attributes.get('key', ''), attributes.get('value', '')))
+                continue
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if tag in _END_OF_HEADER:
+                    break
+                path.append(tag)
+                continue
+            path.pop()
+            text = _text(elem)
+            if not text:
+                continue
+            if tag == 'work-title' or (tag == 'title' and 'titleStmt' in path):
+                post.setdefault('title', text)
+            elif tag == 'work-number':
+                post.setdefault('opusNumber', text)
+            elif tag == 'movement-title':
+                post.setdefault('movementName', text)
+            elif tag == 'movement-number':
+                post.setdefault('movementNumber', text)
+            elif (tag == 'creator' and elem.get('type') == 'composer') or tag == 'composer' or \
+                    (tag == 'persName' and elem.get('role') == 'composer'):
+                post.setdefault('composer', text)
+            elif tag == 'miscellaneous-field' and 'date' in elem.get('name', '').lower():
+                post.setdefault('date', text)
+            elif tag == 'date' and 'creation' in path:
+                post.setdefault('date', elem.get('isodate') or text)
+    except ElementTree.ParseError:
+        pass
+    for field, value in _from_records(records).items():
+        post.setdefault(field, value)
+    if 'title' not in post and 'movementName' in post:
+        post['title'] = post['movementName']
+    return post
+
+
+def _mxl_header(pathname):
+    """
+    Used internally by :func:`read_header` to read the header of the score in a compressed
+    MusicXML file, which its ``META-INF/container.xml`` names.
+    """
+    try:
+        with zipfile.ZipFile(pathname) as archive:
+            names = archive.namelist()
+            root = None
+            if 'META-INF/container.xml' in names:
+                container = ElementTree.fromstring(archive.read('META-INF/container.xml'))
+                root = next((elem.get('full-path') for elem in container.iter()
+                             if elem.tag.rsplit('}', 1)[-1] == 'rootfile'), None)
+            if root is None:
+                root = next(name for name in names
+                            if name.endswith('.xml') and not name.startswith('META-INF'))
+            with archive.open(root) as handle:
+                return _xml_header(handle)
+    except (zipfile.BadZipFile, KeyError, StopIteration, ElementTree.ParseError):
+        return {}
+
+
+# The header reader of each file extension.
+_READERS = {'.krn': _kern_header, '.mei': _xml_header, '.musicxml': _xml_header,
+            '.mxl': _mxl_header, '.xml': _xml_header}
+
+
+def read_header(pathname):
+    """
+    Read the metadata of a score from its header, without importing it. MusicXML, compressed
+    MusicXML, MEI, and ``**kern`` files are understood. Other files have no metadata.
+
+    **Example:**
+
+    >>> read_header('vizitka/tests/corpus/Kyrie.krn')
+    {'composer': 'Palestrina, Giovanni Perluigi da', 'title': 'Kyrie', 'genre': 'Mass (Paraphrase)'}
+
+    :param str pathname: The file to read.
+
+    :returns: The fields of :const:`FIELDS` that the header gives.
+    :rtype: dict
+    """
+    reader = _READERS.get(os.path.splitext(pathname)[1].lower())
+    return {} if reader is None else reader(pathname)
+
+
+def _elvis_meta(pathname):
+    """
+    Used internally by :class:`MetadataIndex` to read an ELVIS ``meta`` file.
+
+    :returns: The fields of :const:`FIELDS` that the file gives, and the names of the files they
+        describe, or ``None`` if it does not list them.
+    :rtype: 2-tuple of dict and set
+    """
+    try:
+        with open(pathname, encoding='utf-8') as handle:
+            meta = json.load(handle)
+    except (OSError, ValueError):
+        return {}, set()
+
+    def first_title(key):
+        """The title of the first entry of a list of the meta file."""
+        entries = meta.get(key) or [{}]
+        return entries[0].get('title') if isinstance(entries[0], dict) else None
+
+    post = {'title': meta.get('title'), 'composer': (meta.get('composer') or {}).get('title'),
+            'genre': first_title('genres'), 'localeOfComposition': first_title('locations')}
+    names = {attachment.get('file_name') for attachment in meta.get('attachments') or ()}
+    return {field: value for field, value in post.items() if value}, names or None
+
+
+class MetadataIndex(object):
+    """
+    Index of the metadata in the headers of the files of a corpus, kept in an SQLite database so
+    that a corpus can be searched before any of it is imported. Each file's header is read with
+    :func:`read_header`, and the fields it lacks are taken from the ELVIS ``meta`` file of its
+    directory, if the meta file describes it. When the index is updated again, only the files
+    whose size or modification time has changed are read again.
+
+    **Example:**
+
+    >>> index = MetadataIndex('path/to/corpus.sqlite')
+    >>> index.update('path/to/corpus')
+    >>> index.select(lambda meta: 'Palestrina' in (meta['composer'] or ''))
+    >>> index.select({'genre': 'Motet'})
+    """
+
+    # When select() is asked to match a field that is not indexed.
+    _UNKNOWN_FIELD = 'select() can match the fields {}, but not "{}".'
+
+    def __init__(self, path=':memory:'):
+        """
+        :param str path: The SQLite database of the index. It is created if necessary. The
+            default keeps the index in memory.
+        """
+        self._db = sqlite3.connect(path)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS headers (pathname TEXT PRIMARY KEY, '
+                             'stamp TEXT, {})'.format(', '.join(f + ' TEXT' for f in FIELDS)))
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM headers').fetchone()[0]
+
+    def update(self, location):
+        """
+        Read the headers of the files of ``location`` that are new or have changed since they were
+        last read. The files of a directory that are gone are dropped from the index.
+
+        :param location: A file, a list of files, or a directory of files, as for
+            :func:`~vizitka.models.indexed_piece.Importer`.
+        :type location: str or list of str
+
+        :returns: The number of headers that were read.
+        :rtype: int
+        """
+        from vizitka.models.indexed_piece import _find_files
+        directory = not isinstance(location, list) and os.path.isdir(location)
+        file_paths = _find_files(location)[0] if directory or isinstance(location, list) \
+            else [location]
+        file_paths = [os.path.abspath(path) for path in file_paths]
+        stamps = dict(self._db.execute('SELECT pathname, stamp FROM headers'))
+        metas = {}
+        count = 0
+        with self._db:
+            for path in file_paths:
+                folder, name = os.path.split(path)
+                if folder not in metas:
+                    meta_path = os.path.join(folder, 'meta')
+                    metas[folder] = [os.stat(meta_path).st_mtime_ns
+                                     if os.path.isfile(meta_path) else 0, None]
+                info = os.stat(path)
+                stamp = '{}:{}:{}'.format(info.st_size, info.st_mtime_ns, metas[folder][0])
+                if stamps.get(path) == stamp:
+                    continue
+                header = read_header(path)
+                if metas[folder][0]:
+                    if metas[folder][1] is None:
+                        metas[folder][1] = _elvis_meta(os.path.join(folder, 'meta'))
+                    fields, names = metas[folder][1]
+                    if names is None or name in names:
+                        for field, value in fields.items():
+                            header.setdefault(field, value)
+                self._db.execute('INSERT OR REPLACE INTO headers VALUES ({})'.format(
+                    ', '.join('?' * (2 + len(FIELDS)))),
+                                 (path, stamp) + tuple(header.get(field) for field in FIELDS))
+                count += 1
+            if directory:
+                prefix = os.path.join(os.path.abspath(location), '')
+                current = set(file_paths)
+                self._db.executemany('DELETE FROM headers WHERE pathname = ?',
+                                     [(path,) for path in stamps
+                                      if path.startswith(prefix) and path not in current])
+        return count
+
+    def frame(self):
+        """
+        :returns: The metadata of every file of the index, indexed by pathname.
+        :rtype: :class:`pandas.DataFrame`
+        """
+        return pandas.read_sql_query('SELECT pathname, {} FROM headers ORDER BY pathname'.format(
+            ', '.join(FIELDS)), self._db, index_col='pathname')
+
+    def select(self, where=None):
+        """
+        Find the files whose metadata match.
+
+        :param where: A function that takes the metadata of a file, as a dict of every field of
+            :const:`FIELDS` with ``None`` for those that are missing, and returns whether to
+            select the file. A dict of fields and the values they must have can be given instead.
+            ``None`` selects every file.
+        :type where: callable or dict
+
+        :returns: The pathnames of the files, in alphabetical order.
+        :rtype: list of str
+
+        :raises: :exc:`ValueError` if ``where`` is a dict with a field that is not indexed.
+        """
+        if isinstance(where, dict):
+            for field in where:
+                if field not in FIELDS:
+                    raise ValueError(MetadataIndex._UNKNOWN_FIELD.format(FIELDS, field))
+            clause = ' AND '.join(field + ' = ?' for field in where)
+            rows = self._db.execute('SELECT pathname FROM headers{} ORDER BY pathname'.format(
+                ' WHERE ' + clause if clause else ''), tuple(where.values()))
+            return [row[0] for row in rows]
+        rows = self._db.execute('SELECT pathname, {} FROM headers ORDER BY pathname'.format(
+            ', '.join(FIELDS)))
+        return [row[0] for row in rows if where is None or where(dict(zip(FIELDS, row[1:])))]
+
+    def close(self):
+        """
+        Close the index.
+        """
+        self._db.close()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models/vocabulary.py
+# Purpose:                Corpus-wide integer codes for indexer observations.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+.. codeauthor:: Alexander Morgan
+
+The :class:`Vocabulary` assigns every observation an indexer can produce (intervals, note names,
+durations, and so on) a permanent integer code. Results coded with the same vocabulary can be
+compared and concatenated across pieces without going back to strings.
+"""
+
+import ast
+import mmap
+import os
+import numpy
+import pandas
+try:
+    import fcntl
+except ImportError:  # Windows; appends are then only safe from one process at a time
+    fcntl = None
+
+
+class Vocabulary(object):
+    """
+    An append-only mapping from observations to integer codes. The code of an observation is its
+    position in the vocabulary, so codes never change once they are assigned.
+
+    If ``path`` is given, the vocabulary is persisted there with one observation per line, and it
+    is read back through a memory map. Every process that opens the same file sees the same codes:
+    new observations are appended under an exclusive lock after picking up whatever other processes
+    appended in the meantime. Without a ``path`` the vocabulary lives in memory only, which is what
+    the :class:`~vizitka.indexers.ngram.NGramIndexer` uses when it is given a plain list.
+
+    Observations must be hashable and their ``repr()`` must be readable by
+    :func:`ast.literal_eval` to be persisted, which is true of the strings, numbers and tuples
+    produced by the indexers.
+
+    **Example:**
+
+    >>> vocab = Vocabulary('corpus_vocabulary.txt')
+    >>> ip.get('vertical_interval', settings={'vocabulary': vocab})
+    """
+
+    # When an observation cannot be written to the vocabulary file.
+    _UNPERSISTABLE = 'Vocabulary cannot persist {!r} because it cannot be read back from its repr().'
+
+    def __init__(self, path=None, observations=None):
+        """
+        :param path: The file that persists the vocabulary. It is created if it does not exist.
+        :type path: str
+        :param observations: Only used when there is no ``path``. The list the vocabulary is kept
+            in. It is appended to in place, so the caller can hold on to it.
+        :type observations: list
+        """
+        self.path = path
+        self._observations = [] if observations is None else observations
+        self._lookup = {obs: code for code, obs in enumerate(self._observations)}
+        self._size = 0  # bytes of the vocabulary file already read
+        if path is not None:
+            if not os.path.exists(path):
+                open(path, 'ab').close()
+            self.refresh()
+
+    def __len__(self):
+        return len(self._observations)
+
+    def __getitem__(self, code):
+        return self._observations[code]
+
+    def __iter__(self):
+        return iter(self._observations)
+
+    def __contains__(self, observation):
+        return observation in self._lookup
+
+    def __repr__(self):
+        return 'Vocabulary({!r}, {} observations)'.format(self.path, len(self))
+
+    def index(self, observation):
+        """
+        Find the code of an observation that is already in the vocabulary.
+
+        :raises: :exc:`ValueError` if ``observation`` is not in the vocabulary.
+        """
+        if observation not in self._lookup:
+            self.refresh()
+            if observation not in self._lookup:
+                raise ValueError('{!r} is not in the vocabulary'.format(observation))
+        return self._lookup[observation]
+
+    def append(self, observation):
+        """
+        Add an observation to the vocabulary if it is not there yet.
+
+        :returns: The code of ``observation``.
+        :rtype: int
+        """
+        if observation not in self._lookup:
+            self.extend((observation,))
+        return self._lookup[observation]
+
+    def refresh(self):
+        """
+        Read the observations that other processes appended to the vocabulary file since it was
+        last read. This does nothing for an in-memory vocabulary.
+        """
+        if self.path is None:
+            return
+        with open(self.path, 'rb') as fileobj:
+            size = os.fstat(fileobj.fileno()).st_size
+            if size <= self._size:
+                return
+            with mmap.mmap(fileobj.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+                # a line without its newline is still being written by another process
+                end = mapped.rfind(b'\n', self._size, size) + 1
+                if end <= self._size:
+                    return
+                new = mapped[self._size:end].decode('utf-8').splitlines()
+        for line in new:
+            obs = ast.literal_eval(line)
+            self._lookup[obs] = len(self._observations)
+            self._observations.append(obs)
+        self._size = end
+
+    def extend(self, observations):
+        """
+        Add the observations that are not in the vocabulary yet, in order, persisting them if the
+        vocabulary has a ``path``.
+
+        :param observations: The observations to add.
+        :type observations: iterable
+        """
+        if self.path is None:
+            for obs in observations:
+                if obs not in self._lookup:
+                    self._lookup[obs] = len(self._observations)
+                    self._observations.append(obs)
+            return
+        with open(self.path, 'ab') as fileobj:
+            if fcntl is not None:
+                fcntl.flock(fileobj.fileno(), fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                new = {}
+                for obs in observations:
+                    if obs not in self._lookup and obs not in new:
+                        line = repr(obs.item() if isinstance(obs, numpy.generic) else obs)
+                        try:
+                            if ast.literal_eval(line) != obs:
+                                raise ValueError
+                        except (ValueError, SyntaxError):
+                            raise TypeError(Vocabulary._UNPERSISTABLE.format(obs))
+                        new[obs] = line
+                if new:
+                    data = ('\n'.join(new.values()) + '\n').encode('utf-8')
+                    fileobj.write(data)
+                    fileobj.flush()
+                    self._size += len(data)
+                    for obs in new:
+                        self._lookup[obs] = len(self._observations)
+                        self._observations.append(obs)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fileobj.fileno(), fcntl.LOCK_UN)
+
+    def encode(self, observations):
+        """
+        Replace each observation with its code, adding the observations that are not in the
+        vocabulary yet.
+
+        :param observations: The observations to encode. Missing values must be NaN or ``None``.
+        :type observations: :class:`numpy.ndarray` of any shape
+
+        :returns: The integer codes, with ``-1`` for missing values.
+        :rtype: :class:`numpy.ndarray` of int32 with the shape of ``observations``
+        """
+        observations = numpy.asarray(observations, dtype=object)
+        codes, uniques = pandas.factorize(observations.ravel())
+        missing = [obs for obs in uniques if obs not in self._lookup]
+        if missing:
+            self.extend(missing)
+        mapping = numpy.empty(len(uniques) + 1, dtype=numpy.int32)
+        mapping[:-1] = [self._lookup[obs] for obs in uniques]
+        mapping[-1] = -1  # pandas.factorize() codes missing values as -1
+        return mapping[codes].reshape(observations.shape)
+
+    def encode_frame(self, df):
+        """
+        Encode every observation of a :class:`DataFrame`, keeping its index and columns.
+
+        :param df: The indexer results to encode.
+        :type df: :class:`pandas.DataFrame`
+
+        :returns: The integer codes, with ``-1`` for missing values.
+        :rtype: :class:`pandas.DataFrame` of int32
+        """
+        return pandas.DataFrame(self.encode(df.values), index=df.index, columns=df.columns)
+
+    def decode(self, codes):
+        """
+        Replace each code with its observation.
+
+        :param codes: Codes from this vocabulary, with ``-1`` for missing values.
+        :type codes: :class:`numpy.ndarray` of int
+
+        :returns: The observations, with NaN for missing values.
+        :rtype: :class:`numpy.ndarray` of object with the shape of ``codes``
+        """
+        codes = numpy.asarray(codes)
+        if codes.size and codes.max() >= len(self._observations):
+            self.refresh()
+        table = numpy.empty(len(self._observations) + 1, dtype=object)
+        table[:-1] = self._observations
+        table[-1] = numpy.nan
+        return table[codes]
+
+
+def as_vocabulary(vocabulary):
+    """
+    Used internally by the indexers that accept a ``'vocabulary'`` setting.
+
+    :param vocabulary: A :class:`Vocabulary`, the path of a persisted vocabulary, or a list to
+        keep an in-memory vocabulary in.
+    :type vocabulary: :class:`Vocabulary`, str, or list
+
+    :returns: ``vocabulary`` as a :class:`Vocabulary`, or ``None`` if it is ``None``.
+    :rtype: :class:`Vocabulary`
+    """
+    if vocabulary is None or isinstance(vocabulary, Vocabulary):
+        return vocabulary
+    elif isinstance(vocabulary, str):
+        return Vocabulary(vocabulary)
+    return Vocabulary(observations=vocabulary)
@@ -26,13 +26,21 @@
 Tests for :py:class:`~vis.models.aggregated_pieces.AggregatedPieces`.
 """
 
+import gc
 import os
-from unittest import TestCase, TestLoader
-from unittest.mock import MagicMock, Mock
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from unittest import TestCase, TestLoader, skipIf
+from unittest.mock import MagicMock, Mock, patch
 import pandas
 from vizitka.indexers.indexer import Indexer
-from vizitka.models.aggregated_pieces import AggregatedPieces
-from vizitka.models.indexed_piece import Importer, IndexedPiece
+from vizitka.models.aggregated_pieces import AggregatedPieces, _flat_results
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+from vizitka.models.fingerprint import MinHasher
+from vizitka.models.indexed_piece import Importer, IndexedPiece, _import_file
 import vizitka
 VIS_PATH = vis.__path__[0]
 
@@ -155,11 +163,220 @@ class TestAggregatedPieces(TestCase):
             # pylint: disable=protected-access
             self.assertEqual(AggregatedPieces._NO_PIECES, r_warn.args[0])
 
+    def test_get_long_format(self):
+        """get(long_format=True) stacks the results of every piece into one typed frame"""
+        columns = pandas.MultiIndex.from_tuples((('noterest', 'S'), ('noterest', 'B'),
+                                                 ('duration', 'S'), ('duration', 'B')))
+        frames = [pandas.DataFrame([['E4', 'C3', 1.0, 2.0], ['D4', float('nan'), 1.0, float('nan')]],
+                                   index=[0.0, 1.0], columns=columns),
+                  pandas.DataFrame([['G4', 'G2', 4.0, 4.0]], index=[0.0], columns=columns).iloc[:, ::2],
+                  pandas.DataFrame([[3, 'A3']], index=[0.5], columns=columns[[2, 1]])]
+        for piece, frame in zip(self.ind_pieces, frames):
+            piece.get.return_value = frame
+        actual = self.agg_p.get('noterest', long_format=True)
+        self.assertEqual(('Piece', 'Part', 'Offset'), tuple(actual.index.names))
+        self.assertEqual(['noterest', 'duration'], list(actual.columns))
+        self.assertEqual([(0, 'S', 0.0), (0, 'S', 1.0), (0, 'B', 0.0), (1, 'S', 0.0), (2, 'S', 0.5),
+                          (2, 'B', 0.5)], list(actual.index))
+        self.assertEqual([1.0, 1.0, 2.0, 4.0, 3.0], list(actual['duration'].dropna()))
+        self.assertEqual('float64', actual['duration'].dtype)
+        self.assertEqual(['E4', 'D4', 'C3', 'G4', 'A3'], list(actual['noterest'].dropna()))
+
+    def test_get_workers(self):
+        """get() with an executor returns the results in order and can merge back the caches"""
+        paths = [os.path.join(VIS_PATH, 'tests', 'corpus', name) for name in ('bwv77.mxl', 'bwv603.xml')]
+        expected = [_import_file(path)[0].get('noterest') for path in paths]
+        pieces = [_import_file(path)[0] for path in paths]
+        with ProcessPoolExecutor(2) as pool:
+            actual = AggregatedPieces(pieces).get('noterest', executor=pool, merge_cache=True)
+            self.assertEqual(1, pool.submit(abs, -1).result()) # the executor is left running
+        for exp, act, piece in zip(expected, actual, pieces):
+            self.assertTrue(exp.sort_index().fillna('').equals(act.sort_index().fillna('')))
+            self.assertIs(act, piece._analyses['noterest'])
+            self.assertNotIn('m21_objs', piece._analyses)
+
+    def test_get_offset_ticks(self):
+        """each piece's offsets are put on its own grid of ticks, not that of the first piece"""
+        paths = [os.path.join(VIS_PATH, 'tests', 'corpus', name)
+                 for name in ('bwv77.mxl', 'Kyrie_short.krn', 'bwv603.xml')]
+        agg = AggregatedPieces([_import_file(path, ticks=True)[0] for path in paths])
+        self.assertEqual([2, 1, 1], [piece.ticks_per_quarter() for piece in agg._pieces])
+        setts = {'quarterLength': 1.0}
+        actual = agg.get('offset', data=agg.get('noterest'), settings=setts)
+        self.assertEqual([[0, 2, 4, 6], [0, 1, 2, 3], [0, 1, 2, 3]],
+                         [list(result.index[:4]) for result in actual])
+        self.assertEqual({'quarterLength': 1.0}, setts)
+
+    def test_memory_budget(self):
+        """pieces over the budget are spilled to disk and restored when they are used again"""
+        paths = [os.path.join(VIS_PATH, 'tests', 'corpus', name) for name in ('bwv77.mxl', 'bwv603.xml')]
+        expected = [_import_file(path)[0].get('duration') for path in paths]
+        agg = AggregatedPieces([_import_file(path)[0] for path in paths], memory_budget=1)
+        actual = agg.get('duration')
+        usage = agg.memory_usage()
+        self.assertEqual([True, False], list(usage['Spilled']))
+        self.assertEqual(0, usage['Bytes'][0])
+        self.assertIsNone(agg._pieces[0]._score)
+        self.assertEqual(1, len(os.listdir(agg._spill_dir)))
+        self.assertTrue(expected[0].equals(actual[0]))
+        restored = agg._pieces[0].get('duration') # read back from disk, not analyzed again
+        self.assertTrue(expected[0].equals(restored))
+        self.assertNotIn('m21_objs', agg._pieces[0]._analyses)
+        self.assertIsNone(agg._pieces[0]._score) # not needed for cached results
+        self.assertEqual([], os.listdir(agg._spill_dir))
+        agg = AggregatedPieces([_import_file(path)[0] for path in paths], memory_budget=1)
+        agg.get('duration')
+        pool = MagicMock() # with workers, too, the spilled results are read back from disk
+        actual = agg.get('duration', executor=pool)
+        pool.submit.assert_not_called()
+        self.assertTrue(all(exp.equals(act) for exp, act in zip(expected, actual)))
+
+    def test_memory_budget_collected(self):
+        """pieces spilled by pieces that were garbage collected make their analyses again"""
+        path = os.path.join(VIS_PATH, 'tests', 'corpus', 'bwv77.mxl')
+        expected = _import_file(path)[0].get('duration')
+        pieces = [_import_file(path)[0] for _ in range(2)]
+        agg = AggregatedPieces(pieces, memory_budget=1)
+        agg.get('duration')
+        spill_dir = agg._spill_dir
+        self.assertIsNotNone(pieces[0]._spilled)
+        del agg
+        gc.collect()
+        self.assertFalse(os.path.exists(spill_dir))
+        self.assertTrue(expected.equals(pieces[0].get('duration')))
+        self.assertIsNone(pieces[0]._spilled)
+
+    def test_memory_budget_unspillable(self):
+        """the score of a piece without a file stays in memory and still counts against the budget"""
+        paths = [os.path.join(VIS_PATH, 'tests', 'corpus', name)
+                 for name in ('bwv77.mxl', 'bwv603.xml', 'Kyrie_short.krn')]
+        pieces = [_import_file(path)[0] for path in paths]
+        pieces[0]._pathname = None
+        agg = AggregatedPieces(pieces, memory_budget=1)
+        agg.get('duration')
+        self.assertIsNotNone(pieces[0]._score)
+        self.assertEqual([True, True, False], list(agg.memory_usage()['Spilled']))
+        self.assertEqual({i: piece._memory_usage() for i, piece in enumerate(pieces)
+                          if piece._memory_usage()}, dict(agg._usage))
+        self.assertLess(0, agg._usage[0])
+        with patch.object(pieces[0], '_spill', wraps=pieces[0]._spill) as spill:
+            agg.get('duration') # spilled once after it is used, not again for every other piece
+        self.assertEqual(1, spill.call_count)
+
+    def test_memory_budget_profile(self):
+        """dissonance_profile() counts spilled dissonances here rather than sending the pieces out"""
+        path = os.path.join(VIS_PATH, 'tests', 'corpus', 'bwv603.xml')
+        agg = AggregatedPieces([_import_file(path)[0] for _ in range(2)], memory_budget=1)
+        agg.get('dissonance')
+        self.assertIsNotNone(agg._pieces[0]._spilled)
+        expected = AggregatedPieces([_import_file(path)[0]]).dissonance_profile(workers=1)
+        with patch('vizitka.models.aggregated_pieces.ProcessPoolExecutor') as pool:
+            actual = agg.dissonance_profile(workers=2)
+        pool.assert_not_called()
+        self.assertEqual(list(expected.loc[0]), list(actual.loc[0]))
+        self.assertEqual(list(actual.loc[0]), list(actual.loc[1]))
+
     def test_date(self):
         date = ['----/--/-- to ----/--/--']
         agg = AggregatedPieces()._make_date_range(date)
         self.assertEqual(agg, None)
 
+    def test_near_duplicates_1(self):
+        """near_duplicates() pairs up the pieces with matching fingerprints"""
+        hasher = MinHasher()
+        grams = [{('h', str(x), '2') for x in range(start, start + 100)} for start in (0, 500, 5)]
+        for piece, shingles in zip(self.ind_pieces, grams):
+            piece.get.return_value = hasher.signature(shingles)
+        actual = self.agg_p.near_duplicates(threshold=0.8)
+        self.assertEqual(['Piece A', 'Piece B', 'Similarity'], list(actual.columns))
+        self.assertEqual([(0, 2)], list(zip(actual['Piece A'], actual['Piece B'])))
+        for piece in self.ind_pieces:
+            piece.get.assert_called_once_with('fingerprint')
+
+    def test_dissonance_profile_1(self):
+        """dissonance_profile() counts each label per piece or per voice and drops the labels"""
+        columns = pandas.MultiIndex.from_product((('dissonance.DissonanceIndexer',), ('0', '1')))
+        labels = [pandas.DataFrame([['S', '-'], ['-', 'D'], ['D', '-']], columns=columns),
+                  pandas.DataFrame([['Q', 'Q']], columns=columns),
+                  pandas.DataFrame([['-', '-']], columns=columns)]
+        for piece, frame in zip(self.ind_pieces, labels):
+            piece._analyses = {}
+            piece.get.side_effect = lambda ind, piece=piece, frame=frame: piece._analyses.setdefault(ind, frame)
+        actual = self.agg_p.dissonance_profile(workers=1)
+        self.assertEqual(['Q', 'D', 'R', 'L', 'U', 'S', 'F', 'f', 'A', 'C', 'H', 'E', 'Z'],
+                         list(actual.columns))
+        self.assertEqual([0, 1, 2, 'All'], list(actual.index))
+        self.assertEqual([2, 0, 0, 2], list(actual['D']))
+        self.assertEqual([0, 2, 0, 2], list(actual['Q']))
+        self.assertEqual(1, actual.at['All', 'S'])
+        for piece in self.ind_pieces:
+            self.assertEqual({}, piece._analyses)
+        by_voice = self.agg_p.dissonance_profile(workers=1, by_voice=True)
+        self.assertEqual([1, 1, 0, 0, 0, 0, 2], list(by_voice['D']))
+        self.assertEqual(('All', 'All'), by_voice.index[-1])
+
+    def test_export_1(self):
+        """export() writes each piece once, skips unchanged sources, and reports failures"""
+        def to_kern(path, piece):
+            if piece._pathname.endswith('2.krn'):
+                raise RuntimeError('cannot convert')
+            with open(path, 'w') as out:
+                out.write('**kern\n')
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, piece in enumerate(self.ind_pieces):
+                piece._pathname = os.path.join(tmp, 'in_{}.krn'.format(i))
+                piece._opus_id = None
+                with open(piece._pathname, 'w') as source:
+                    source.write('**kern\n*-\n')
+                piece.to_kern.side_effect = lambda path, piece=piece: to_kern(path, piece)
+            out_dir = os.path.join(tmp, 'out')
+            actual = self.agg_p.export('kern', out_dir, workers=1)
+            self.assertEqual(['exported', 'exported', 'failed'], list(actual['Status']))
+            self.assertEqual(os.path.join(out_dir, 'in_0.krn'), actual.at[0, 'Output'])
+            self.assertEqual('RuntimeError: cannot convert', actual.at[2, 'Error'])
+            # touching a source does not make it stale, but editing it does
+            os.utime(self.ind_pieces[0]._pathname, (0, 0))
+            with open(self.ind_pieces[1]._pathname, 'a') as source:
+                source.write('!! edited\n')
+            actual = self.agg_p.export('kern', out_dir, workers=1)
+            self.assertEqual(['skipped', 'exported', 'failed'], list(actual['Status']))
+            self.assertEqual([1, 2, 2], [p.to_kern.call_count for p in self.ind_pieces])
+            actual = self.agg_p.export('kern', out_dir, workers=1, force=True)
+            self.assertEqual(['exported', 'exported', 'failed'], list(actual['Status']))
+        self.assertRaises(ValueError, self.agg_p.export, 'mei', 'out')
+
+    def test_flat_results_1(self):
+        """_flat_results() flattens the columns, keeps the offsets, and adds the metadata"""
+        columns = pandas.MultiIndex.from_product((('interval.IntervalIndexer',), ('0,1', '0,2')))
+        results = pandas.DataFrame([['M3', 5], [float('nan'), 'P8']], index=[0.0, 1.5],
+                                   columns=columns)
+        actual = _flat_results(results, {'Title': 'Kyrie', 'Date': None})
+        self.assertEqual(['Offset', 'interval.IntervalIndexer/0,1', 'interval.IntervalIndexer/0,2',
+                          'Title', 'Date'], list(actual.columns))
+        self.assertEqual([0.0, 1.5], list(actual['Offset']))
+        self.assertEqual(['5', 'P8'], list(actual['interval.IntervalIndexer/0,2']))
+        self.assertTrue(pandas.isnull(actual['interval.IntervalIndexer/0,1'][1]))
+        self.assertEqual(['Kyrie', 'Kyrie'], list(actual['Title']))
+        self.assertEqual([None, None], list(actual['Date']))
+
+    @skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_export_dataset_1(self):
+        """export_dataset() writes one partition per piece and reports the failures"""
+        columns = pandas.MultiIndex.from_product((('noterest.NoteRestIndexer',), ('S', 'B')))
+        for piece in self.ind_pieces:
+            piece._pathname, piece._opus_id = None, None
+            piece.get.return_value = pandas.DataFrame([['C4', 'C3'], ['D4', float('nan')]],
+                                                      columns=columns)
+        self.ind_pieces[1].get.side_effect = KeyError('noterest')
+        with tempfile.TemporaryDirectory() as tmp:
+            actual = self.agg_p.export_dataset('noterest', tmp, workers=1)
+            self.assertEqual(['exported', 'failed', 'exported'], list(actual['Status']))
+            self.assertEqual([2, 0, 2], list(actual['Rows']))
+            written = pandas.read_parquet(os.path.join(tmp, 'piece=2', 'part-0.parquet'))
+        self.assertEqual(['C4', 'D4'], list(written['noterest.NoteRestIndexer/S']))
+        self.assertEqual(['test_path_3'] * 2, list(written['Title']))
+        self.assertRaises(ValueError, self.agg_p.export_dataset, 'noterest', 'out', format='csv')
+
 class TestImporter(TestCase):
     """Tests for Importer"""
 
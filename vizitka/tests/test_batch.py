@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models_tests/test_batch.py
+# Purpose:                Tests for models/batch.py.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+Tests for :py:class:`~vizitka.models.batch.BatchRunner` and
+:py:class:`~vizitka.models.batch.Coordinator`.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase, TestLoader
+import vizitka
+from vizitka.models.batch import BatchRunner, Coordinator, run_worker, _WorkQueue
+from vizitka.models.indexed_piece import Importer
+
+CORPUS = os.path.join(vizitka.__path__[0], 'tests', 'corpus')
+
+
+class TestBatchRunner(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.tmp, 'corpus')
+        os.mkdir(self.corpus)
+        for name in ('bwv603.xml', 'bwv77.mxl'):
+            shutil.copy(os.path.join(CORPUS, name), self.corpus)
+        with open(os.path.join(self.corpus, 'broken.xml'), 'w') as broken:
+            broken.write('<score-partwise>')
+        self.out_dir = os.path.join(self.tmp, 'results')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_run(self):
+        """every piece is analyzed once, and a broken file is retried then reported"""
+        runner = BatchRunner(self.corpus, 'noterest', self.out_dir, retries=1, workers=2)
+        actual = runner.run()
+        self.assertEqual(['broken.xml', 'bwv603.xml', 'bwv77.mxl'],
+                         [os.path.basename(path) for path in actual['Pathname']])
+        self.assertEqual(['failed', 'done', 'done'], list(actual['Status']))
+        self.assertEqual([2, 1, 1], list(actual['Attempts']))
+        self.assertTrue(actual['Error'][0])
+        results = dict(runner.results())
+        expected = Importer(os.path.join(self.corpus, 'bwv77.mxl')).get('noterest')
+        self.assertTrue(expected.equals(results[os.path.join(self.corpus, 'bwv77.mxl')]))
+        runner.close()
+
+    def test_resume(self):
+        """a job run again only analyzes the pieces that are not done"""
+        runner = BatchRunner(self.corpus, 'noterest', self.out_dir)
+        runner.run()
+        runner.close()
+        runner = BatchRunner(self.corpus, 'noterest', self.out_dir)
+        os.remove(runner.manifest()['Output'][2])
+        actual = runner.run()
+        self.assertEqual([2, 1, 2], list(actual['Attempts']))
+        self.assertEqual(['failed', 'done', 'done'], list(actual['Status']))
+        runner.close()
+        self.assertRaises(RuntimeError, BatchRunner, self.corpus, 'duration', self.out_dir)
+
+    def test_timeout(self):
+        """a piece that takes too long is stopped"""
+        runner = BatchRunner(os.path.join(self.corpus, 'bwv77.mxl'), 'noterest', self.out_dir,
+                             timeout=0.01)
+        actual = runner.run()
+        self.assertEqual(['failed'], list(actual['Status']))
+        self.assertEqual('Timed out after 0.01 seconds.', actual['Error'][0])
+        runner.close()
+
+
+class TestCoordinator(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        for name in ('bwv603.xml', 'bwv77.mxl'):
+            shutil.copy(os.path.join(CORPUS, name), self.tmp)
+        with open(os.path.join(self.tmp, 'broken.xml'), 'w') as broken:
+            broken.write('<score-partwise>')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_localhost(self):
+        """two worker processes share the pieces and send back the results of every request"""
+        coordinator = Coordinator(self.tmp, ['noterest', ('duration', None)], retries=1)
+        address = coordinator.start()
+        workers = [multiprocessing.Process(target=run_worker, args=(address, coordinator.authkey),
+                                           kwargs={'worker': 'w{}'.format(i), 'poll': 0.05})
+                   for i in range(2)]
+        for worker in workers:
+            worker.start()
+        self.assertTrue(coordinator.wait(timeout=120))
+        for worker in workers:
+            worker.join(30)
+            self.assertEqual(0, worker.exitcode)
+        status = coordinator.status()
+        self.assertEqual(['failed', 'done', 'done'], list(status['Status']))
+        self.assertTrue(status['Error'][0])
+        results = coordinator.results()
+        self.assertIsNone(results[0])
+        piece = Importer(os.path.join(self.tmp, 'bwv77.mxl'))
+        self.assertTrue(piece.get('noterest').equals(results[2][0]))
+        self.assertTrue(piece.get('duration').equals(results[2][1]))
+        self.assertEqual(['w0', 'w1'], list(coordinator.workers()['Worker']))
+        self.assertEqual(2, coordinator.workers()['Accepted'].sum())
+        coordinator.shutdown()
+
+    def test_steal_and_dedup(self):
+        """an idle worker steals a running piece, and only the first results are kept"""
+        queue = _WorkQueue(['a', 'b'], [('noterest', None)], False, 60.0, 0)
+        self.assertEqual((0, 'a'), queue.claim('w0'))
+        self.assertEqual((1, 'b'), queue.claim('w0'))
+        self.assertEqual((0, 'a'), queue.claim('w1'))
+        self.assertEqual((1, 'b'), queue.claim('w2'))
+        self.assertEqual((), queue.claim('w3'))
+        self.assertTrue(queue.submit('w1', 0, ['first']))
+        self.assertFalse(queue.submit('w0', 0, ['second']))
+        self.assertTrue(queue.submit('w2', 1, ['b']))
+        self.assertEqual([['first'], ['b']], queue.results())
+        self.assertIsNone(queue.claim('w3'))
+        self.assertTrue(queue.finished())
+
+    def test_expired_worker(self):
+        """the pieces of a worker that stops sending heartbeats go to another worker"""
+        queue = _WorkQueue(['a', 'b'], [('noterest', None)], False, 0.05, 0)
+        self.assertEqual((0, 'a'), queue.claim('w0'))
+        time.sleep(0.1)
+        self.assertEqual((0, 'a'), queue.claim('w1'))
+        self.assertEqual([('a', 'running', ['w1'], None), ('b', 'pending', [], None)],
+                         queue.status())
+
+    def test_late_submission(self):
+        """a worker whose lease expired may still submit without queueing its piece twice"""
+        queue = _WorkQueue(['a', 'b'], [('noterest', None)], False, 0.05, 1)
+        self.assertEqual((0, 'a'), queue.claim('w0'))
+        time.sleep(0.1)
+        self.assertFalse(queue.finished()) # the lease expires and 'a' is queued again
+        self.assertTrue(queue.submit('w0', 0, None, 'late error'))
+        self.assertEqual([0, 1], list(queue._pending))
+        self.assertEqual(1, queue._failures[0])
+        self.assertEqual((0, 'a'), queue.claim('w1'))
+        self.assertEqual((1, 'b'), queue.claim('w1'))
+        self.assertEqual((), queue.claim('w1'))
+        # a late success leaves the finished piece in the queue, where it is passed over
+        queue = _WorkQueue(['a', 'b'], [('noterest', None)], False, 0.05, 1)
+        self.assertEqual((0, 'a'), queue.claim('w0'))
+        time.sleep(0.1)
+        self.assertFalse(queue.finished())
+        self.assertTrue(queue.submit('w0', 0, {}, None))
+        self.assertEqual((1, 'b'), queue.claim('w1'))
+        self.assertEqual((), queue.claim('w1'))
+
+
+#--------------------------------------------------------------------------------------------------#
+# Definitions                                                                                      #
+#--------------------------------------------------------------------------------------------------#
+BATCH_RUNNER_SUITE = TestLoader().loadTestsFromTestCase(TestBatchRunner)
+COORDINATOR_SUITE = TestLoader().loadTestsFromTestCase(TestCoordinator)
@@ -115,5 +115,18 @@ class TestContourIndexer(TestCase):
         comparison = contour.compare(matrix1, matrix2)
         self.assertEqual(0.8, comparison)
 
+    def test_matrix2(self):
+        """tests that COM_matrix() also accepts the contour numbers themselves"""
+        matrix = contour.COM_matrix([4, 1, 2, 3, 0])
+        self.assertEqual(matrix, matrix2)
+
+    def test_contours(self):
+        """tests the windowed contour kernel on repeated notes and enharmonic spellings"""
+        ps, names = contour._pitch_arrays(['C4', 'E4', 'C4', 'B#3', 'G4'])
+        actual = contour.contours(ps, names, 3)
+        self.assertEqual([[0, 1, 0], [2, 1, 1], [1, 1, 2]], actual.tolist())
+        self.assertEqual('[1, 1, 2]', contour.getContour(['C4', 'B#3', 'G4']))
+        self.assertEqual((0, 6), contour.contours(ps, names, 6).shape)
+
 
 CONTOUR_INDEXER_SUITE = TestLoader().loadTestsFromTestCase(TestContourIndexer)
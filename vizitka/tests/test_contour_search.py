@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models_tests/test_contour_search.py
+# Purpose:                Tests for models/contour_search.py.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+Tests for :py:class:`~vizitka.models.contour_search.ContourIndex`.
+"""
+
+from unittest import TestCase, TestLoader
+from unittest.mock import MagicMock
+import pandas
+from vizitka.indexers import contour
+from vizitka.models.aggregated_pieces import AggregatedPieces
+from vizitka.models.contour_search import ContourIndex, canonical
+
+
+def make_notes(parts, index):
+    """Make a NoteRestIndexer-style DataFrame from a dict of part names to lists of notes."""
+    ret = pandas.DataFrame(parts, index=index, dtype=object)
+    ret.columns = pandas.MultiIndex.from_product((('noterest.NoteRestIndexer',), list(parts)),
+                                                 names=('Indexer', 'Part'))
+    return ret
+
+PIECE_1 = make_notes({'Soprano': ['C5', 'E5', 'D5', 'F5', 'Rest'],
+                      'Bass': ['C3', 'C3', 'G2', float('nan'), 'A2']},
+                     [0.0, 1.0, 2.0, 3.0, 4.0])
+PIECE_2 = make_notes({'Tenor': ['G3', 'Rest', 'B3', 'A3', 'C4', 'B3']},
+                     [0.0, 0.5, 1.0, 2.0, 3.0, 3.5])
+
+
+class TestContourIndex(TestCase):
+
+    def setUp(self):
+        self.agg = MagicMock(spec=AggregatedPieces)
+        self.agg.get.return_value = [PIECE_1, PIECE_2]
+        self.index = ContourIndex(self.agg, 3)
+
+    def test_canonical(self):
+        """canonical() ranks the distinct values of one or several contours"""
+        self.assertEqual([1, 0, 2, 1], canonical('[3, 0, 7, 3]').tolist())
+        self.assertEqual([[1, 1, 0], [0, 1, 2]], canonical([[5, 5, 1], [1, 2, 3]]).tolist())
+
+    def test_init(self):
+        """every window of the ContourIndexer is indexed"""
+        self.agg.get.assert_called_once_with('noterest')
+        # Soprano and Bass have 2 windows each, and Tenor has 3
+        self.assertEqual(7, len(self.index))
+
+    def test_search_exact(self):
+        """an exact search finds the segments with the same canonical contour"""
+        actual = self.index.search('[0, 5, 2]')
+        self.assertEqual([(0, 'Soprano', 0.0), (1, 'Tenor', 0.0), (1, 'Tenor', 2.0)],
+                         list(zip(actual['Piece'], actual['Voice'], actual['Offset'])))
+        self.assertEqual(['[0, 2, 1]'] * 3, list(actual['Contour']))
+        self.assertEqual([1.0] * 3, list(actual['Similarity']))
+
+    def test_search_similar(self):
+        """a similarity search agrees with contour.compare() and ranks the matches"""
+        query = [0, 1, 2]
+        actual = self.index.search(query, threshold=0.5)
+        for cseg, sim in zip(actual['Contour'], actual['Similarity']):
+            expected = contour.compare(contour.COM_matrix(query), contour.COM_matrix(cseg))
+            self.assertAlmostEqual(expected, sim)
+            self.assertGreaterEqual(sim, 0.5)
+        self.assertEqual(sorted(actual['Similarity'], reverse=True), list(actual['Similarity']))
+        self.assertEqual(2, len(self.index.search(query, threshold=0.5, limit=2)))
+
+    def test_search_length(self):
+        """queries must have the indexed length"""
+        self.assertRaises(ValueError, self.index.search, [0, 1])
+
+
+#--------------------------------------------------------------------------------------------------#
+# Definitions                                                                                      #
+#--------------------------------------------------------------------------------------------------#
+CONTOUR_INDEX_SUITE = TestLoader().loadTestsFromTestCase(TestContourIndex)
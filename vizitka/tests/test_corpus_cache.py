@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models_tests/test_corpus_cache.py
+# Purpose:                Tests for models/corpus_cache.py.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+Tests for :py:class:`~vizitka.models.corpus_cache.CorpusCache`.
+"""
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase, TestLoader, mock
+import vizitka
+from vizitka.models.corpus_cache import CorpusCache
+from vizitka.models.indexed_piece import Importer
+
+CORPUS = os.path.join(vizitka.__path__[0], 'tests', 'corpus')
+
+
+class TestCorpusCache(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.tmp, 'corpus')
+        os.mkdir(self.corpus)
+        for name in ('bwv603.xml', 'bwv77.mxl', 'Kyrie_short.krn'):
+            shutil.copy(os.path.join(CORPUS, name), self.corpus)
+        self.cache = os.path.join(self.tmp, 'cache')
+        self.paths = [os.path.join(self.corpus, name)
+                      for name in ('bwv603.xml', 'bwv77.mxl', 'Kyrie_short.krn')]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_reuse(self):
+        """unchanged files are not parsed again, and their saved analyses are reused"""
+        first = Importer(self.corpus, cache=self.cache)
+        expected = first.get('noterest')
+        self.assertEqual(3, first.save_cache())
+        first._cache.close()
+        second = Importer(self.corpus, cache=self.cache)
+        self.assertTrue(all(piece._score is None for piece in second._pieces))
+        self.assertEqual([piece._metadata['parts'] for piece in first._pieces],
+                         [piece._metadata['parts'] for piece in second._pieces])
+        for exp, act in zip(expected, second.get('noterest')):
+            self.assertTrue(exp.equals(act))
+        self.assertTrue(all(piece._score is None for piece in second._pieces))
+        for exp, act in zip(first.get('duration'), second.get('duration')): # from thawed scores
+            self.assertTrue(exp.equals(act))
+        second._cache.close()
+
+    def test_reuse_parallel(self):
+        """a parallel get() reuses the saved analyses rather than sending the pieces to workers"""
+        first = Importer(self.corpus, cache=self.cache)
+        expected = first.get('noterest')
+        first.save_cache()
+        first._cache.close()
+        second = Importer(self.corpus, cache=self.cache)
+        pool = mock.MagicMock()
+        for exp, act in zip(expected, second.get('noterest', executor=pool)):
+            self.assertTrue(exp.equals(act))
+        pool.submit.assert_not_called()
+        second._cache.close()
+
+    def test_diff(self):
+        """changed and added files are parsed, touched files are not, and removed files dropped"""
+        cache = CorpusCache(self.cache)
+        cache.load(self.corpus)
+        self.assertEqual(3, len([name for name in os.listdir(self.cache) if name.endswith('.m21')]))
+        written = cache._db.total_changes
+        cache.load(self.corpus)
+        self.assertEqual(written, cache._db.total_changes) # the manifest is left as it is
+        os.utime(self.paths[0], (0, 0))
+        with open(self.paths[1], 'ab') as changed:
+            changed.write(b'\0')
+        os.remove(self.paths[2])
+        shutil.copy(os.path.join(CORPUS, 'bwv2.xml'), self.corpus)
+        expected = {'added': [os.path.join(self.corpus, 'bwv2.xml')], 'changed': [self.paths[1]],
+                    'removed': [self.paths[2]], 'unchanged': [self.paths[0]]}
+        actual = cache.diff(self.corpus)
+        self.assertEqual(expected, {key: sorted(val) for key, val in actual.items()})
+        pieces = cache.load(self.corpus)[0]
+        parsed = {os.path.basename(p._pathname): p._score is not None for p in pieces}
+        self.assertEqual({'bwv603.xml': False, 'bwv77.mxl': True, 'bwv2.xml': True}, parsed)
+        self.assertEqual([], cache.diff(self.corpus)['changed'])
+        self.assertEqual(0, cache._recorded()[self.paths[0]][0]['mtime']) # the touch is recorded
+        scores = [name for name in os.listdir(self.cache) if name.endswith('.m21')]
+        self.assertEqual(3, len(scores)) # those of the changed and removed files are deleted
+        cache.close()
+
+
+#--------------------------------------------------------------------------------------------------#
+# Definitions                                                                                      #
+#--------------------------------------------------------------------------------------------------#
+CORPUS_CACHE_SUITE = TestLoader().loadTestsFromTestCase(TestCorpusCache)
@@ -145,6 +145,24 @@ class TestDissonanceIndexer(unittest.TestCase):
         actual = init._is_passing_or_neigh(1, '0,1', 'M2', 'P1')
         self.assertSequenceEqual(expected, actual)
 
+    def test_diss_indexer_check_4s_5s_1(self):
+        """
+        A fourth is consonant over a third in the voice below it and dissonant otherwise, and
+        the batch resolution in run() agrees with check_4s_5s().
+        """
+        parts = ('0', '1', '2')
+        pairs = ('0,1', '0,2', '1,2')
+        in_dfs = [make_df([pd.Series([1, .5])]*3, pd.MultiIndex.from_product(((b_ind,), parts), names=names)),
+                  make_df([pd.Series([2, 2])]*3, pd.MultiIndex.from_product(((dur_ind,), parts), names=names)),
+                  make_df([pd.Series(['1', '1'])]*3, pd.MultiIndex.from_product(((h_ind,), parts), names=names)),
+                  make_df([pd.Series(['P4', 'P4']), pd.Series(['M6', 'P5']), pd.Series(['M3', 'M2'])],
+                          pd.MultiIndex.from_product(((v_ind,), pairs), names=names))]
+        init = dissonance.DissonanceIndexer(in_dfs)
+        simuls = in_dfs[3][v_ind].ffill()
+        self.assertEqual('CP4', init.check_4s_5s('0,1', 0, 'P4', simuls))
+        self.assertEqual('DP4', init.check_4s_5s('0,1', 1, 'P4', simuls))
+        self.assertEqual(['CP4', 'DP4'], init._check_all_4s_5s(simuls, [0, 1], [0, 0], ['P4', 'P4']))
+
     def test_diss_indexer_run_1a(self):
         """
         Detection of two rising passing tones in a mini-piece.
@@ -168,6 +186,30 @@ class TestDissonanceIndexer(unittest.TestCase):
         actual = dissonance.DissonanceIndexer(in_dfs).run()
         assert_frame_equal(expected, actual)
 
+    def test_diss_indexer_run_1c(self):
+        """
+        The 'offsets' setting only returns the labels in that span, and they are the same as those
+        of the whole mini-piece. Asking for a voice pair that is not in the piece is an error.
+        """
+        in_dfs = [qh_b_df, qh_dur_df, qh_h_df, asc_q_v_df]
+        expected = empty_df.iloc[2:5].copy()
+        expected.iat[1, 0] = 'R'
+        actual = dissonance.DissonanceIndexer(in_dfs, {'pairs': ['0,1'], 'offsets': (2, 4)}).run()
+        assert_frame_equal(expected, actual)
+        self.assertRaises(RuntimeError, dissonance.DissonanceIndexer, in_dfs, {'pairs': ['0,2']})
+
+    def test_diss_indexer_run_1d(self):
+        """
+        The inputs' rows are put in order of offset before the events around each dissonance are
+        looked up, as the inputs of a part with more than one voice are not always in order.
+        """
+        in_dfs = [df.iloc[::-1] for df in (qh_b_df, qh_dur_df, qh_h_df, asc_q_v_df)]
+        expected = empty_df.copy()
+        expected.iat[1, 0] = 'R'
+        expected.iat[3, 0] = 'R'
+        actual = dissonance.DissonanceIndexer(in_dfs).run()
+        assert_frame_equal(expected, actual)
+
     def test_diss_indexer_run_2(self):
         """
         Test the dissonance indexer on an entire real piece that has most of the dissonance types 
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models_tests/test_fingerprint.py
+# Purpose:                Tests for models/fingerprint.py.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+Tests for :py:mod:`~vizitka.models.fingerprint`.
+"""
+
+from unittest import TestCase, TestLoader
+from unittest.mock import MagicMock
+import numpy
+import pandas
+from vizitka.models import fingerprint
+from vizitka.models.fingerprint import MinHasher, LSHIndex, similarity
+
+
+def shingles(start, stop):
+    """Make a set of interval 3-grams that can be told apart by their numbers."""
+    return {('h', 'M{}'.format(i), '-2', '_') for i in range(start, stop)}
+
+
+class TestMinHasher(TestCase):
+    """Tests for MinHasher and similarity()"""
+
+    def test_signature_1(self):
+        """signatures depend only on the set, num_perm, and seed"""
+        sig = MinHasher().signature(shingles(0, 50))
+        self.assertEqual(128, len(sig))
+        self.assertEqual(numpy.uint32, sig.dtype)
+        self.assertTrue(numpy.array_equal(sig, MinHasher().signature(reversed(list(shingles(0, 50))))))
+        self.assertFalse(numpy.array_equal(sig, MinHasher(seed=2).signature(shingles(0, 50))))
+
+    def test_signature_2(self):
+        """the estimated similarity is close to the Jaccard similarity"""
+        hasher = MinHasher(num_perm=256)
+        # the sets share 300 of their 500 elements, so their Jaccard similarity is 0.6
+        actual = similarity(hasher.signature(shingles(0, 400)), hasher.signature(shingles(100, 500)))
+        self.assertAlmostEqual(0.6, actual, delta=0.1)
+
+    def test_signature_3(self):
+        """empty sets only match each other"""
+        hasher = MinHasher()
+        self.assertEqual(1.0, similarity(hasher.signature(set()), hasher.signature([])))
+        self.assertEqual(0.0, similarity(hasher.signature(set()), hasher.signature(shingles(0, 5))))
+
+
+class TestLSHIndex(TestCase):
+    """Tests for LSHIndex"""
+
+    def setUp(self):
+        hasher = MinHasher()
+        self.sigs = [hasher.signature(shingles(0, 100)),
+                     hasher.signature(shingles(200, 300)),
+                     hasher.signature(shingles(10, 100)),
+                     hasher.signature(shingles(400, 500)),
+                     hasher.signature(shingles(0, 100))]
+
+    def test_near_duplicates_1(self):
+        """only the near-duplicate pairs are found, most similar first"""
+        lsh = LSHIndex(threshold=0.8)
+        for i, sig in enumerate(self.sigs):
+            lsh.add(i, sig)
+        actual = lsh.near_duplicates()
+        self.assertEqual([(0, 4), (0, 2), (2, 4)], [pair[:2] for pair in actual])
+        self.assertEqual(1.0, actual[0][2])
+        self.assertTrue(all(0.8 <= pair[2] < 1.0 for pair in actual[1:]))
+
+    def test_query_1(self):
+        """query() finds the near-duplicates of a piece that is not in the index"""
+        lsh = LSHIndex(threshold=0.8)
+        for i, sig in enumerate(self.sigs[:4]):
+            lsh.add('piece {}'.format(i), sig)
+        actual = lsh.query(self.sigs[4])
+        self.assertEqual(['piece 0', 'piece 2'], [match[0] for match in actual])
+
+    def test_init_1(self):
+        """bands must divide num_perm, and signatures must have num_perm elements"""
+        self.assertRaises(ValueError, LSHIndex, 128, 0.8, 7)
+        self.assertRaises(ValueError, LSHIndex(num_perm=64).add, 'x', self.sigs[0])
+
+    def test_choose_bands_1(self):
+        """lower thresholds use more bands of fewer rows"""
+        self.assertEqual(0, 128 % fingerprint._choose_bands(128, 0.8))
+        self.assertLess(fingerprint._choose_bands(128, 0.8), fingerprint._choose_bands(128, 0.5))
+
+
+class TestPieceShingles(TestCase):
+    """Tests for piece_shingles()"""
+
+    def test_piece_shingles_1(self):
+        """melodic and vertical n-grams are pooled regardless of voice, and never cross a rest"""
+        horiz = pandas.DataFrame({('interval.HorizontalIntervalIndexer', 'S'): ['2', '-2', '3', 'Rest'],
+                                  ('interval.HorizontalIntervalIndexer', 'B'): ['2', '-2', '3', '-3']},
+                                 index=[1.0, 2.0, 3.0, 4.0])
+        vert = pandas.DataFrame({('interval.IntervalIndexer', 'S,B'): ['8', '8', '8', '8', 'Rest']},
+                                index=[0.0, 1.0, 2.0, 3.0, 4.0])
+        piece = MagicMock()
+        piece.get.side_effect = lambda ind, settings: horiz if ind == 'horizontal_interval' else vert
+        actual = fingerprint.piece_shingles(piece, n=2)
+        expected = {('h', '2', '-2'), ('h', '-2', '3'), ('h', '3', '-3'),
+                    ('v', '8', '2', '8'), ('v', '8', '-2', '8'), ('v', '8', '3', '8')}
+        self.assertEqual(expected, actual)
+
+
+#--------------------------------------------------------------------------------------------------#
+# Definitions                                                                                      #
+#--------------------------------------------------------------------------------------------------#
+MINHASHER_SUITE = TestLoader().loadTestsFromTestCase(TestMinHasher)
+LSH_INDEX_SUITE = TestLoader().loadTestsFromTestCase(TestLSHIndex)
+PIECE_SHINGLES_SUITE = TestLoader().loadTestsFromTestCase(TestPieceShingles)
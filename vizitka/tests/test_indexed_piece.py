@@ -27,6 +27,7 @@ Tests for :py:class:`~vis.models.indexed_piece.IndexedPiece`.
 """
 
 import os
+import tempfile
 from unittest import TestCase, TestLoader
 from unittest import mock
 from unittest.mock import call, patch, MagicMock, Mock
@@ -195,6 +196,46 @@ class TestPartsAndTitles(TestCase):
         actual_range = _find_part_ranges(score)
         self.assertEqual(expected_range, actual_range)
 
+    def test_ticks(self):
+        # with ticks=True the offsets are whole numbers of ticks, even for triplets
+        path = os.path.join(VIS_PATH, 'tests', 'corpus', 'Jos2308.krn')
+        in_floats = Importer(path)
+        in_ticks = Importer(path, ticks=True)
+        self.assertIsNone(in_floats.ticks_per_quarter())
+        self.assertEqual(6, in_ticks.ticks_per_quarter())
+        expected = in_floats.get('noterest').sort_index()
+        actual = in_ticks.get('noterest').sort_index()
+        self.assertEqual('int64', actual.index.dtype)
+        self.assertSequenceEqual(list(expected.index), list(actual.index / 6.0))
+        self.assertTrue(expected.fillna('').equals(actual.fillna('').set_axis(expected.index, axis=0)))
+        durations = in_ticks.get('duration').sort_index()
+        self.assertSequenceEqual(list(actual.index), list(durations.index))
+        self.assertAlmostEqual(in_floats.get('duration').sum().sum(), durations.sum().sum())
+
+    def test_to_kern(self):
+        # the streamed kern file is byte for byte what the viz2hum DataFrame would save
+        path = os.path.join(VIS_PATH, 'tests', 'corpus', 'bwv603.xml')
+        ip = Importer(path)
+        with tempfile.TemporaryDirectory() as tmp:
+            expected, actual = os.path.join(tmp, 'expected.krn'), os.path.join(tmp, 'actual.krn')
+            ip._get_viz2hum().to_csv(expected, sep='\t', index=False, header=False,
+                                     index_label=False, quotechar='`')
+            ip.to_kern(actual)
+            with open(expected, 'rb') as exp, open(actual, 'rb') as act:
+                self.assertEqual(exp.read(), act.read())
+
+    def test_dissonance_window(self):
+        # only the voices of the pairs are analyzed, around the offsets, with the same labels
+        path = os.path.join(VIS_PATH, 'tests', 'corpus', 'madrigal51.mxl')
+        ip = Importer(path)
+        actual = ip.get('dissonance', settings={'pairs': ['Tenor,Quinto'], 'offsets': (120.0, 170.0)})
+        self.assertNotIn('beat_strength', ip._analyses)
+        self.assertNotIn('vertical_interval', ip._analyses)
+        self.assertEqual(['Tenor', 'Quinto'], list(actual.columns.get_level_values(-1)))
+        expected = Importer(path).get('dissonance')
+        self.assertTrue(expected.loc[actual.index, actual.columns].equals(actual))
+        self.assertSequenceEqual(list(expected.loc[120.0:170.0].index), list(actual.index))
+
 class TestIndexedPieceC(TestCase):
 
     def test_meta(self):
@@ -34,6 +34,7 @@ import unittest
 import pandas
 from music21 import interval, note
 from vizitka.indexers.interval import IntervalIndexer, HorizontalIntervalIndexer, real_indexer_func, indexer_funcs
+from vizitka.models.vocabulary import Vocabulary
 from vizitka.tests.test_note_rest_indexer import TestNoteRestIndexer
 
 # find the pathname of the 'vizitka' directory
@@ -246,6 +247,20 @@ class TestIntervalIndexerShort(unittest.TestCase):
         actual = IntervalIndexer(test_in, settings=setts).run().iloc[:, 0]
         self.assertTrue(actual.equals(expected))
 
+    def test_int_indexer_short_18(self):
+        # test_int_indexer_short_2 with the intervals encoded by a shared vocabulary
+        vocab = Vocabulary(observations=['Rest'])
+        not_processed = [[(0.0, 'G4'), (0.25, 'Rest'), (0.5, 'G4')],
+                         [(0.0, 'G3'), (0.25, 'Rest'), (0.5, 'G3')]]
+        test_in = pandas_maker(not_processed)
+        test_in.columns = pandas.MultiIndex.from_product([('notes',), ('0', '1')])
+        setts = {'quality': True, 'simple or compound': 'compound', 'directed': True,
+                 'vocabulary': vocab}
+        actual = IntervalIndexer(test_in, settings=setts).run().iloc[:, 0]
+        self.assertEqual([1, 0, 1], list(actual))
+        self.assertEqual('int32', str(actual.dtype))
+        self.assertEqual(['Rest', 'P8'], list(vocab))
+
 class TestIntervalIndexerLong(unittest.TestCase):
     bwv77_S_B_basis = [(0.0, "P8"), (0.5, "M9"), (1.0, "m10"), (2.0, "P12"), (3.0, "M10"),
                        (4.0, "P12"), (4.5, "m13"), (5.0, "m17"), (5.5, "P12"), (6.0, "M13"),
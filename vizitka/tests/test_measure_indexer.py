@@ -109,6 +109,17 @@ class TestMeasureIndexer(unittest.TestCase):
         expected.columns = actual.columns
         self.assertTrue(actual.equals(expected))
 
+    def test_measure_indexer_6(self):
+        # With no Measure objects, the measures are laid out from the time signatures.
+        test_part = stream.Part()
+        test_part.append(note.Note('C#5', quarterLength=18.0))
+        cols = pandas.MultiIndex.from_product((('meter.TimeSignatureIndexer',), ('0',)))
+        time_sigs = pandas.DataFrame(['*M3/4', '*M2/2'], index=[0.0, 6.0], columns=cols)
+        measures = pandas.DataFrame(columns=cols)
+        actual = meter.MeasureIndexer([measures, time_sigs], [test_part]).run()
+        self.assertSequenceEqual([0.0, 3.0, 6.0, 10.0], list(actual.index))
+        self.assertSequenceEqual([1, 2, 3, 4], list(actual.iloc[:, 0]))
+
 
 #--------------------------------------------------------------------------------------------------#
 # Definitions                                                                                      #
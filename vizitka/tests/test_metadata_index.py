@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models_tests/test_metadata_index.py
+# Purpose:                Tests for models/metadata_index.py.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+Tests for :py:class:`~vizitka.models.metadata_index.MetadataIndex`.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase, TestLoader
+import vizitka
+from vizitka.models.indexed_piece import Importer, IndexedPiece
+from vizitka.models.metadata_index import MetadataIndex, read_header
+
+CORPUS = os.path.join(vizitka.__path__[0], 'tests', 'corpus')
+
+
+class TestReadHeader(TestCase):
+
+    def test_kern(self):
+        """reference records are read wherever they are, and COM is preferred to COA"""
+        expected = {'composer': 'Palestrina, Giovanni Perluigi da', 'title': 'Kyrie',
+                    'genre': 'Mass (Paraphrase)'}
+        self.assertEqual(expected, read_header(os.path.join(CORPUS, 'Kyrie.krn')))
+        self.assertEqual('Josquin des Prez',
+                         read_header(os.path.join(CORPUS, 'Jos2308.krn'))['composer'])
+
+    def test_mei(self):
+        """the MEI header and its Humdrum processing instructions give the same fields"""
+        self.assertEqual(read_header(os.path.join(CORPUS, 'Jos2308.krn')),
+                         read_header(os.path.join(CORPUS, 'Jos2308.mei')))
+
+    def test_musicxml(self):
+        expected = {'opusNumber': 'BWV 603', 'title': 'Puer natus in Bethlehem'}
+        self.assertEqual(expected, read_header(os.path.join(CORPUS, 'bwv603.xml')))
+        self.assertEqual({}, read_header(os.path.join(CORPUS, 'bwv77.mxl')))
+        self.assertEqual({}, read_header(os.path.join(CORPUS, 'prelude28-20.mid')))
+
+
+class TestMetadataIndex(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.tmp, 'corpus')
+        os.mkdir(self.corpus)
+        for name in ('bwv603.xml', 'bwv77.mxl', 'Kyrie_short.krn'):
+            shutil.copy(os.path.join(CORPUS, name), self.corpus)
+        with open(os.path.join(self.corpus, 'meta'), 'w') as meta:
+            json.dump({'composer': {'title': 'J.S. Bach'}, 'genres': [{'title': 'Chorale'}],
+                       'attachments': [{'file_name': 'bwv603.xml'}, {'file_name': 'bwv77.mxl'}]},
+                      meta)
+        self.path = os.path.join(self.tmp, 'index.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_update(self):
+        """only new and changed files are read, and deleted files are dropped"""
+        index = MetadataIndex(self.path)
+        self.assertEqual(3, index.update(self.corpus))
+        index.close()
+        index = MetadataIndex(self.path)
+        self.assertEqual(0, index.update(self.corpus))
+        with open(os.path.join(self.corpus, 'Kyrie_short.krn'), 'a') as kern:
+            kern.write('!!!ODT: 1554\n')
+        os.remove(os.path.join(self.corpus, 'bwv77.mxl'))
+        self.assertEqual(1, index.update(self.corpus))
+        self.assertEqual(2, len(index))
+        self.assertEqual('1554', index.frame()['date'].iloc[0])
+        index.close()
+
+    def test_select(self):
+        """the meta file fills the fields of the files it describes"""
+        index = MetadataIndex()
+        index.update(self.corpus)
+        actual = index.select({'composer': 'J.S. Bach', 'genre': 'Chorale'})
+        self.assertEqual(['bwv603.xml', 'bwv77.mxl'], [os.path.basename(p) for p in actual])
+        actual = index.select(lambda meta: 'Palestrina' in (meta['composer'] or ''))
+        self.assertEqual(['Kyrie_short.krn'], [os.path.basename(p) for p in actual])
+        self.assertRaises(ValueError, index.select, {'key': 'C'})
+
+    def test_importer(self):
+        """Importer() only imports the files that match"""
+        actual = Importer(self.corpus, where={'opusNumber': 'BWV 603'}, index=self.path)
+        self.assertIsInstance(actual, IndexedPiece)
+        self.assertEqual(os.path.join(self.corpus, 'bwv603.xml'), actual._pathname)
+        self.assertRaises(RuntimeError, Importer, self.corpus, where={'composer': 'Nobody'})
+
+
+#--------------------------------------------------------------------------------------------------#
+# Definitions                                                                                      #
+#--------------------------------------------------------------------------------------------------#
+READ_HEADER_SUITE = TestLoader().loadTestsFromTestCase(TestReadHeader)
+METADATA_INDEX_SUITE = TestLoader().loadTestsFromTestCase(TestMetadataIndex)
@@ -628,6 +628,47 @@ class TestNGramIndexer(unittest.TestCase):
         actual = ngram.NGramIndexer([vertical, horizontal], setts).run()
         self.assertTrue(actual.equals(expected))
 
+    def test_ngram_22a(self):
+        """test _1a but with 'output' set to 'tuples'"""
+        vertical = df_maker([pandas.Series(['A', 'B', 'C', 'D'])], VERT_DF.columns)
+        horizontal = df_maker([pandas.Series(['a', 'b', 'c'], index=[1, 2, 3])], HORIZ_DF.columns)
+        setts = {'n': 2, 'horizontal': [('1',)], 'vertical': [('0,1',)], 'output': 'tuples'}
+        expected = [('A', 'a', 'B'), ('B', 'b', 'C'), ('C', 'c', 'D')]
+        actual = ngram.NGramIndexer([vertical, horizontal], setts).run()
+        self.assertEqual(['0,1 : 1'], list(actual.columns.get_level_values(1)))
+        self.assertEqual(expected, list(actual.iloc[:, 0]))
+
+    def test_ngram_22b(self):
+        """test _22a but with 'output' set to 'codes'"""
+        vertical = df_maker([pandas.Series(['A', 'B', 'C', 'D'])], VERT_DF.columns)
+        horizontal = df_maker([pandas.Series(['a', 'b', 'c'], index=[1, 2, 3])], HORIZ_DF.columns)
+        setts = {'n': 2, 'horizontal': [('1',)], 'vertical': [('0,1',)], 'output': 'codes'}
+        indexer = ngram.NGramIndexer([vertical, horizontal], setts)
+        actual = indexer.run()
+        self.assertEqual(['A', 'a', 'B', 'b', 'C', 'c', 'D'], indexer.vocabulary)
+        self.assertEqual([('0,1 : 1', 0), ('0,1 : 1', 1), ('0,1 : 1', 2)],
+                         [col[1:] for col in actual.columns])
+        self.assertEqual([[0, 1, 2], [2, 3, 4], [4, 5, 6]], actual.values.tolist())
+
+    def test_ngram_22c(self):
+        """test _22b with a vocabulary shared between two queries and a continuer"""
+        vertical = df_maker([pandas.Series(['A', 'B', 'C', 'D'])], VERT_DF.columns)
+        horizontal = df_maker([pandas.Series(['a', 'c'], index=[1, 3])], HORIZ_DF.columns)
+        vocab = ['C', '_']
+        setts = {'n': 2, 'horizontal': [('1',)], 'vertical': [('0,1',)], 'output': 'codes',
+                 'vocabulary': vocab}
+        actual = ngram.NGramIndexer([vertical, horizontal], setts).run()
+        self.assertEqual(['C', '_', 'A', 'a', 'B', 'c', 'D'], vocab)
+        self.assertEqual([[2, 3, 4], [4, 1, 0], [0, 5, 6]], actual.values.tolist())
+        setts = {'n': 1, 'vertical': [('0,1',)], 'output': 'codes', 'vocabulary': vocab}
+        actual = ngram.NGramIndexer([vertical], setts).run()
+        self.assertEqual([[2], [4], [0], [6]], actual.values.tolist())
+
+    def test_ngram_22d(self):
+        """that __init__() raises a RuntimeWarning when the 'output' setting is invalid"""
+        setts = {'n': 2, 'vertical': [('0,1',)], 'output': 'lists'}
+        self.assertRaises(RuntimeWarning, ngram.NGramIndexer, (VERT_DF,), setts)
+
 #--------------------------------------------------------------------------------------------------#
 # Definitions                                                                                      #
 #--------------------------------------------------------------------------------------------------#
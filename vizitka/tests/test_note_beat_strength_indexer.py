@@ -168,6 +168,20 @@ class TestNoteBeatStrengthIndexer(unittest.TestCase):
         expected.columns = actual.columns
         self.assertTrue(actual.equals(expected))
 
+    def test_note_beat_strength_indexer_7(self):
+        # The arithmetic method agrees with music21 on bwv603.xml, ties included
+        expected = Importer(os.path.join(VIS_PATH, 'tests', 'corpus/bwv603.xml'))._get_beat_strength()
+        ip = Importer(os.path.join(VIS_PATH, 'tests', 'corpus/bwv603.xml'))
+        actual = ip._get_beat_strength({'method': 'arithmetic'})
+        self.assertTrue(actual.equals(expected))
+
+    def test_note_beat_strength_indexer_8(self):
+        # Unknown methods and missing measures or time signatures are refused
+        self.assertRaises(RuntimeError, meter.NoteBeatStrengthIndexer, pandas.DataFrame(),
+                          {'method': 'grid'})
+        self.assertRaises(RuntimeError, meter.NoteBeatStrengthIndexer, pandas.DataFrame(),
+                          {'method': 'arithmetic'})
+
 #--------------------------------------------------------------------------------------------------#
 # Definitions                                                                                      #
 #--------------------------------------------------------------------------------------------------#
@@ -32,7 +32,8 @@ import os
 import unittest
 from unittest import mock
 import pandas
-from vizitka.indexers.offset import FilterByOffsetIndexer
+import numpy
+from vizitka.indexers.offset import FilterByOffsetIndexer, _rolling_mode
 from vizitka.models.indexed_piece import Importer
 # find pathname to the 'vizitka' directory
 import vizitka
@@ -112,6 +113,32 @@ class TestOffsetIndexerSinglePart(unittest.TestCase):
         self.assertListEqual(list(actual.index), [])
         self.assertEqual(len(actual.columns), 2)
 
+    def test_run_3(self):
+        # a list of quarterLengths gives the same results as one call for each of them
+        in_val = [pandas.Series(['A', 'B', 'C', 'D'], index=[0.0, 0.5, 1.75, 3.0], name=('N', '0')),
+                  pandas.Series(['E', 'F'], index=[0.25, 4.5], name=('N', '1'))]
+        for method in ('ffill', None):
+            settings = {'quarterLength': [0.25, 0.5, 1.0, 1.5, 2.0], 'method': method}
+            actual = FilterByOffsetIndexer(in_val, settings).run()
+            self.assertListEqual([0.25, 0.5, 1.0, 1.5, 2.0], sorted(actual))
+            for q_l in actual:
+                expected = FilterByOffsetIndexer(in_val, {'quarterLength': q_l, 'method': method}).run()
+                self.assertTrue(expected.equals(actual[q_l]))
+        self.assertListEqual([0.0, 2.0, 4.0, 6.0], list(actual[2.0].index))
+        self.assertRaises(RuntimeError, FilterByOffsetIndexer, in_val, {'quarterLength': [1.0, 0.0003]})
+
+    def test_run_4(self):
+        # with integer ticks, the grids are in ticks too
+        in_val = [pandas.Series(['A', 'B', 'C'], index=[0, 4, 9], name=('N', '0'))]
+        settings = {'quarterLength': [1.0, 2.0], 'ticks_per_quarter': 3}
+        actual = FilterByOffsetIndexer(in_val, settings).run()
+        self.assertEqual('int64', actual[1.0].index.dtype)
+        self.assertListEqual([0, 3, 6, 9], list(actual[1.0].index))
+        self.assertListEqual(['A', 'A', 'B', 'C'], list(actual[1.0].iloc[:, 0]))
+        self.assertListEqual([0, 6, 12], list(actual[2.0].index))
+        settings = {'quarterLength': 0.5, 'ticks_per_quarter': 3}
+        self.assertRaises(RuntimeError, FilterByOffsetIndexer, in_val, settings)
+
     def test_offset_1part_1(self):
         # 0 length
         in_val = [pandas.Series(name=('Indexer', '0'))]
@@ -393,6 +420,17 @@ class TestOffsetIndexerManyParts(unittest.TestCase):
         actual = ip.get('offset', data=nr, settings={'quarterLength': 'dynamic'})
         self.assertTrue(actual.equals(expected))
 
+    def test_rolling_mode(self):
+        # the most common value of each window, ties going to the value that comes first
+        nan = float('nan')
+        values = numpy.array([[2.0, 4.0], [4.0, nan], [2.0, nan], [nan, nan], [nan, nan]])
+        expected = [4.0, 4.0, 2.0, nan, nan, nan]
+        actual = _rolling_mode(values, 6, 2)
+        numpy.testing.assert_array_equal(expected, actual)
+        for i in range(3):
+            counts = pandas.DataFrame(values[i:i+2]).stack().value_counts()
+            self.assertEqual(counts.max(), (values[i:i+2] == actual[i]).sum())
+
 
 #--------------------------------------------------------------------------------------------------#
 # Definitions                                                                                      #
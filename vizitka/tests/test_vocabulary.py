@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#--------------------------------------------------------------------------------------------------
+# Program Name:           vis
+# Program Description:    Helps analyze music with computers.
+#
+# Filename:               models_tests/test_vocabulary.py
+# Purpose:                Tests for models/vocabulary.py.
+#
+# Copyright (C) 2016 Alexander Morgan
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#--------------------------------------------------------------------------------------------------
+"""
+Tests for :py:class:`~vizitka.models.vocabulary.Vocabulary`.
+"""
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase, TestLoader
+import numpy
+import pandas
+from vizitka.models.vocabulary import Vocabulary, as_vocabulary
+
+
+class TestVocabulary(TestCase):
+    """Tests for Vocabulary"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'vocab.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_encode_1(self):
+        """in-memory vocabulary appends to the list it was given"""
+        observations = ['P5']
+        vocab = Vocabulary(observations=observations)
+        actual = vocab.encode(numpy.array([['M3', 'P5'], [float('nan'), 'M3']], dtype=object))
+        self.assertEqual([[1, 0], [-1, 1]], actual.tolist())
+        self.assertEqual(numpy.int32, actual.dtype)
+        self.assertEqual(['P5', 'M3'], observations)
+
+    def test_encode_2(self):
+        """encode_frame() keeps the index and columns"""
+        vocab = Vocabulary()
+        df = pandas.DataFrame({'0': ['C4', 'D4'], '1': [None, 'C4']}, index=[0.0, 1.5])
+        actual = vocab.encode_frame(df)
+        self.assertTrue(actual.index.equals(df.index))
+        self.assertTrue(actual.columns.equals(df.columns))
+        self.assertEqual([[0, -1], [1, 0]], actual.values.tolist())
+
+    def test_decode_1(self):
+        """decode() inverts encode()"""
+        vocab = Vocabulary()
+        codes = vocab.encode(numpy.array(['A', 'B', None, 'A'], dtype=object))
+        actual = vocab.decode(codes)
+        self.assertEqual(['A', 'B', 'A'], [actual[0], actual[1], actual[3]])
+        self.assertTrue(numpy.isnan(actual[2]))
+
+    def test_persist_1(self):
+        """observations of mixed types survive reopening the file"""
+        vocab = Vocabulary(self.path)
+        vocab.extend(['m3', 1.5, ('P5', 'M3'), 2])
+        reopened = Vocabulary(self.path)
+        self.assertEqual(['m3', 1.5, ('P5', 'M3'), 2], list(reopened))
+        self.assertEqual(2, reopened.index(('P5', 'M3')))
+
+    def test_persist_2(self):
+        """two vocabularies on the same file never hand out the same code twice"""
+        first = Vocabulary(self.path)
+        second = Vocabulary(self.path)
+        self.assertEqual(0, first.append('P8'))
+        self.assertEqual(1, second.append('M6'))
+        self.assertEqual(0, second.append('P8'))
+        self.assertEqual(1, first.index('M6'))
+        self.assertEqual([2, 0], first.encode(numpy.array(['m7', 'P8'], dtype=object)).tolist())
+        self.assertEqual(['P8', 'M6', 'm7'], list(Vocabulary(self.path)))
+
+    def test_persist_3(self):
+        """an observation that cannot be read back is refused without changing the vocabulary"""
+        vocab = Vocabulary(self.path)
+        self.assertRaises(TypeError, vocab.extend, ['P1', object()])
+        self.assertEqual(0, len(vocab))
+        self.assertEqual(0, os.path.getsize(self.path))
+
+    def test_as_vocabulary_1(self):
+        """as_vocabulary() accepts None, a Vocabulary, a path, or a list"""
+        vocab = Vocabulary()
+        self.assertIsNone(as_vocabulary(None))
+        self.assertIs(vocab, as_vocabulary(vocab))
+        self.assertEqual(self.path, as_vocabulary(self.path).path)
+        self.assertEqual(['x'], list(as_vocabulary(['x'])))
+
+
+#--------------------------------------------------------------------------------------------------#
+# Definitions                                                                                      #
+#--------------------------------------------------------------------------------------------------#
+VOCABULARY_SUITE = TestLoader().loadTestsFromTestCase(TestVocabulary)